@@ -1,5 +1,5 @@
 # GENERAL
-from fastapi import FastAPI, File, Form, UploadFile, HTTPException, Body
+from fastapi import FastAPI, File, Form, UploadFile, HTTPException, Body, Request
 from typing import Dict, Any
 from typing import List, Annotated
 import asyncio
@@ -17,6 +17,7 @@ import anyio
 import requests
 import json
 import simple_salesforce
+import contextlib
 from PIL import Image
 
 # URLLIB3
@@ -38,7 +39,21 @@ from customutils import *
 # INIT APP #
 ############
 
-app = FastAPI()
+@contextlib.asynccontextmanager
+async def lifespan(app: FastAPI):
+    # STARTUP: LOAD TAXONOMY SNAPSHOT (BUILT FROM THE ZMAP WORKBOOKS IF MISSING), COMPILE PROMPT TEMPLATES ONCE PER WORKER
+    try:
+        await anyio.to_thread.run_sync(v1_reloadTaxonomy)
+    except Exception:
+        pass  # BUILDERS FALL BACK TO THEIR HARD-CODED LISTS
+    await anyio.to_thread.run_sync(v1_compilePromptTemplates)
+    yield
+    # SHUTDOWN: CLOSE LONG-LIVED UPSTREAM CLIENTS OF THIS WORKER
+    await v1_closeDocumentIntelligenceClientsAsync()
+    await v1_closeHttpClientsAsync()
+    v1_shutdownRasterExecutor()
+
+app = FastAPI(lifespan=lifespan)
 
 #################
 # HELPER - TEST #
@@ -64,10 +79,10 @@ async def func3() -> int:
 ###################
 
 async def v1_run_stage3_parallel(mainDict):
-    """Run Stage 3 search functions in parallel using threads."""
-    comp_task = asyncio.to_thread(v1_searchComposition, mainDict)
-    func_task = asyncio.to_thread(v1_searchFunction, mainDict)
-    appl_task = asyncio.to_thread(v1_searchApplication, mainDict)
+    """Run Stage 3 search functions concurrently as coroutines (async HTTP, no threads)."""
+    comp_task = v1_runStepsAsync(v1_searchCompositionSteps(mainDict))
+    func_task = v1_runStepsAsync(v1_searchFunctionSteps(mainDict))
+    appl_task = v1_runStepsAsync(v1_searchApplicationSteps(mainDict))
     comp_res, func_res, appl_res = await asyncio.gather(
         comp_task, func_task, appl_task, return_exceptions=True
     )
@@ -79,20 +94,51 @@ async def v1_run_stage3_parallel(mainDict):
 
 
 async def run_stage5_parallel(mainDict):
-    """Run Stage 5 extraction functions in parallel using threads."""
-    tasks = await asyncio.gather(
-        asyncio.to_thread(v1_selectIndustryCluster, mainDict),
-        asyncio.to_thread(v1_selectCompositions, mainDict),
-        asyncio.to_thread(v1_selectFunctions, mainDict),
-        asyncio.to_thread(v1_selectApplications, mainDict),
-        asyncio.to_thread(v1_findCASNumber, mainDict),
-        asyncio.to_thread(v1_findPhysicalForm, mainDict),
-        asyncio.to_thread(v1_genProductDescription, mainDict),
-        asyncio.to_thread(v1_getRecommendedDosage, mainDict),
-        asyncio.to_thread(v1_selectCertifications, mainDict),
-        asyncio.to_thread(v1_selectClaims, mainDict),
-        asyncio.to_thread(v1_selectHealthBenefits, mainDict),
-        return_exceptions=True)
+    """Run Stage 5 extraction functions concurrently as coroutines (async HTTP, no threads)."""
+    hedge = mainDict.get('inputHedging', False)
+    lsSteps = [
+        v1_selectIndustryClusterSteps(mainDict),
+        v1_selectCompositionsSteps(mainDict),
+        v1_selectFunctionsSteps(mainDict),
+        v1_selectApplicationsSteps(mainDict),
+        v1_findCASNumberSteps(mainDict),
+        v1_findPhysicalFormSteps(mainDict),
+        v1_genProductDescriptionSteps(mainDict),
+        v1_getRecommendedDosageSteps(mainDict),
+        v1_selectCertificationsSteps(mainDict),
+        v1_selectClaimsSteps(mainDict),
+        v1_selectHealthBenefitsSteps(mainDict)]
+    pruning = mainDict.get('inputHierarchicalPruning', False)
+    if mainDict.get('inputConsolidated', False) and pruning:
+        # CLUSTER AND THE COMBINED CALLS OF THE OTHER FIELDS START RIGHT AWAY,
+        # FUNCTIONS/APPLICATIONS ARE COMBINED IN ONE CALL ONCE THE CLUSTER ANSWER NARROWS THEIR OPTIONS
+        clusterTask = asyncio.ensure_future(v1_runStepsAsync(lsSteps[0], hedge=hedge))
+        cluster_res, pruned_res, other_res = await asyncio.gather(
+            clusterTask,
+            v1_runStepsConsolidatedAfterClusterAsync(clusterTask, lsSteps[2:4], mainDict, hedge=hedge),
+            v1_runStepsConsolidatedAsync(lsSteps[1:2] + lsSteps[4:], hedge=hedge),
+            return_exceptions=True)
+        if isinstance(pruned_res, BaseException): pruned_res = [pruned_res] * 2
+        if isinstance(other_res, BaseException): other_res = [other_res] * (len(lsSteps) - 3)
+        tasks = [cluster_res, other_res[0], *pruned_res, *other_res[1:]]
+    elif mainDict.get('inputConsolidated', False):
+        # FEW COMBINED STRUCTURED-OUTPUT CALLS INSTEAD OF ONE CALL PER FIELD
+        tasks = await v1_runStepsConsolidatedAsync(lsSteps, hedge=hedge)
+    else:
+        if pruning:
+            # FUNCTIONS/APPLICATIONS WAIT FOR THE CLUSTER, THE OTHER FIELDS START RIGHT AWAY
+            clusterTask = asyncio.ensure_future(v1_runStepsAsync(lsSteps[0], hedge=hedge))
+            lsCoro = [clusterTask, v1_runStepsAsync(lsSteps[1], hedge=hedge)]
+            lsCoro += [v1_runStepsAfterClusterAsync(clusterTask, steps, mainDict, hedge=hedge) for steps in lsSteps[2:4]]
+            lsCoro += [v1_runStepsAsync(steps, hedge=hedge) for steps in lsSteps[4:]]
+        else:
+            lsCoro = [v1_runStepsAsync(steps, hedge=hedge) for steps in lsSteps]
+        lsTask = [asyncio.ensure_future(coro) for coro in lsCoro[:1]]
+        if PROMPT_LAYOUT == 'prefix_cache':
+            # LET THE FIRST CALL WRITE THE SHARED PREFIX TO THE PROVIDER CACHE BEFORE THE OTHERS READ IT
+            await asyncio.wait(lsTask, timeout=PROMPT_CACHE_WARMUP_SECONDS)
+        lsTask += [asyncio.ensure_future(coro) for coro in lsCoro[1:]]
+        tasks = await asyncio.gather(*lsTask, return_exceptions=True)
 
     # Unpack and normalize exceptions
     (
@@ -145,6 +191,9 @@ async def run_main(mainDict, time_start):
     ####################
     # STAGE 0 - SERIES #
     ####################
+    # DEADLINE FOR ALL UPSTREAM CALLS OF THIS REQUEST (CONTEXT OF THIS REQUEST ONLY)
+    v1_setRequestDeadline()
+    lsUsage = v1_startUsageLog()
     # BUSINESS LINE
     if mainDict['inputBusinessLine'] == 'FBI': mainDict['stg_businessLineStr'] = "Food & Beverage"
     elif mainDict['inputBusinessLine'] == 'PCI': mainDict['stg_businessLineStr'] = "Personal Care"
@@ -157,9 +206,7 @@ async def run_main(mainDict, time_start):
     # CHECK HASH
     mainDict['stg_hashinputProductName'] = hashlib.sha256(mainDict['inputProductName'].encode()).hexdigest()
     mainDict['stg_hashinputBusinessLine'] = hashlib.sha256(mainDict['inputBusinessLine'].encode()).hexdigest()
-    lsdoc = [str(x) for x in mainDict['inputListDocumentation']]
-    lsdoc.sort()
-    mainDict['stg_hashinputListDocumentation'] = hashlib.sha256("".join(lsdoc).encode()).hexdigest()
+    mainDict['stg_hashinputListDocumentation'] = v1_hashListDocumentation(mainDict['stg_lsTempFile'])
     hashCombined = hashlib.sha256((mainDict['stg_hashinputProductName'] + mainDict['stg_hashinputBusinessLine'] + mainDict['stg_hashinputListDocumentation']).encode()).hexdigest()
     mainDict['stg_hashCombined'] = hashCombined
     # LOAD FROM HIST IF EXISTS
@@ -177,16 +224,15 @@ async def run_main(mainDict, time_start):
     ####################
     # STAGE 2 - SERIES #
     ####################
+    # PAGE IMAGES - PAGE SELECTION AND RENDERING IN THE BACKGROUND WHILE OCR RUNS, ONLY STAGE 4 WAITS FOR THEM
+    prefetchTask = asyncio.create_task(asyncio.to_thread(v1_prefetchVisionPageImages, mainDict))
     # PARSED_TO_TEXT
-    stg_lsParsedText = v1_parsePDF(mainDict['stg_lsTempFile'])
+    stg_lsParsedText, mainDict['stg_lsParseError'], mainDict['stg_lsOcrStats'] = await v1_parsePDFAsync(mainDict['stg_lsTempFile'], layout=mainDict['inputOcrLayout'])
     mainDict['stg_lsParsedText'] = stg_lsParsedText
     mainDict['stg_parsedText'] = "\n\n".join(stg_lsParsedText)
-    # READ_PDF_TO_BASE64
-    stg_lsBase64 = v1_readPDFToBase64(mainDict['stg_lsTempFile'])
-    mainDict['stg_lsBase64'] = stg_lsBase64
     # GET MGF/SUPPLIER
     mainDict = v1_addFieldsMainDict(mainDict)
-    mainDict['gpt_manufacturer_or_supplier_answer'], mainDict['gpt_manufacturer_or_supplier_reason'] = v1_getManufacturerOrSupplier(mainDict)
+    mainDict['gpt_manufacturer_or_supplier_answer'], mainDict['gpt_manufacturer_or_supplier_reason'] = await v1_runStepsAsync(v1_getManufacturerOrSupplierSteps(mainDict))
 
     ######################
     # STAGE 3 - PARALLEL #
@@ -197,20 +243,22 @@ async def run_main(mainDict, time_start):
         mainDict['gpt_function_search_answer']   = func_res
         mainDict['gpt_application_search_answer'] = appl_res
     else:
-        mainDict['gpt_composition_search_answer'] = v1_searchComposition(mainDict)
-        mainDict['gpt_function_search_answer'] = v1_searchFunction(mainDict)
-        mainDict['gpt_application_search_answer'] = v1_searchApplication(mainDict)
+        mainDict['gpt_composition_search_answer'] = await v1_runStepsAsync(v1_searchCompositionSteps(mainDict))
+        mainDict['gpt_function_search_answer'] = await v1_runStepsAsync(v1_searchFunctionSteps(mainDict))
+        mainDict['gpt_application_search_answer'] = await v1_runStepsAsync(v1_searchApplicationSteps(mainDict))
 
     ####################
     # STAGE 4 - SERIES #
     ####################        
     mainDict['gpt_combined_web_search'] = v1_combineWebSearch(mainDict)
-    mainDict['gpt_text_of_this_product_only_answer'] = v1_getTextOfThisProductOnly(mainDict)
+    await prefetchTask  # PAGE SELECTION DONE, RENDERING SUBMITTED
+    await asyncio.to_thread(v1_getVisionPageImages, mainDict)  # WAIT FOR PAGE IMAGES OFF THE EVENT LOOP
+    mainDict['gpt_text_of_this_product_only_answer'] = await v1_runStepsAsync(v1_getTextOfThisProductOnlySteps(mainDict))
 
     ######################
     # STAGE 5 - PARALLEL #
     ######################
-    if mainDict['inputParallel'] == True:
+    if mainDict['inputParallel'] == True or mainDict.get('inputConsolidated', False) == True:
         (
             (mainDict['gpt_select_industry_cluster_answer'], mainDict['gpt_select_industry_cluster_reason']),
             (mainDict['gpt_select_compositions_answer'], mainDict['gpt_select_compositions_reason']),
@@ -225,17 +273,17 @@ async def run_main(mainDict, time_start):
             (mainDict['gpt_health_benefits_answer'], mainDict['gpt_health_benefits_reason']),
         ) = await run_stage5_parallel(mainDict)
     else:
-        mainDict['gpt_select_industry_cluster_answer'], mainDict['gpt_select_industry_cluster_reason'] = v1_selectIndustryCluster(mainDict)
-        mainDict['gpt_select_compositions_answer'], mainDict['gpt_select_compositions_reason'] = v1_selectCompositions(mainDict)
-        mainDict['gpt_select_functions_answer'], mainDict['gpt_select_functions_reason'] = v1_selectFunctions(mainDict)
-        mainDict['gpt_select_applications_answer'], mainDict['gpt_select_applications_reason'] = v1_selectApplications(mainDict)        
-        mainDict['gpt_cas_from_doc_answer'], mainDict['gpt_cas_from_doc_reason'] = v1_findCASNumber(mainDict)
-        mainDict['gpt_physical_form_answer'], mainDict['gpt_physical_form_reason'] = v1_findPhysicalForm(mainDict)
-        mainDict['gpt_gen_product_description'] = v1_genProductDescription(mainDict)
-        mainDict['gpt_recommended_dosage_answer'], mainDict['gpt_recommended_dosage_reason'] = v1_getRecommendedDosage(mainDict)
-        mainDict['gpt_certifications_answer'], mainDict['gpt_certifications_reason'] = v1_selectCertifications(mainDict)
-        mainDict['gpt_claims_answer'], mainDict['gpt_claims_reason'] = v1_selectClaims(mainDict)
-        mainDict['gpt_health_benefits_answer'], mainDict['gpt_health_benefits_reason'] = v1_selectHealthBenefits(mainDict)
+        mainDict['gpt_select_industry_cluster_answer'], mainDict['gpt_select_industry_cluster_reason'] = await v1_runStepsAsync(v1_selectIndustryClusterSteps(mainDict))
+        mainDict['gpt_select_compositions_answer'], mainDict['gpt_select_compositions_reason'] = await v1_runStepsAsync(v1_selectCompositionsSteps(mainDict))
+        mainDict['gpt_select_functions_answer'], mainDict['gpt_select_functions_reason'] = await v1_runStepsAsync(v1_selectFunctionsSteps(mainDict))
+        mainDict['gpt_select_applications_answer'], mainDict['gpt_select_applications_reason'] = await v1_runStepsAsync(v1_selectApplicationsSteps(mainDict))
+        mainDict['gpt_cas_from_doc_answer'], mainDict['gpt_cas_from_doc_reason'] = await v1_runStepsAsync(v1_findCASNumberSteps(mainDict))
+        mainDict['gpt_physical_form_answer'], mainDict['gpt_physical_form_reason'] = await v1_runStepsAsync(v1_findPhysicalFormSteps(mainDict))
+        mainDict['gpt_gen_product_description'] = await v1_runStepsAsync(v1_genProductDescriptionSteps(mainDict))
+        mainDict['gpt_recommended_dosage_answer'], mainDict['gpt_recommended_dosage_reason'] = await v1_runStepsAsync(v1_getRecommendedDosageSteps(mainDict))
+        mainDict['gpt_certifications_answer'], mainDict['gpt_certifications_reason'] = await v1_runStepsAsync(v1_selectCertificationsSteps(mainDict))
+        mainDict['gpt_claims_answer'], mainDict['gpt_claims_reason'] = await v1_runStepsAsync(v1_selectClaimsSteps(mainDict))
+        mainDict['gpt_health_benefits_answer'], mainDict['gpt_health_benefits_reason'] = await v1_runStepsAsync(v1_selectHealthBenefitsSteps(mainDict))
 
     ##############################
     # STAGE 6 - HIDE SOME FIELDS #
@@ -244,12 +292,17 @@ async def run_main(mainDict, time_start):
     mainDict['time_start'] = str(time_start)
     mainDict['time_end'] = str(time_end)
     mainDict['time_duration'] = str((time_end - time_start).total_seconds())
+    mainDict['stg_llmUsage'] = lsUsage
+    mainDict['stg_llmUsageSummary'] = v1_usageSummary(lsUsage)
+    mainDict['stg_promptVersion'] = v1_promptVersion()
+    mainDict['stg_taxonomyVersion'] = v1_getTaxonomy()['version']
     mainDict['inputListDocumentation'] = 'HIDDEN'
     mainDict['inputSecret'] = 'HIDDEN'
     mainDict['stg_lsTempFile'] = 'HIDDEN'
     mainDict['stg_lsParsedText'] = 'HIDDEN'
     # mainDict['stg_parsedText'] = 'HIDDEN'
     mainDict['stg_lsBase64'] = 'HIDDEN'
+    mainDict['stg_pageImages'] = 'HIDDEN'
     mainDict['gpt_text_of_this_product_only_answer'] = 'HIDDEN'
 
     #######################
@@ -393,27 +446,88 @@ async def v1_histAPICalls_delete(
     except OSError as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.post("/v1_cacheStats")
+async def v1_cacheStats():
+    try:
+        dictStats = await anyio.to_thread.run_sync(v1_diskCacheStats, {OCR_CACHE_DIR: OCR_CACHE_MAX_BYTES, 
+                                                                       PAGE_IMAGE_CACHE_DIR: PAGE_IMAGE_CACHE_MAX_BYTES})
+        return {"pid": os.getpid(), "caches": dictStats}
+    except OSError as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.post("/v1_httpPoolStats")
+async def v1_httpPoolStats():
+    return {"pid": os.getpid(), "hosts": v1_getHttpPoolStats(), "async_hosts": v1_getHttpClientStats()}
+
+@app.post("/v1_rateLimiterStats")
+async def v1_rateLimiterStats():
+    try:
+        stats = await anyio.to_thread.run_sync(v1_getRateLimiterStats)
+        return {"pid": os.getpid(), "rate_limiter": stats}
+    except sqlite3.Error as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.post("/v1_circuitBreakers")
+async def v1_circuitBreakers():
+    return {"pid": os.getpid(), **v1_getCircuitBreakers()}
+
+@app.post("/v1_hedgeStats")
+async def v1_hedgeStats():
+    return {"pid": os.getpid(), "hedging": v1_getHedgeStats()}
+
+@app.post("/v1_promptTemplates")
+async def v1_promptTemplates():
+    return {"pid": os.getpid(), "prompt_templates": v1_getPromptTemplateStats()}
+
+@app.post("/v1_taxonomy")
+async def v1_taxonomy():
+    return {"pid": os.getpid(), "taxonomy": v1_getTaxonomyStats()}
+
+@app.post("/v1_taxonomyReload")
+async def v1_taxonomyReload(
+    inputRebuild: Annotated[bool, Form()] = True
+):
+    # REBUILD SNAPSHOT FROM THE ZMAP WORKBOOKS + LAST SALESFORCE SYNC (DEFAULT) OR RELOAD THE CURRENT FILE, OTHER WORKERS FOLLOW WITHIN TAXONOMY_CHECK_SECONDS
+    try:
+        dictStats = await anyio.to_thread.run_sync(v1_reloadTaxonomy, inputRebuild)
+        return {"pid": os.getpid(), "taxonomy": dictStats}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.post("/v1_taxonomySync")
+async def v1_taxonomySync(
+    inputFull: Annotated[bool, Form()] = False
+):
+    # PULL CHANGED TAXONOMY ROWS FROM SALESFORCE (ALL ROWS WHEN inputFull), WRITE AND LOAD THE TAXONOMY SNAPSHOT
+    try:
+        return await anyio.to_thread.run_sync(v1_syncTaxonomyFromSFDC, None, inputFull)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
 @app.post("/v1_get_products_and_suppliers")
 async def v1_get_products_and_suppliers(
     inputListDocumentation: Annotated[List[UploadFile], File(...)],
-    inputSecret: Annotated[str, Form(...)]):
+    inputSecret: Annotated[str, Form(...)],
+    inputOcrLayout: Annotated[bool, Form()] = False):
 
     if str(inputSecret) == os.getenv('CUSTOM_SECRET1'):
+        v1_setRequestDeadline()
         # INIT FILES
-        stg_lsTempFile = v1_saveUploadFilesTemporarly(inputListDocumentation)
+        stg_lsTempFile = await asyncio.to_thread(v1_saveUploadFilesToBlobStore, inputListDocumentation)  # HASH + WRITE OFF THE EVENT LOOP
         mainDict = {
             'inputListDocumentation': inputListDocumentation,
             'inputSecret': inputSecret,
             'stg_lsTempFile': stg_lsTempFile}
+        # PAGE IMAGES - PAGE SELECTION AND RENDERING WHILE OCR RUNS
+        prefetchTask = asyncio.create_task(asyncio.to_thread(v1_prefetchVisionPageImages, mainDict))
         # PARSED_TO_TEXT
-        stg_lsParsedText = v1_parsePDF(stg_lsTempFile)
+        stg_lsParsedText, mainDict['stg_lsParseError'], mainDict['stg_lsOcrStats'] = await v1_parsePDFAsync(stg_lsTempFile, layout=inputOcrLayout)
         mainDict['stg_lsParsedText'] = stg_lsParsedText
         mainDict['stg_parsedText'] = "\n\n".join(stg_lsParsedText)
-        # READ_PDF_TO_BASE64
-        stg_lsBase64 = v1_readPDFToBase64(stg_lsTempFile)
-        mainDict['stg_lsBase64'] = stg_lsBase64
         # GET PRODUCTS AND SUPPLIERS
-        mainDict['products_and_suppliers'] = v1_getProductNameAndSupplierFromTextAndImage(mainDict)
+        await prefetchTask  # PAGE SELECTION DONE, RENDERING SUBMITTED
+        await asyncio.to_thread(v1_getVisionPageImages, mainDict)  # WAIT FOR PAGE IMAGES OFF THE EVENT LOOP
+        mainDict['products_and_suppliers'] = await v1_runStepsAsync(v1_getProductNameAndSupplierFromTextAndImageSteps(mainDict))
         # FINALIZE
         mainDict['inputListDocumentation'] = 'HIDDEN'
         mainDict['inputSecret'] = 'HIDDEN'
@@ -421,6 +535,7 @@ async def v1_get_products_and_suppliers(
         mainDict['stg_lsParsedText'] = 'HIDDEN'
         mainDict['stg_parsedText'] = 'HIDDEN'
         mainDict['stg_lsBase64'] = 'HIDDEN'
+        mainDict['stg_pageImages'] = 'HIDDEN'
         return mainDict
     else:
         return HTTPException(status_code=401)
@@ -432,14 +547,18 @@ async def v1_parse_pim_fields(
     inputListDocumentation: Annotated[List[UploadFile], File(...)],
     inputSecret: Annotated[str, Form(...)],
     inputWebSearch: Annotated[bool, Form()] = False,
-    inputParallel: Annotated[bool, Form()] = False):
+    inputParallel: Annotated[bool, Form()] = False,
+    inputOcrLayout: Annotated[bool, Form()] = False,
+    inputHedging: Annotated[bool, Form()] = False,
+    inputConsolidated: Annotated[bool, Form()] = False,
+    inputHierarchicalPruning: Annotated[bool, Form()] = False):
 
     if str(inputSecret) == os.getenv('CUSTOM_SECRET1'):
         try:
             # TIME START
             time_start = datetime.datetime.now()
             # SAVE UPLOADED FIELS TEMPORARILY
-            stg_lsTempFile = v1_saveUploadFilesTemporarly(inputListDocumentation)
+            stg_lsTempFile = await asyncio.to_thread(v1_saveUploadFilesToBlobStore, inputListDocumentation)  # HASH + WRITE OFF THE EVENT LOOP
             # MAINDICT
             mainDict = {}
             mainDict['inputProductName'] = inputProductName
@@ -448,6 +567,10 @@ async def v1_parse_pim_fields(
             mainDict['inputSecret'] = inputSecret
             mainDict['inputWebSearch'] = inputWebSearch
             mainDict['inputParallel'] = inputParallel
+            mainDict['inputOcrLayout'] = inputOcrLayout
+            mainDict['inputHedging'] = inputHedging
+            mainDict['inputConsolidated'] = inputConsolidated
+            mainDict['inputHierarchicalPruning'] = inputHierarchicalPruning
             mainDict['stg_lsTempFile'] = stg_lsTempFile
             # RUN MAIN
             mainDict = await run_main(mainDict, time_start)
@@ -458,30 +581,46 @@ async def v1_parse_pim_fields(
         return HTTPException(status_code=401)
 
 
-@app.post("/v1_parse_pim_fields_b64")
-async def v1_parse_pim_fields_b64(
-    inputProductName: Annotated[str, Form(...)],
-    inputBusinessLine: Annotated[str, Form(...)],
-    inputListDocumentationB64: Annotated[List[str], Body(...)],
-    inputSecret: Annotated[str, Form(...)],
-    inputWebSearch: Annotated[bool, Form()] = False,
-    inputParallel: Annotated[bool, Form()] = False):
-
-    if str(inputSecret) == os.getenv('CUSTOM_SECRET1'):
+@app.post("/v1_parse_pim_fields_b64", openapi_extra={
+    # BODY IS PARSED AS A STREAM (SEE v1_parseFormStreamB64), SCHEMA KEPT FOR THE DOCS
+    # application/x-www-form-urlencoded (requests.post(url, data=data)) IS ACCEPTED WITH THE SAME FIELDS
+    "requestBody": {"required": True, "content": {"multipart/form-data": {"schema": {
+        "type": "object",
+        "required": ["inputProductName", "inputBusinessLine", "inputListDocumentationB64", "inputSecret"],
+        "properties": {
+            "inputProductName": {"type": "string"},
+            "inputBusinessLine": {"type": "string"},
+            "inputListDocumentationB64": {"type": "array", "items": {"type": "string"}},
+            "inputSecret": {"type": "string"},
+            "inputWebSearch": {"type": "boolean", "default": False},
+            "inputParallel": {"type": "boolean", "default": False},
+            "inputOcrLayout": {"type": "boolean", "default": False},
+            "inputHedging": {"type": "boolean", "default": False},
+            "inputConsolidated": {"type": "boolean", "default": False},
+            "inputHierarchicalPruning": {"type": "boolean", "default": False}}}}}}})
+async def v1_parse_pim_fields_b64(request: Request):
+    # TIME START
+    time_start = datetime.datetime.now()
+    # STREAM BODY, DECODE BASE64 DOCUMENTS STRAIGHT INTO PRIVATE BLOB STORE FILES
+    formFields, lsBlob = await v1_parseFormStreamB64(request)
+    inputSecret = v1_formValue(formFields, 'inputSecret')
+
+    # DOCUMENTS ARE PUBLISHED ONLY AFTER THE SECRET CHECK, UNAUTHORIZED UPLOADS ARE DELETED
+    if inputSecret is not None and str(inputSecret) == os.getenv('CUSTOM_SECRET1'):
+        stg_lsTempFile = v1_publishFormBlobs(lsBlob)
         try:
-            # TIME START
-            time_start = datetime.datetime.now()
-            # SAVE UPLOADED FIELS TEMPORARILY
-            inputListDocumentation = inputListDocumentationB64
-            stg_lsTempFile = v1_saveUploadFilesTemporarlyB64(inputListDocumentation)
             # MAINDICT
             mainDict = {}
-            mainDict['inputProductName'] = inputProductName
-            mainDict['inputBusinessLine'] = inputBusinessLine
-            mainDict['inputListDocumentation'] = inputListDocumentation
+            mainDict['inputProductName'] = v1_formValue(formFields, 'inputProductName', required=True)
+            mainDict['inputBusinessLine'] = v1_formValue(formFields, 'inputBusinessLine', required=True)
+            mainDict['inputListDocumentation'] = [x['sha256'] for x in stg_lsTempFile]
             mainDict['inputSecret'] = inputSecret
-            mainDict['inputWebSearch'] = inputWebSearch
-            mainDict['inputParallel'] = inputParallel
+            mainDict['inputWebSearch'] = v1_formBool(formFields, 'inputWebSearch')
+            mainDict['inputParallel'] = v1_formBool(formFields, 'inputParallel')
+            mainDict['inputOcrLayout'] = v1_formBool(formFields, 'inputOcrLayout')
+            mainDict['inputHedging'] = v1_formBool(formFields, 'inputHedging')
+            mainDict['inputConsolidated'] = v1_formBool(formFields, 'inputConsolidated')
+            mainDict['inputHierarchicalPruning'] = v1_formBool(formFields, 'inputHierarchicalPruning')
             mainDict['stg_lsTempFile'] = stg_lsTempFile
             # RUN MAIN
             mainDict = await run_main(mainDict, time_start)
@@ -489,4 +628,7 @@ async def v1_parse_pim_fields_b64(
         except Exception as e:
             raise HTTPException(status_code=500, detail=str(e))
     else:
-        return HTTPException(status_code=401)
\ No newline at end of file
+        v1_discardFormBlobs(lsBlob)
+        if inputSecret is None:
+            raise HTTPException(status_code=422, detail="Missing form field: inputSecret")
+        return HTTPException(status_code=401)
@@ -0,0 +1,90 @@
+# BENCHMARK STAGE 5: FAN-OUT ("inputParallel") VS CONSOLIDATED ("inputConsolidated")
+# Usage: python ZTST_BenchStage5Modes.py [pdf folder] [business line]
+# Env "BENCH_API_URL" (default http://127.0.0.1:8000), "CUSTOM_SECRET1"
+import os
+import sys
+import time
+import json
+import requests
+import urllib3
+urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
+
+from dotenv import load_dotenv
+load_dotenv()
+
+API_URL = os.getenv('BENCH_API_URL', 'http://127.0.0.1:8000')
+PDF_PATH = sys.argv[1] if len(sys.argv) > 1 else 'pdfSCI/'
+BUSINESS_LINE = sys.argv[2] if len(sys.argv) > 2 else 'SCI'
+DICT_MODE = {
+    'fanout': {"inputParallel": "true", "inputConsolidated": "false"},
+    'consolidated': {"inputParallel": "false", "inputConsolidated": "true"}}
+LS_FIELD = [
+    'gpt_select_industry_cluster_answer',
+    'gpt_select_compositions_answer',
+    'gpt_select_functions_answer',
+    'gpt_select_applications_answer',
+    'gpt_cas_from_doc_answer',
+    'gpt_physical_form_answer',
+    'gpt_gen_product_description',
+    'gpt_recommended_dosage_answer',
+    'gpt_certifications_answer',
+    'gpt_claims_answer',
+    'gpt_health_benefits_answer']
+
+def callParsePIM(full_path, product_name, dictMode):
+    data = {
+        "inputProductName": product_name,
+        "inputBusinessLine": BUSINESS_LINE,
+        "inputSecret": os.getenv('CUSTOM_SECRET1'),
+        "inputWebSearch": "true",
+        **dictMode}
+    with open(full_path, 'rb') as f:
+        files = [("inputListDocumentation", (os.path.basename(full_path), f, "application/pdf"))]
+        time_start = time.monotonic()
+        response = requests.post(f"{API_URL}/v1_parse_pim_fields", data=data, files=files, timeout=900, verify=False)
+    response.raise_for_status()
+    res = response.json()
+    # REMOVE HISTORY SO THE NEXT MODE IS NOT SERVED FROM CACHE
+    requests.post(f"{API_URL}/v1_histAPICalls_delete", data={'stg_hashCombined': res['stg_hashCombined']}, verify=False)
+    res['wall_seconds'] = time.monotonic() - time_start
+    return res
+
+def agreement(a, b):
+    # LISTS: JACCARD, OTHERS: EXACT MATCH (CASE/SPACE INSENSITIVE)
+    if isinstance(a, list) and isinstance(b, list):
+        setA, setB = set(map(str, a)), set(map(str, b))
+        return 1.0 if not setA and not setB else len(setA & setB) / len(setA | setB)
+    return float(str(a).strip().lower() == str(b).strip().lower())
+
+def usageTotal(res):
+    # WHOLE REQUEST, STAGES 1-4 ARE THE SAME IN BOTH MODES SO THE DIFFERENCE IS STAGE 5
+    dictSummary = res.get('stg_llmUsageSummary') or {}
+    return dictSummary.get('calls', 0), dictSummary.get('prompt_tokens', 0) + dictSummary.get('completion_tokens', 0)
+
+if __name__ == '__main__':
+    lsRow = []
+    for file_name in sorted(f for f in os.listdir(PDF_PATH) if f.lower().endswith('.pdf')):
+        product_name = os.path.splitext(file_name)[0].removeprefix('TDS - ')
+        dictRes = {}
+        try:
+            for mode, dictMode in DICT_MODE.items():
+                dictRes[mode] = callParsePIM(os.path.join(PDF_PATH, file_name), product_name, dictMode)
+        except Exception as e:
+            print('FAILURE ', file_name, e)
+            continue
+        row = {'file': file_name}
+        for mode, res in dictRes.items():
+            row[f'{mode}_seconds'] = round(res['wall_seconds'], 1)
+            row[f'{mode}_calls'], row[f'{mode}_tokens'] = usageTotal(res)
+        row['agreement'] = {field: round(agreement(dictRes['fanout'].get(field), dictRes['consolidated'].get(field)), 2) for field in LS_FIELD}
+        lsRow.append(row)
+        print('SUCCESS ', json.dumps(row, ensure_ascii=False))
+
+    # SUMMARY
+    if lsRow:
+        n = len(lsRow)
+        print(f"\nFILES {n}")
+        for mode in DICT_MODE:
+            print(f"{mode:13s} avg {sum(r[f'{mode}_seconds'] for r in lsRow) / n:7.1f} s   avg {sum(r[f'{mode}_calls'] for r in lsRow) / n:5.1f} calls   avg {sum(r[f'{mode}_tokens'] for r in lsRow) / n:9.0f} tokens")
+        for field in LS_FIELD:
+            print(f"{field:40s} agreement {sum(r['agreement'][field] for r in lsRow) / n:.2f}")
@@ -0,0 +1,72 @@
+# HEDGED STAGE 5 CALLS AGAINST STAND-IN ATTEMPTS (NO AZURE OPENAI ACCESS NEEDED)
+# Usage: python ZTST_Hedge.py
+# Each case replaces v1_customCallAPIAsync with a coroutine whose outcome and finish time the case controls,
+# including primary and hedge finishing in the same asyncio.wait round and attempts that raise.
+import os
+import sys
+import asyncio
+import datetime
+
+# LOW HEDGE THRESHOLD AND ENOUGH BUDGET FOR EVERY CASE, SET BEFORE customutils READS ITS CONFIG
+os.environ['HEDGE_MIN_SAMPLES'] = '5'
+os.environ['HEDGE_MIN_DELAY_SECONDS'] = '0.05'
+os.environ['HEDGE_BUDGET_BURST'] = '100'
+import customutils
+from customutils import v1_customCallAPIHedgedAsync, v1_recordCallLatency, v1_getHedgeStats
+
+CALL_TYPE = 'ztst_hedge'
+SUCCESS = (0, {'choices': []}, {'answer': 'ok'})
+FAILURE = (1, {'error': 'stand-in failure'}, {'error': 'stand-in failure'})
+
+def standInAttempts(lsOutcome, release):
+    # ATTEMPT i WAITS FOR release (ALL ATTEMPTS FINISH TOGETHER) OR ITS OWN DELAY, THEN RETURNS OR RAISES lsOutcome[i]
+    lsStarted = []
+    async def attempt(url, body, headers={}, params={}, call_type=None):
+        outcome, delay = lsOutcome[len(lsStarted)]
+        lsStarted.append(outcome)
+        if release is not None:
+            await release.wait()
+        else:
+            await asyncio.sleep(delay)
+        if isinstance(outcome, Exception):
+            raise outcome
+        return outcome
+    return attempt, lsStarted
+
+async def runCase(lsOutcome, together):
+    release = asyncio.Event() if together else None
+    customutils.v1_customCallAPIAsync, lsStarted = standInAttempts(lsOutcome, release)
+    task = asyncio.ensure_future(v1_customCallAPIHedgedAsync(CALL_TYPE, 'https://stand-in/x', {}))
+    if together:
+        while len(lsStarted) < 2:  # PRIMARY PAST THE THRESHOLD, HEDGE SENT
+            await asyncio.sleep(0.01)
+        release.set()
+    return await task, len(lsStarted)
+
+def check(name, condition):
+    print('SUCCESS ' if condition else 'FAILURE ', name)
+    return condition
+
+async def main():
+    for _ in range(5):
+        v1_recordCallLatency(CALL_TYPE, 0.01)
+    lsResult = []
+    result, n = await runCase([(FAILURE, 0), (SUCCESS, 0)], together=True)
+    lsResult.append(check('same round: primary fails, hedge succeeds', n == 2 and result == SUCCESS))
+    result, n = await runCase([(SUCCESS, 0), (FAILURE, 0)], together=True)
+    lsResult.append(check('same round: primary succeeds, hedge fails', n == 2 and result == SUCCESS))
+    result, n = await runCase([(RuntimeError('primary raised'), 0), (SUCCESS, 0)], together=True)
+    lsResult.append(check('same round: primary raises, hedge succeeds', n == 2 and result == SUCCESS))
+    result, n = await runCase([(RuntimeError('primary raised'), 0.2), (SUCCESS, 0.4)], together=False)
+    lsResult.append(check('primary raises first, hedge answer kept', n == 2 and result == SUCCESS))
+    result, n = await runCase([(FAILURE, 0), (RuntimeError('hedge raised'), 0)], together=True)
+    lsResult.append(check('both fail: failure returned, nothing raised', n == 2 and result[0] == 1))
+    result, n = await runCase([(SUCCESS, 0.01)], together=False)
+    lsResult.append(check('fast primary: no hedge', n == 1 and result == SUCCESS))
+    print(v1_getHedgeStats())
+    return lsResult
+
+if __name__ == '__main__':
+    lsResult = asyncio.run(main())
+    print(f"\n{sum(lsResult)}/{len(lsResult)} checks passed ({datetime.datetime.now().isoformat(timespec='seconds')})")
+    sys.exit(0 if all(lsResult) else 1)
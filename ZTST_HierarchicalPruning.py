@@ -0,0 +1,85 @@
+# HIERARCHICAL PRUNING ON A SAMPLE SNAPSHOT (NO SALESFORCE OR AZURE OPENAI ACCESS NEEDED)
+# Usage: python ZTST_HierarchicalPruning.py
+# The sample functions workbook is ZMAP_Functions.xlsx plus the "Industry_Cluster_Name" column (SCI functions spread
+# over the SCI clusters), the snapshot is built from it and v1_pruneByCluster must keep only the selected cluster's options.
+import os
+import sys
+import tempfile
+import datetime
+import openpyxl
+
+# SNAPSHOTS IN A TEMP FOLDER, SET BEFORE customutils READS ITS CONFIG
+TEMP_DIR = tempfile.mkdtemp(prefix='ztst_pruning_')
+os.environ['TAXONOMY_SNAPSHOT'] = os.path.join(TEMP_DIR, 'taxonomy.pkl')
+os.environ['SFDC_SYNC_SNAPSHOT'] = os.path.join(TEMP_DIR, 'sfdc_sync.pkl')
+os.environ['TAXONOMY_CHECK_SECONDS'] = '0'
+from customutils import v1_buildTaxonomySnapshot, v1_loadTaxonomySnapshot, v1_getTaxonomy, v1_getTaxonomyStats, v1_pruneByCluster, v1_selectionOptions
+from customutils import PIM_buildBodySelectFunction, TAXONOMY_CLUSTER_COLUMN
+
+LS_CLUSTER_SCI = ['Electronics & Specialties (ES)', 'Paints & Coatings (PC)', 'Polymers (PO)', 'Agrochemicals (AG)']
+
+def writeSampleWorkbook(path):
+    # SCI FUNCTION i -> CLUSTER i MOD 4, "Other(s)" OPTIONS AND OTHER BUSINESS LINES WITHOUT CLUSTER
+    wbIn = openpyxl.load_workbook('ZMAP_Functions.xlsx', read_only=True, data_only=True)
+    rows = wbIn.worksheets[0].iter_rows(values_only=True)
+    header = list(next(rows))
+    wbOut = openpyxl.Workbook()
+    wsOut = wbOut.active
+    wsOut.append(header[:2] + [TAXONOMY_CLUSTER_COLUMN])
+    i_sci = 0
+    for business_line, name, *_ in rows:
+        cluster = None
+        if business_line and name and business_line.endswith('(SCI)') and 'other' not in str(name).lower():
+            cluster = LS_CLUSTER_SCI[i_sci % len(LS_CLUSTER_SCI)]
+            i_sci += 1
+        wsOut.append([business_line, name, cluster])
+    wbIn.close()
+    wbOut.save(path)
+
+def pruningDict(lsCluster, confidence='high'):
+    return {'inputHierarchicalPruning': True, 'inputBusinessLine': 'SCI',
+            'gpt_select_industry_cluster_answer': lsCluster, 'gpt_select_industry_cluster_confidence': confidence}
+
+def check(name, condition):
+    print('SUCCESS ' if condition else 'FAILURE ', name)
+    return condition
+
+if __name__ == '__main__':
+    lsResult = []
+
+    # SHIPPED WORKBOOKS: NO CLUSTER COLUMN, THE ENDPOINT OUTPUT SAYS PRUNING HAS NO MAPPING
+    v1_buildTaxonomySnapshot({'functions': 'ZMAP_Functions.xlsx'}, path=os.environ['TAXONOMY_SNAPSHOT'])
+    v1_loadTaxonomySnapshot(os.environ['TAXONOMY_SNAPSHOT'])
+    mainDict = pruningDict(['Polymers (PO)'])
+    lsResult.append(check('shipped workbook: full list, no_cluster_mapping', v1_pruneByCluster(mainDict, PIM_buildBodySelectFunction, 'functions') is None
+                          and mainDict['stg_hierarchicalPruning']['functions'] == {'fallback': 'no_cluster_mapping'}
+                          and 'functions|SCI' in v1_getTaxonomyStats()['no_cluster_mapping']))
+
+    # SAMPLE WORKBOOK WITH CLUSTER COLUMN
+    sample_path = os.path.join(TEMP_DIR, 'ZMAP_Functions_Clusters.xlsx')
+    writeSampleWorkbook(sample_path)
+    v1_buildTaxonomySnapshot({'functions': sample_path}, path=os.environ['TAXONOMY_SNAPSHOT'])
+    v1_loadTaxonomySnapshot(os.environ['TAXONOMY_SNAPSHOT'])
+    lsResult.append(check('sample workbook: SCI mapped', 'functions|SCI' not in v1_getTaxonomyStats()['no_cluster_mapping']))
+    lsOption = v1_selectionOptions(PIM_buildBodySelectFunction, 'SCI')
+    mainDict = pruningDict(['Polymers (PO)'])
+    candidates = v1_pruneByCluster(mainDict, PIM_buildBodySelectFunction, 'functions')
+    print(mainDict['stg_hierarchicalPruning'])
+    lsResult.append(check('pruning removes candidates', candidates is not None and len(candidates) < len(lsOption)))
+    dictNameCluster = v1_getTaxonomy()['clusters']['functions']['SCI']
+    lsResult.append(check('pruning keeps the cluster and "Other(s)" options', candidates is not None 
+                          and all(dictNameCluster.get(name) == ['Polymers (PO)'] or 'other' in name.lower() for name in candidates)
+                          and any('other' in name.lower() for name in candidates)))
+    lsPolymers = [name for name in lsOption if name in (candidates or [])]
+    lsResult.append(check('pruning keeps list order', lsPolymers == candidates))
+
+    # FALLBACKS STILL APPLY ON THE SAMPLE SNAPSHOT
+    mainDict = pruningDict(['Polymers (PO)'], confidence='medium')
+    lsResult.append(check('low confidence: full list', v1_pruneByCluster(mainDict, PIM_buildBodySelectFunction, 'functions') is None
+                          and mainDict['stg_hierarchicalPruning']['functions']['fallback'] == 'low_confidence'))
+    mainDict = pruningDict(LS_CLUSTER_SCI[:3])
+    lsResult.append(check('too many clusters: full list', v1_pruneByCluster(mainDict, PIM_buildBodySelectFunction, 'functions') is None
+                          and mainDict['stg_hierarchicalPruning']['functions']['fallback'] == 'cluster_count'))
+
+    print(f"\n{sum(lsResult)}/{len(lsResult)} checks passed ({datetime.datetime.now().isoformat(timespec='seconds')}), snapshots in {TEMP_DIR}")
+    sys.exit(0 if all(lsResult) else 1)
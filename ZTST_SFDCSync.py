@@ -0,0 +1,113 @@
+# SALESFORCE TAXONOMY SYNC AGAINST A STAND-IN CONNECTION (NO SALESFORCE ACCESS NEEDED)
+# Usage: python ZTST_SFDCSync.py
+# The stand-in answers query_all() from rows built out of the ZMAP workbooks and covers a full pull,
+# a delta with one inserted and one deleted function, an expired session, and a registry rebuild that must keep the synced lists.
+import os
+import re
+import sys
+import tempfile
+import datetime
+import openpyxl
+import simple_salesforce
+
+# SNAPSHOTS IN A TEMP FOLDER, SET BEFORE customutils READS ITS CONFIG
+TEMP_DIR = tempfile.mkdtemp(prefix='ztst_sfdc_')
+os.environ['TAXONOMY_SNAPSHOT'] = os.path.join(TEMP_DIR, 'taxonomy.pkl')
+os.environ['SFDC_SYNC_SNAPSHOT'] = os.path.join(TEMP_DIR, 'sfdc_sync.pkl')
+os.environ['TAXONOMY_CHECK_SECONDS'] = '0'
+import customutils
+from customutils import v1_syncTaxonomyFromSFDC, v1_reloadTaxonomy, v1_taxonomyList, v1_readTaxonomyWorkbook, v1_sfdcWatermark
+from customutils import v1_getTaxonomy, v1_writeTaxonomySnapshot, v1_loadTaxonomySnapshot
+
+STAMP_FULL = '2026-01-16T09:50:00.000+0000'
+STAMP_DELTA = '2026-10-18T08:00:00.000+0000'
+
+class StandInSalesforce:
+    # SAME query_all CONTRACT AS simple_salesforce.Salesforce FOR "SELECT cols FROM obj [WHERE SystemModstamp >= X]"
+    def __init__(self):
+        self.tables = {'Industry_Cluster__c': [], 'function__c': [], 'application__c': []}
+        self.queries = []
+        self.expire_next = False
+        dictClusterId = {}
+        for file, object_name in (('ZMAP_Functions.xlsx', 'function__c'), ('ZMAP_Applications.xlsx', 'application__c')):
+            wb = openpyxl.load_workbook(file, read_only=True, data_only=True)
+            rows = wb.worksheets[0].iter_rows(values_only=True)
+            next(rows)
+            for i, (business_line, name, *_) in enumerate(rows):
+                if business_line is None or name is None:
+                    continue
+                cluster_id = dictClusterId.setdefault(business_line, f"IC{len(dictClusterId)}")
+                self.tables[object_name].append({'Id': f"{object_name[:3]}{i}", 'Name': str(name).strip(), 'Industry_Cluster__c': cluster_id,
+                                                 'IsDeleted': False, 'SystemModstamp': STAMP_FULL})
+            wb.close()
+        for business_line, cluster_id in dictClusterId.items():
+            self.tables['Industry_Cluster__c'].append({'Id': cluster_id, 'Name': f"Cluster {business_line}", 'Business_Line_Name_Formula__c': business_line,
+                                                       'IsDeleted': False, 'SystemModstamp': STAMP_FULL})
+
+    def query_all(self, soql, include_deleted=False):
+        if self.expire_next:
+            self.expire_next = False
+            raise simple_salesforce.exceptions.SalesforceExpiredSession('stand-in', 401, 'query', [{'errorCode': 'INVALID_SESSION_ID'}])
+        self.queries.append(soql)
+        match = re.match(r'SELECT (.+) FROM (\w+)(?: WHERE SystemModstamp >= (\S+))?$', soql)
+        lsColumn = [column.strip() for column in match.group(1).split(',')]
+        object_name, since = match.group(2), match.group(3)
+        lsRecord = [{'attributes': {'type': object_name}, **{column: row[column] for column in lsColumn}}
+                    for row in self.tables[object_name]
+                    if (include_deleted or not row['IsDeleted']) and (since is None or v1_sfdcWatermark(row['SystemModstamp']) >= since)]
+        return {'totalSize': len(lsRecord), 'done': True, 'records': lsRecord}
+
+def check(name, condition):
+    print('SUCCESS ' if condition else 'FAILURE ', name)
+    return condition
+
+if __name__ == '__main__':
+    sfConn = StandInSalesforce()
+    dictWorkbook = {'functions': v1_readTaxonomyWorkbook('ZMAP_Functions.xlsx'), 'applications': v1_readTaxonomyWorkbook('ZMAP_Applications.xlsx')}
+    v1_reloadTaxonomy(rebuild=True)
+    # A BUSINESS LINE SALESFORCE DOES NOT HAVE, MUST SURVIVE THE SYNC
+    taxonomy = v1_getTaxonomy()
+    dictLists = {kind: dict(dictBL) for kind, dictBL in taxonomy['lists'].items()}
+    dictLists['functions']['ZZ'] = ['Zz Registry-Only Function']
+    v1_writeTaxonomySnapshot(dictLists, taxonomy['source'])
+    v1_loadTaxonomySnapshot()
+    lsResult = []
+
+    # FULL PULL: SAME LISTS AS THE WORKBOOKS, CLUSTER MAPPING FOR EVERY NAME
+    result = v1_syncTaxonomyFromSFDC(sfConn, full=True)
+    lsResult.append(check('full pull without WHERE', result['full'] and all('WHERE' not in soql for soql in sfConn.queries)))
+    lsResult.append(check('full pull lists equal workbooks', all(v1_taxonomyList(kind, business_line, None) == lsName
+                                                                 for kind, dictBL in dictWorkbook.items() for business_line, lsName in dictBL.items())))
+    lsResult.append(check('full pull clusters', all(result['taxonomy']['with_clusters'][kind].get(business_line) == n 
+                                                    for kind, dictBL in result['taxonomy']['count'].items() for business_line, n in dictBL.items() if business_line != 'ZZ')))
+    lsResult.append(check('full pull keeps business lines not in SFDC', v1_taxonomyList('functions', 'ZZ', None) == ['Zz Registry-Only Function']))
+
+    # DELTA: ONE INSERTED, ONE DELETED FUNCTION, ONLY ROWS SINCE THE WATERMARK ARE READ
+    sfConn.queries.clear()
+    n_function = result['objects']['function__c']['total']
+    deleted = sfConn.tables['function__c'][0]
+    deleted.update(IsDeleted=True, SystemModstamp=STAMP_DELTA)
+    business_line = next(c for c in sfConn.tables['Industry_Cluster__c'] if c['Id'] == deleted['Industry_Cluster__c'])['Business_Line_Name_Formula__c']
+    sfConn.tables['function__c'].append({'Id': 'funNEW', 'Name': 'Zz Stand-In Function', 'Industry_Cluster__c': deleted['Industry_Cluster__c'],
+                                         'IsDeleted': False, 'SystemModstamp': STAMP_DELTA})
+    result = v1_syncTaxonomyFromSFDC(sfConn)
+    lsFunction = v1_taxonomyList('functions', re.search(r'\((\w+)\)', business_line).group(1), None)
+    lsResult.append(check('delta with WHERE', not result['full'] and all('WHERE SystemModstamp >= ' in soql for soql in sfConn.queries)))
+    lsResult.append(check('delta record counts', result['objects']['function__c']['deleted'] == 1 and result['objects']['function__c']['total'] == n_function))
+    lsResult.append(check('delta insert appended', lsFunction[-1] == 'Zz Stand-In Function'))
+    lsResult.append(check('delta delete removed', deleted['Name'] not in lsFunction))
+
+    # EXPIRED SESSION ON OUR OWN CONNECTION: ONE RE-AUTHENTICATION, SYNC COMPLETES
+    lsConnect = []
+    customutils.v1_sfdcConnect = lambda refresh=False: lsConnect.append(refresh) or sfConn
+    sfConn.expire_next = True
+    result = v1_syncTaxonomyFromSFDC()
+    lsResult.append(check('expired session re-authenticates once', lsConnect == [False, True] and set(result['objects']) == set(customutils.SFDC_SYNC_OBJECTS)))
+
+    # REBUILD FROM WORKBOOKS KEEPS THE SYNCED LISTS AND CLUSTERS
+    stats = v1_reloadTaxonomy(rebuild=True)
+    lsResult.append(check('rebuild keeps synced lists', v1_taxonomyList('functions', re.search(r'\((\w+)\)', business_line).group(1), None) == lsFunction))
+    lsResult.append(check('rebuild keeps clusters', stats['with_clusters'] == stats['count'] and set(stats['source'].values()) == {'SFDC'}))
+
+    print(f"\n{sum(lsResult)}/{len(lsResult)} checks passed ({datetime.datetime.now().isoformat(timespec='seconds')}), snapshots in {TEMP_DIR}")
+    sys.exit(0 if all(lsResult) else 1)
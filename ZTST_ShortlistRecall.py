@@ -0,0 +1,15 @@
+# RECALL OF THE BM25 OPTION SHORTLIST AGAINST PAST MODEL ANSWERS IN histAPICalls/
+# Usage: python ZTST_ShortlistRecall.py [margin] [min options]
+# Default min options 0 measures every list, also the ones sent whole by the API ("OPTION_SHORTLIST_MIN_OPTIONS")
+import sys
+from customutils import v1_shortlistRecallReport
+
+MARGIN = int(sys.argv[1]) if len(sys.argv) > 1 else 0
+MIN_OPTIONS = int(sys.argv[2]) if len(sys.argv) > 2 else 0
+
+if __name__ == '__main__':
+    for top_k in (5, 10, 15, 20, 25, 30, 40):
+        result = v1_shortlistRecallReport(top_k=top_k, margin=MARGIN, min_options=MIN_OPTIONS)
+        for key, row in sorted(result['report'].items()):
+            print(f"K={top_k:3d}+{MARGIN:<3d} {key:20s} recall {row['recall']:.3f}   all kept {row['records_all_kept']:3d}/{row['records']:<3d}   sent {row['avg_sent']:6.1f} / {row['avg_options']:6.1f} options")
+        print()
@@ -1,5 +1,5 @@
 # GENERAL
-from fastapi import FastAPI, File, Form, UploadFile, HTTPException, Body
+from fastapi import FastAPI, File, Form, UploadFile, HTTPException, Body, Request
 from typing import Dict, Any
 from typing import List, Annotated
 import asyncio
@@ -13,19 +13,43 @@ import base64
 import datetime
 import hashlib
 import time
+import threading
+import contextvars
+import sqlite3
+import email.utils
+import concurrent.futures
+import collections
+import functools
+import multiprocessing
+import weakref
+import inspect
+import pickle
+import openpyxl
+import numpy as np
 import anyio
 import requests
+import httpx
 import json
+import re
+import unicodedata
 import simple_salesforce
 from PIL import Image
 
 # URLLIB3
 import urllib3
+import urllib.parse
 urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
 
 # AZURE AI DOCUMENT INTELLIGENCE
 from azure.core.credentials import AzureKeyCredential
+from azure.core.exceptions import HttpResponseError, ServiceRequestError, ServiceResponseError
 from azure.ai.documentintelligence import DocumentIntelligenceClient
+from azure.core.pipeline.transport import RequestsTransport
+from azure.core.polling.async_base_polling import AsyncLROBasePolling
+from azure.ai.documentintelligence.aio import DocumentIntelligenceClient as DocumentIntelligenceClientAsync
+
+# STREAMING MULTIPART PARSER (python-multipart, ALREADY USED BY FASTAPI FOR FORMS)
+from python_multipart.multipart import MultipartParser, QuerystringParser, parse_options_header
 
 # LOAD ENV VARIABLES
 from dotenv import load_dotenv
@@ -37,25 +61,211 @@ load_dotenv()
 ###############################################################################################################################################################################
 ###############################################################################################################################################################################
 
-def azureDocumentIntelligenceParsePDF(file_path, key):
-    document_intelligence_client = DocumentIntelligenceClient(
-        endpoint="https://document-intelligence-standard-s0-dksh-raw-tds-parser.cognitiveservices.azure.com/", credential=AzureKeyCredential(key))
+# SHARED DOCUMENT INTELLIGENCE CLIENT
+# One long-lived client per API key per process, its HTTP session keeps a connection pool sized for OCR concurrency.
+DOCUMENT_INTELLIGENCE_ENDPOINT = "https://document-intelligence-standard-s0-dksh-raw-tds-parser.cognitiveservices.azure.com/"
+OCR_MAX_CONCURRENCY = int(os.getenv('OCR_MAX_CONCURRENCY', '4'))
+OCR_CHUNK_PAGES = int(os.getenv('OCR_CHUNK_PAGES', '8'))
+OCR_MAX_PARALLEL_CHUNKS = int(os.getenv('OCR_MAX_PARALLEL_CHUNKS', '4'))
+_documentIntelligenceClients = {}
+_documentIntelligenceClientsLock = threading.Lock()
+
+def v1_getDocumentIntelligenceClient(key):
+    with _documentIntelligenceClientsLock:
+        client = _documentIntelligenceClients.get(key)
+        if client is None:
+            session = requests.Session()
+            adapter = requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=max(10, OCR_MAX_CONCURRENCY*OCR_MAX_PARALLEL_CHUNKS))
+            session.mount("https://", adapter)
+            client = DocumentIntelligenceClient(
+                endpoint=DOCUMENT_INTELLIGENCE_ENDPOINT, 
+                credential=AzureKeyCredential(key),
+                transport=RequestsTransport(session=session, session_owner=False))
+            _documentIntelligenceClients[key] = client
+    return client
+
+def azureDocumentIntelligenceAnalyzePages(file_path, key, model_id="prebuilt-read", pages=None, compact=False):
+    # RETURN {page_number: page_entry} (SEE v1_analyzeResultToPages), `pages` IS THE DI PAGE SELECTOR e.g. "1-3,5" (None = whole document)
+    document_intelligence_client = v1_getDocumentIntelligenceClient(key)
+    kwargs = {}
+    if pages:
+        kwargs['pages'] = pages
     with open(file_path, "rb") as f:
         poller = document_intelligence_client.begin_analyze_document(
-            "prebuilt-read", 
+            model_id, 
             f,
-            content_type="application/pdf")
+            content_type="application/pdf",
+            **kwargs)
         result = poller.result()
+    return v1_analyzeResultToPages(result, compact)
+
+def azureDocumentIntelligenceAnalyzePagesChunked(file_path, key, model_id="prebuilt-read", lsPages=None, compact=False):
+    # LONG DOCUMENTS ARE SPLIT INTO PAGE RANGES OF `OCR_CHUNK_PAGES`, ANALYZED CONCURRENTLY (MAX `OCR_MAX_PARALLEL_CHUNKS`)
+    # DI KEEPS THE ORIGINAL PAGE NUMBERS WHEN `pages` IS GIVEN, SO CHUNKS ARE STITCHED BACK BY page_number
+    if lsPages is None:
+        lsPages = list(range(1, v1_getPDFPageCount(file_path) + 1))
+    lsChunks = v1_splitPageChunks(lsPages)
+    if len(lsChunks) <= 1:
+        return azureDocumentIntelligenceAnalyzePages(file_path, key, model_id=model_id, pages=lsChunks[0] if lsChunks else None, compact=compact)
+    dictPageLines = {}
+    with concurrent.futures.ThreadPoolExecutor(max_workers=min(OCR_MAX_PARALLEL_CHUNKS, len(lsChunks)), thread_name_prefix='ocr-chunk') as executor:
+        futures = [executor.submit(azureDocumentIntelligenceAnalyzePages, file_path, key, model_id, pages, compact) for pages in lsChunks]
+        for future in futures:
+            dictPageLines.update(future.result())
+    return dictPageLines
+
+# ASYNC DOCUMENT INTELLIGENCE
+# Used by the API so OCR never blocks the event loop. Clients and semaphores are bound to an event loop,
+# so they are kept per loop (one per process under uvicorn).
+OCR_POLL_INITIAL_SECONDS = float(os.getenv('OCR_POLL_INITIAL_SECONDS', '0.5'))
+OCR_POLL_MAX_SECONDS = float(os.getenv('OCR_POLL_MAX_SECONDS', '3'))
+OCR_POLL_BACKOFF = float(os.getenv('OCR_POLL_BACKOFF', '1.5'))
+_asyncLoopState = weakref.WeakKeyDictionary()
+
+class AdaptiveAsyncLROPolling(AsyncLROBasePolling):
+    # POLL SOON AFTER SUBMIT (SMALL DOCUMENTS FINISH IN ~1s), THEN BACK OFF INSTEAD OF THE FIXED SERVICE DELAY
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._next_delay = OCR_POLL_INITIAL_SECONDS
+
+    def _extract_delay(self):
+        delay = self._next_delay
+        self._next_delay = min(self._next_delay * OCR_POLL_BACKOFF, OCR_POLL_MAX_SECONDS)
+        return delay
+
+def v1_getAsyncLoopState():
+    loop = asyncio.get_running_loop()
+    state = _asyncLoopState.get(loop)
+    if state is None:
+        state = {'di_clients': {}, 'ocr_semaphore': asyncio.Semaphore(OCR_MAX_CONCURRENCY)}
+        _asyncLoopState[loop] = state
+    return state
+
+def v1_getDocumentIntelligenceClientAsync(key):
+    clients = v1_getAsyncLoopState()['di_clients']
+    if key not in clients:
+        clients[key] = DocumentIntelligenceClientAsync(endpoint=DOCUMENT_INTELLIGENCE_ENDPOINT, credential=AzureKeyCredential(key))
+    return clients[key]
+
+async def v1_closeDocumentIntelligenceClientsAsync():
+    clients = v1_getAsyncLoopState()['di_clients']
+    while clients:
+        _, client = clients.popitem()
+        await client.close()
+
+async def azureDocumentIntelligenceAnalyzePagesAsync(file_path, key, model_id="prebuilt-read", pages=None, compact=False):
+    document_intelligence_client = v1_getDocumentIntelligenceClientAsync(key)
+    kwargs = {}
+    if pages:
+        kwargs['pages'] = pages
+    polling = AdaptiveAsyncLROPolling(OCR_POLL_INITIAL_SECONDS, path_format_arguments={"endpoint": DOCUMENT_INTELLIGENCE_ENDPOINT.rstrip('/')})
+    pdf_bytes = await asyncio.to_thread(v1_readFileBytes, file_path)
+    poller = await document_intelligence_client.begin_analyze_document(
+        model_id, 
+        pdf_bytes,
+        content_type="application/pdf",
+        polling=polling,
+        **kwargs)
+    result = await poller.result()
+    return v1_analyzeResultToPages(result, compact)
+
+async def azureDocumentIntelligenceAnalyzePagesChunkedAsync(file_path, key, model_id="prebuilt-read", lsPages=None, compact=False):
+    # SAME CHUNKING AS azureDocumentIntelligenceAnalyzePagesChunked, CONCURRENCY CAPPED BY A SEMAPHORE
+    if lsPages is None:
+        lsPages = list(range(1, await asyncio.to_thread(v1_getPDFPageCount, file_path) + 1))
+    lsChunks = v1_splitPageChunks(lsPages)
+    if len(lsChunks) <= 1:
+        return await azureDocumentIntelligenceAnalyzePagesAsync(file_path, key, model_id=model_id, pages=lsChunks[0] if lsChunks else None, compact=compact)
+    semaphore = asyncio.Semaphore(OCR_MAX_PARALLEL_CHUNKS)
+    async def _analyzeChunk(pages):
+        async with semaphore:
+            return await azureDocumentIntelligenceAnalyzePagesAsync(file_path, key, model_id=model_id, pages=pages, compact=compact)
+    dictPageLines = {}
+    for chunkPageLines in await asyncio.gather(*[_analyzeChunk(pages) for pages in lsChunks]):
+        dictPageLines.update(chunkPageLines)
+    return dictPageLines
+
+def v1_splitPageChunks(lsPages):
+    # [1..20] -> ["1-8", "9-16", "17-20"] WITH OCR_CHUNK_PAGES=8
+    lsPages = sorted(lsPages)
+    return [v1_pageRangesString(lsPages[i:i+OCR_CHUNK_PAGES]) for i in range(0, len(lsPages), max(1, OCR_CHUNK_PAGES))]
+
+def v1_getPDFPageCount(file_path):
+    with fitz.open(file_path) as doc:
+        return doc.page_count
+
+def v1_readFileBytes(file_path):
+    with open(file_path, "rb") as f:
+        return f.read()
+
+# PAGE ENTRY = {'lines': [...], 'flat_chars': int, 'source': 'ocr' | 'text'}
+# `flat_chars` IS THE SIZE OF THE PLAIN ONE-LINE-PER-LINE OUTPUT, USED TO REPORT SAVINGS OF THE COMPACT LAYOUT MODE
+LAYOUT_NOISE_ROLES = ('pageHeader', 'pageFooter', 'pageNumber')
+LAYOUT_NOISE_CONTENT = (':selected:', ':unselected:')
+
+def v1_analyzeResultToPages(result, compact=False):
+    dictPages = {}
+    for page in result.pages:
+        lines = [line.content for line in (page.lines or [])]
+        dictPages[page.page_number] = {'lines': lines, 'flat_chars': sum(len(x) + 1 for x in lines), 'source': 'ocr'}
+    if not compact:
+        return dictPages
+    # COMPACT: PARAGRAPHS WITHOUT HEADER/FOOTER NOISE + TABLES AS TSV GRIDS, IN READING ORDER (OFFSET IN result.content)
+    items = []
+    lsTableSpans = []
+    for table in (result.tables or []):
+        page_number = table.bounding_regions[0].page_number if table.bounding_regions else 1
+        lsTableSpans.extend((span.offset, span.offset + span.length) for span in (table.spans or []))
+        grid = [[''] * table.column_count for _ in range(table.row_count)]
+        for cell in table.cells:
+            grid[cell.row_index][cell.column_index] = cell.content
+        items.append((page_number, table.spans[0].offset if table.spans else 0, v1_tableRowsToTsv(grid)))
+    for paragraph in (result.paragraphs or []):
+        if paragraph.role in LAYOUT_NOISE_ROLES or paragraph.content.strip() in LAYOUT_NOISE_CONTENT:
+            continue
+        offset = paragraph.spans[0].offset if paragraph.spans else 0
+        if any(start <= offset < end for start, end in lsTableSpans):
+            continue  # CELL CONTENT, ALREADY IN THE TABLE GRID
+        page_number = paragraph.bounding_regions[0].page_number if paragraph.bounding_regions else 1
+        items.append((page_number, offset, [" ".join(paragraph.content.split())]))
+    for page_number in dictPages:
+        dictPages[page_number]['lines'] = []
+    for page_number, offset, lines in sorted(items, key=lambda item: (item[0], item[1])):
+        dictPages.setdefault(page_number, {'lines': [], 'flat_chars': 0, 'source': 'ocr'})['lines'].extend(lines)
+    return dictPages
+
+def v1_tableRowsToTsv(rows):
+    # MERGED CELLS ARE ALREADY EMPTY OUTSIDE THEIR FIRST POSITION (DI GRID IS FILLED AT THE SPAN ANCHOR ONLY,
+    # PyMuPDF RETURNS None FOR COVERED CELLS), EQUAL NEIGHBOURING VALUES ARE REAL DATA AND ARE KEPT
+    rows = [[" ".join((cell or '').split()) for cell in row] for row in rows]
+    rows = [row for row in rows if any(row)]
+    n_cols = max((len(row) for row in rows), default=0)
+    return [f"[TABLE {len(rows)}x{n_cols}]"] + ["\t".join(row).rstrip("\t") for row in rows]
+
+def v1_estimateTokens(n_chars):
+    # ~4 CHARACTERS PER TOKEN FOR ENGLISH TEXT WITH cl100k/o200k TOKENIZERS
+    return (n_chars + 3) // 4
+
+def v1_pageLinesToMarkdown(dictPages):
     # Build Markdown content from lines
     markdown_lines = []
-    for page_num, page in enumerate(result.pages):
-        markdown_lines.append(f"\n## Page {page_num + 1}\n")
-        for line in page.lines:
-            markdown_lines.append(line.content)
-    markdown_output = "\n".join(markdown_lines)
-    #print("Markdown Output:\n")
-    #print(markdown_output)
-    return markdown_output
+    for page_number in sorted(dictPages):
+        markdown_lines.append(f"\n## Page {page_number}\n")
+        markdown_lines.extend(dictPages[page_number]['lines'])
+    return "\n".join(markdown_lines)
+
+def v1_ocrStats(dictPages, model_id):
+    tokens_flat = v1_estimateTokens(sum(entry['flat_chars'] for entry in dictPages.values()))
+    tokens_output = v1_estimateTokens(sum(len(line) + 1 for entry in dictPages.values() for line in entry['lines']))
+    return {'model_id': model_id,
+            'pages_text_layer': sum(1 for entry in dictPages.values() if entry['source'] == 'text'),
+            'pages_ocr': sum(1 for entry in dictPages.values() if entry['source'] == 'ocr'),
+            'tokens_flat_estimate': tokens_flat,
+            'tokens_output_estimate': tokens_output,
+            'tokens_saved_estimate': tokens_flat - tokens_output}
+
+def azureDocumentIntelligenceParsePDF(file_path, key, model_id="prebuilt-read"):
+    return v1_pageLinesToMarkdown(azureDocumentIntelligenceAnalyzePages(file_path, key, model_id=model_id))
 
 def PIM_buildBodyGetProductNameAndSupplierFromTextAndImage(parsed_text, ls_base64):
     # SYSTEM PROMPT
@@ -124,7 +334,7 @@ def PIM_buildBodyGetProductNameAndSupplierFromTextAndImage(parsed_text, ls_base6
     for base64_img in ls_base64:
         messages.append({
             "role": "user", "content": [{"type": "image_url",
-                                         "image_url": {"url": f"data:image/png;base64,{base64_img}"}}]
+                                         "image_url": {"url": v1_toImageDataUrl(base64_img)}}]
         })
     # CONSTRUCT BODY
     body = {
@@ -189,7 +399,7 @@ def PIM_buildBodyGetManufacturerOrSupplier(parsed_text, product_name, ls_base64)
     for base64_img in ls_base64:
         messages.append({
             "role": "user", "content": [{"type": "image_url",
-                                         "image_url": {"url": f"data:image/png;base64,{base64_img}"}}]})
+                                         "image_url": {"url": v1_toImageDataUrl(base64_img)}}]})
     # CONSTRUCT BODY
     properties = {}
     properties["manufacturer_or_supplier"] = {"type": "string", "description": f"Give the manufacturer or supplier name. Focus on product [{product_name}]. No explanation"}
@@ -241,7 +451,7 @@ def PIM_buildBodyGetProductInfo(parsed_text, product_name, manufacturer_name, ls
     for base64_img in ls_base64:
         messages.append({
             "role": "user", "content": [{"type": "image_url",
-                                         "image_url": {"url": f"data:image/png;base64,{base64_img}"}}]
+                                         "image_url": {"url": v1_toImageDataUrl(base64_img)}}]
         })
     # CONSTRUCT BODY
     body = {
@@ -252,7 +462,7 @@ def PIM_buildBodyGetProductInfo(parsed_text, product_name, manufacturer_name, ls
         }
     return body
 
-def PIM_buildBodySelectIndustryCluster(parsed_text, product_name, manufacturer_name, ls_base64, business_line, searched_text=''):
+def PIM_buildBodySelectIndustryCluster(parsed_text, product_name, manufacturer_name, ls_base64, business_line, searched_text='', confidence=False):
     # Define mapping of business lines to industry clusters
 
     # OLD LIST
@@ -320,6 +530,8 @@ def PIM_buildBodySelectIndustryCluster(parsed_text, product_name, manufacturer_n
             'Agrochemicals (AG)']
 
 
+    # TAXONOMY REGISTRY FIRST, LIST ABOVE AS FALLBACK
+    selection_list = v1_taxonomyList('industry_clusters', business_line, selection_list)
     # SYSTEM PROMPT
     system_prompt = f"""
     # INSTRUCTION #
@@ -352,12 +564,17 @@ def PIM_buildBodySelectIndustryCluster(parsed_text, product_name, manufacturer_n
     for base64_img in ls_base64:
         messages.append({
             "role": "user", "content": [{"type": "image_url",
-                                         "image_url": {"url": f"data:image/png;base64,{base64_img}"}}]
+                                         "image_url": {"url": v1_toImageDataUrl(base64_img)}}]
         })
     # CONSTRUCT BODY
     properties = {name: {"type": "boolean", "description": f"True if the product is related or utilize in the {name} category"} for name in selection_list}
     properties['reason'] = {"type": "string", "description": "Reasoning for each option selected, grounded from given document"}
     required   = list(selection_list) + ['reason']
+    if confidence:
+        # ONLY ASKED WHEN THE ANSWER PRUNES THE FUNCTION/APPLICATION LISTS (inputHierarchicalPruning)
+        properties['confidence'] = {"type": "string", "enum": ["high", "medium", "low"], 
+                                    "description": "How clearly the given document supports the selected INDUSTRY CLUSTER(s): high = stated explicitly, medium = implied by the product use, low = guessed or unclear"}
+        required.append('confidence')
     json_schema = {
         "name": "flags_only",
         "strict": True,
@@ -404,6 +621,8 @@ def PIM_buildBodySelectComposition(parsed_text, product_name, manufacturer_name,
         "Synthetic",
         "Vegetal",
         ""]
+        # TAXONOMY REGISTRY FIRST, LIST ABOVE AS FALLBACK
+        selection_list = v1_taxonomyList('compositions', business_line, selection_list)
         system_prompt += """
         # OUTPUT FORMAT #
         {{
@@ -421,7 +640,7 @@ def PIM_buildBodySelectComposition(parsed_text, product_name, manufacturer_name,
         # ADD BASE64 IMAGES IF PROVIDED
         for base64_img in ls_base64:
             messages.append({"role": "user", 
-                            "content": [{"type": "image_url", "image_url": {"url": f"data:image/png;base64,{base64_img}"}}]})            
+                            "content": [{"type": "image_url", "image_url": {"url": v1_toImageDataUrl(base64_img)}}]})            
         # CONSTRUCT BODY
         properties = {name: {"type": "boolean", "description": f"True if any of the the composition/ingredients has source the is from {name} category"} for name in selection_list}
         properties['reason'] = {"type": "string", "description": "Reasoning for each option selected, grounded from given document"}
@@ -461,7 +680,7 @@ def PIM_buildBodySelectComposition(parsed_text, product_name, manufacturer_name,
         for base64_img in ls_base64:
             messages.append({
                 "role": "user", "content": [{"type": "image_url",
-                                            "image_url": {"url": f"data:image/png;base64,{base64_img}"}}]
+                                            "image_url": {"url": v1_toImageDataUrl(base64_img)}}]
             })
         # CONSTRUCT BODY
         properties = {}
@@ -489,7 +708,7 @@ def PIM_buildBodySelectComposition(parsed_text, product_name, manufacturer_name,
                 "json_schema": json_schema}}
     return body
 
-def PIM_buildBodySelectFunction(parsed_text, product_name, manufacturer_name, ls_base64, business_line, searched_text=''):
+def PIM_buildBodySelectFunction(parsed_text, product_name, manufacturer_name, ls_base64, business_line, searched_text='', candidates=None):
     # SELECTION LIST
     if business_line == 'FBI':
         # 2026-01-15 | Gates: Backup List
@@ -1069,6 +1288,11 @@ def PIM_buildBodySelectFunction(parsed_text, product_name, manufacturer_name, ls
             "ADDITIVES - Wetting Agent",
             "ADDITIVES - Emulsifier"]
 
+    # TAXONOMY REGISTRY FIRST, LIST ABOVE AS FALLBACK
+    selection_list = v1_taxonomyList('functions', business_line, selection_list)
+    # SHORTLISTED OPTIONS ONLY (SEE v1_shortlistCandidates), LIST ORDER KEPT
+    if candidates is not None:
+        selection_list = [name for name in selection_list if name in candidates]
     # SYSTEM PROMPT
     system_prompt = f"""
     # INSTRUCTION #
@@ -1101,7 +1325,7 @@ def PIM_buildBodySelectFunction(parsed_text, product_name, manufacturer_name, ls
     # ADD BASE64 IMAGES IF PROVIDED
     for base64_img in ls_base64:
         messages.append({"role": "user", 
-                         "content": [{"type": "image_url", "image_url": {"url": f"data:image/png;base64,{base64_img}"}}]})
+                         "content": [{"type": "image_url", "image_url": {"url": v1_toImageDataUrl(base64_img)}}]})
     # CONSTRUCT BODY
     properties = {name: {"type": "boolean", "description": f"True if the product exhibits {name} as the function"} for name in selection_list}
     properties['reason'] = {"type": "string", "description": "Reasoning for each option selected, grounded from given document"}
@@ -1126,7 +1350,7 @@ def PIM_buildBodySelectFunction(parsed_text, product_name, manufacturer_name, ls
     return body
 
 
-def PIM_buildBodySelectApplication(parsed_text, product_name, manufacturer_name, ls_base64, business_line, searched_text=''):
+def PIM_buildBodySelectApplication(parsed_text, product_name, manufacturer_name, ls_base64, business_line, searched_text='', candidates=None):
     # SELECTION LIST
     if business_line == 'FBI':
         # 2026-01-15 | Gates: Backup List
@@ -1434,6 +1658,11 @@ def PIM_buildBodySelectApplication(parsed_text, product_name, manufacturer_name,
             "Thermoplastic Transformers",
             "Thermosets & Composites"]
 
+    # TAXONOMY REGISTRY FIRST, LIST ABOVE AS FALLBACK
+    selection_list = v1_taxonomyList('applications', business_line, selection_list)
+    # SHORTLISTED OPTIONS ONLY (SEE v1_shortlistCandidates), LIST ORDER KEPT
+    if candidates is not None:
+        selection_list = [name for name in selection_list if name in candidates]
     # SYSTEM PROMPT
     system_prompt = f"""
     # INSTRUCTION #
@@ -1468,7 +1697,7 @@ def PIM_buildBodySelectApplication(parsed_text, product_name, manufacturer_name,
     # ADD BASE64 IMAGES IF PROVIDED
     for base64_img in ls_base64:
         messages.append({"role": "user", 
-                         "content": [{"type": "image_url", "image_url": {"url": f"data:image/png;base64,{base64_img}"}}]})
+                         "content": [{"type": "image_url", "image_url": {"url": v1_toImageDataUrl(base64_img)}}]})
     # CONSTRUCT BODY
     properties = {name: {"type": "boolean", "description": f"True if the product includes {name} as application"} for name in selection_list}
     properties['reason'] = {"type": "string", "description": "Reasoning for each option selected, grounded from given document"}
@@ -1521,7 +1750,7 @@ def PIM_buildBodyFindCASNumber(parsed_text, product_name, manufacturer_name, ls_
     for base64_img in ls_base64:
         messages.append({
             "role": "user", "content": [{"type": "image_url",
-                                         "image_url": {"url": f"data:image/png;base64,{base64_img}"}}]
+                                         "image_url": {"url": v1_toImageDataUrl(base64_img)}}]
         })
     # CONSTRUCT BODY
     properties = {}
@@ -1647,7 +1876,7 @@ def PIM_buildBodyFindPhysicalForm(parsed_text, product_name, manufacturer_name,
     for base64_img in ls_base64:
         messages.append({
             "role": "user", "content": [{"type": "image_url",
-                                         "image_url": {"url": f"data:image/png;base64,{base64_img}"}}]
+                                         "image_url": {"url": v1_toImageDataUrl(base64_img)}}]
         })
 
     # CONSTRUCT BODY
@@ -1725,7 +1954,7 @@ def PIM_buildBodyGetProductDescription(parsed_text, product_name, manufacturer_n
     for base64_img in ls_base64:
         messages.append({
             "role": "user", "content": [{"type": "image_url",
-                                             "image_url": {"url": f"data:image/png;base64,{base64_img}"}}]
+                                             "image_url": {"url": v1_toImageDataUrl(base64_img)}}]
         })
     # CONSTRUCT BODY
     properties = {}
@@ -1789,7 +2018,7 @@ def PIM_buildBodyGetRecommendedDosage(parsed_text, product_name, manufacturer_na
     for base64_img in ls_base64:
         messages.append({
             "role": "user", "content": [{"type": "image_url",
-                                             "image_url": {"url": f"data:image/png;base64,{base64_img}"}}]
+                                             "image_url": {"url": v1_toImageDataUrl(base64_img)}}]
         })
     # CONSTRUCT BODY
     properties = {}
@@ -1974,6 +2203,8 @@ def PIM_buildBodySelectCertifications(parsed_text, product_name, manufacturer_na
             "ASIA-PAC",
             ]       
 
+    # TAXONOMY REGISTRY FIRST, LIST ABOVE AS FALLBACK
+    selection_list = v1_taxonomyList('certifications', business_line, selection_list)
     # SYSTEM PROMPT
     system_prompt = f"""
     # INSTRUCTION #
@@ -2006,7 +2237,7 @@ def PIM_buildBodySelectCertifications(parsed_text, product_name, manufacturer_na
     for base64_img in ls_base64:
         messages.append({
             "role": "user", "content": [{"type": "image_url",
-                                         "image_url": {"url": f"data:image/png;base64,{base64_img}"}}]
+                                         "image_url": {"url": v1_toImageDataUrl(base64_img)}}]
         })
     # CONSTRUCT BODY
     properties = {name: {"type": "boolean", "description": f"True if the products has {name}"} for name in selection_list}
@@ -2244,6 +2475,8 @@ def PIM_buildBodySelectClaims(parsed_text, product_name, manufacturer_name, ls_b
             "Sustainable Water Efficiency for Agriculture",
             "Ecotain Label",
             ] 
+    # TAXONOMY REGISTRY FIRST, LIST ABOVE AS FALLBACK
+    selection_list = v1_taxonomyList('claims', business_line, selection_list)
     # SYSTEM PROMPT
     system_prompt = f"""
     # INSTRUCTION #
@@ -2280,7 +2513,7 @@ def PIM_buildBodySelectClaims(parsed_text, product_name, manufacturer_name, ls_b
     # ADD BASE64 IMAGES IF PROVIDED
     for base64_img in ls_base64:
         messages.append({"role": "user", 
-                         "content": [{"type": "image_url", "image_url": {"url": f"data:image/png;base64,{base64_img}"}}]})
+                         "content": [{"type": "image_url", "image_url": {"url": v1_toImageDataUrl(base64_img)}}]})
     # CONSTRUCT BODY
     properties = {name: {"type": "boolean", "description": f"True if the product claims to exhibits {name}"} for name in selection_list}
     properties['reason'] = {"type": "string", "description": "Give reason or example why you select each of the claims, grounded from given document"}
@@ -2356,7 +2589,7 @@ def PIM_buildBodySelectHealthBenefits(parsed_text, product_name, manufacturer_na
     for base64_img in ls_base64:
         messages.append({
             "role": "user", "content": [{"type": "image_url",
-                                         "image_url": {"url": f"data:image/png;base64,{base64_img}"}}]
+                                         "image_url": {"url": v1_toImageDataUrl(base64_img)}}]
         })
     # CONSTRUCT BODY
     properties = {name: {"type": "boolean", "description": f"True if the product is recommended for {name}"} for name in selection_list}
@@ -2386,98 +2619,1296 @@ def PIM_buildBodySelectHealthBenefits(parsed_text, product_name, manufacturer_na
 ###############################################################################################################################################################################
 ###############################################################################################################################################################################
 
+# POOLED HTTP TRANSPORT
+# One keep-alive requests.Session per host (Azure OpenAI, web-search proxy), shared by all threads of the worker,
+# so the ~15 calls per product reuse warm TCP/TLS connections instead of a new handshake each time.
+HTTP_POOL_MAXSIZE = int(os.getenv('HTTP_POOL_MAXSIZE', '32'))  # >= STAGE 5 FAN-OUT x CONCURRENT REQUESTS
+_httpSessions = {}
+_httpSessionsLock = threading.Lock()
+
+def v1_httpHostKey(url):
+    parsed = urllib3.util.parse_url(url)
+    return f"{parsed.scheme}://{parsed.host}:{parsed.port or (443 if parsed.scheme == 'https' else 80)}"
+
+def v1_getHttpSession(url):
+    host_key = v1_httpHostKey(url)
+    with _httpSessionsLock:
+        session = _httpSessions.get(host_key)
+        if session is None:
+            session = requests.Session()
+            adapter = requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=HTTP_POOL_MAXSIZE)
+            session.mount("https://", adapter)
+            session.mount("http://", adapter)
+            _httpSessions[host_key] = session
+    return session
+
+def v1_getHttpPoolStats():
+    # PER HOST: CONNECTIONS OPENED, REQUESTS SENT, IDLE KEEP-ALIVE CONNECTIONS (THIS WORKER ONLY)
+    dictStats = {}
+    with _httpSessionsLock:
+        lsSession = list(_httpSessions.items())
+    for host_key, session in lsSession:
+        stats = {'connections_opened': 0, 'requests': 0, 'idle_connections': 0, 'pool_maxsize': HTTP_POOL_MAXSIZE}
+        for adapter in dict.fromkeys(session.adapters.values()):
+            pools = adapter.poolmanager.pools
+            for pool_key in pools.keys():
+                pool = pools.get(pool_key)
+                if pool is None:
+                    continue
+                stats['connections_opened'] += pool.num_connections
+                stats['requests'] += pool.num_requests
+                stats['idle_connections'] += sum(1 for conn in list(pool.pool.queue) if conn is not None) if pool.pool else 0
+        stats['requests_per_connection'] = round(stats['requests'] / stats['connections_opened'], 2) if stats['connections_opened'] else None
+        dictStats[host_key] = stats
+    return dictStats
+
+def v1_parseCallAPIResponse(response):
+    # 200 RESPONSE (JSON DICT) -> (api_error, response, rescontent), CONTENT PARSED AS JSON WHEN POSSIBLE
+    try:
+        rescontent = response['choices'][0]['message']['content']
+        rescontent = json.loads(rescontent)
+        return 0, response, rescontent
+    except:
+        try:
+            rescontent = response['choices'][0]['message']['content']
+            return 0, response, rescontent
+        except Exception as e1:
+            return 1, response, {'error':str(e1)}
+
+# CIRCUIT BREAKERS
+# One breaker per upstream host (Azure OpenAI, web-search proxy, Document Intelligence).
+# CLOSED: calls go through, consecutive failures are counted. OPEN (after CB_FAILURE_THRESHOLD failures):
+# calls fail fast for CB_OPEN_SECONDS. HALF_OPEN: CB_HALF_OPEN_MAX_CALLS probe calls decide between CLOSED and OPEN.
+CB_FAILURE_THRESHOLD = int(os.getenv('CB_FAILURE_THRESHOLD', '5'))
+CB_OPEN_SECONDS = float(os.getenv('CB_OPEN_SECONDS', '30'))
+CB_HALF_OPEN_MAX_CALLS = int(os.getenv('CB_HALF_OPEN_MAX_CALLS', '1'))
+_circuitBreakers = {}
+_circuitBreakersLock = threading.Lock()
+
+def v1_breakerState(host_key):
+    # CALLER HOLDS _circuitBreakersLock
+    breaker = _circuitBreakers.get(host_key)
+    if breaker is None:
+        breaker = {'state': 'closed', 'failures': 0, 'opened_at': None, 'half_open_in_flight': 0,
+                   'calls': 0, 'successes': 0, 'failures_total': 0, 'rejected': 0, 'opened': 0}
+        _circuitBreakers[host_key] = breaker
+    if breaker['state'] == 'open' and time.monotonic() - breaker['opened_at'] >= CB_OPEN_SECONDS:
+        breaker['state'], breaker['half_open_in_flight'] = 'half_open', 0
+    return breaker
+
+def v1_breakerAllow(host_key):
+    # True = CALL MAY PROCEED, THE CALLER MUST THEN REPORT THE OUTCOME WITH v1_breakerRecord
+    with _circuitBreakersLock:
+        breaker = v1_breakerState(host_key)
+        if breaker['state'] == 'open' or (breaker['state'] == 'half_open' and breaker['half_open_in_flight'] >= CB_HALF_OPEN_MAX_CALLS):
+            breaker['rejected'] += 1
+            return False
+        if breaker['state'] == 'half_open':
+            breaker['half_open_in_flight'] += 1
+        breaker['calls'] += 1
+        return True
+
+def v1_breakerRecord(host_key, outcome):
+    # outcome: 'success' / 'failure' / 'neutral' (e.g. 429 or caller error - host is not sick, probe slot released)
+    with _circuitBreakersLock:
+        breaker = v1_breakerState(host_key)
+        if breaker['state'] == 'half_open':
+            breaker['half_open_in_flight'] = max(0, breaker['half_open_in_flight'] - 1)
+        if outcome == 'success':
+            breaker['successes'] += 1
+            breaker['failures'] = 0
+            if breaker['state'] == 'half_open':
+                breaker['state'] = 'closed'
+        elif outcome == 'failure':
+            breaker['failures_total'] += 1
+            breaker['failures'] += 1
+            if breaker['state'] == 'half_open' or breaker['failures'] >= CB_FAILURE_THRESHOLD:
+                if breaker['state'] != 'open':
+                    breaker['opened'] += 1
+                breaker['state'], breaker['opened_at'] = 'open', time.monotonic()
+
+def v1_breakerOutcome(status_code):
+    if status_code in (429,):
+        return 'neutral'
+    return 'failure' if status_code in LLM_RETRY_STATUS else 'success'
+
+def v1_ocrBreakerOutcome(e):
+    # DOCUMENT INTELLIGENCE EXCEPTION -> BREAKER OUTCOME: TRANSPORT ERRORS AND 5xx/408 MEAN THE SERVICE IS SICK,
+    # 4xx (BAD OR ENCRYPTED PDF, AUTH, QUOTA) AND LOCAL ERRORS (FILE, PARSING, CANCELLED REQUEST) ARE NEUTRAL
+    if isinstance(e, HttpResponseError) and e.status_code is not None:
+        return 'failure' if e.status_code >= 500 or e.status_code == 408 else 'neutral'
+    if isinstance(e, (ServiceRequestError, ServiceResponseError, HttpResponseError, requests.ConnectionError, requests.Timeout, httpx.TransportError, TimeoutError)):
+        return 'failure'
+    return 'neutral'
+
+def v1_circuitOpenResponse(host_key):
+    # LOOKS LIKE A 503 FROM UPSTREAM, SO CALLERS HANDLE IT LIKE ANY OTHER FAILED CALL
+    response = requests.Response()
+    response.status_code = 503
+    response.reason = 'Circuit Open'
+    response.url = host_key
+    response.headers['x-circuit-open'] = host_key
+    response._content = json.dumps({'error': f'circuit open: {host_key}'}).encode('utf-8')
+    return 1, response, response
+
+def v1_isCircuitOpen(response):
+    return isinstance(response, requests.Response) and 'x-circuit-open' in response.headers
+
+def v1_getCircuitBreakers():
+    with _circuitBreakersLock:
+        dictState = {}
+        for host_key in list(_circuitBreakers):
+            breaker = dict(v1_breakerState(host_key))
+            breaker['open_remaining_seconds'] = round(max(0.0, CB_OPEN_SECONDS - (time.monotonic() - breaker['opened_at'])), 1) if breaker['state'] == 'open' else 0
+            breaker.pop('opened_at')
+            dictState[host_key] = breaker
+    return {'failure_threshold': CB_FAILURE_THRESHOLD, 'open_seconds': CB_OPEN_SECONDS, 'breakers': dictState}
+
+# RETRY POLICY
+# Retryable statuses and transport errors are retried with exponential backoff + full jitter, honouring
+# "retry-after-ms" / "Retry-After" from Azure. Every call also inherits the deadline of its API request
+# (ContextVar, copied into gathered tasks and worker threads), so no product can hang a worker forever.
+LLM_RETRY_MAX_ATTEMPTS = int(os.getenv('LLM_RETRY_MAX_ATTEMPTS', '6'))
+LLM_RETRY_BASE_SECONDS = float(os.getenv('LLM_RETRY_BASE_SECONDS', '1'))
+LLM_RETRY_MAX_SECONDS = float(os.getenv('LLM_RETRY_MAX_SECONDS', '30'))
+LLM_REQUEST_DEADLINE_SECONDS = float(os.getenv('LLM_REQUEST_DEADLINE_SECONDS', '600'))
+LLM_RETRY_STATUS = {408, 429, 499, 500, 502, 503, 504}
+_requestDeadline = contextvars.ContextVar('request_deadline', default=None)
+
+def v1_setRequestDeadline(seconds=LLM_REQUEST_DEADLINE_SECONDS):
+    # CALL AT THE START OF AN API REQUEST, RETURNS THE TOKEN FOR _requestDeadline.reset
+    return _requestDeadline.set(time.monotonic() + seconds)
+
+def v1_deadlineRemaining():
+    deadline = _requestDeadline.get()
+    return None if deadline is None else deadline - time.monotonic()
+
+def v1_deadlinePassed(slack=0.05):
+    # A CALL TIMED OUT WITH THE REMAINING DEADLINE AS ITS TIMEOUT, SO A TIMEOUT NOW IS THE REQUEST'S, NOT A RETRYABLE ERROR
+    remaining = v1_deadlineRemaining()
+    return remaining is not None and remaining <= slack
+
+def v1_retryAfterSeconds(headers):
+    # SERVER HINT IN SECONDS, None IF ABSENT
+    try:
+        if headers.get('retry-after-ms'):
+            return float(headers['retry-after-ms']) / 1000
+        if headers.get('retry-after'):
+            value = headers['retry-after']
+            try:
+                return float(value)
+            except ValueError:
+                retry_at = email.utils.parsedate_to_datetime(value)
+                return max(0.0, (retry_at - datetime.datetime.now(datetime.timezone.utc)).total_seconds())
+    except Exception:
+        pass
+    return None
+
+def v1_retryDelay(attempt, headers=None):
+    # SECONDS TO WAIT BEFORE RETRY NUMBER `attempt` (0-BASED), OR None TO GIVE UP
+    if attempt + 1 >= LLM_RETRY_MAX_ATTEMPTS:
+        return None
+    delay = v1_retryAfterSeconds(headers) if headers is not None else None
+    if delay is None:
+        delay = random.uniform(0, min(LLM_RETRY_MAX_SECONDS, LLM_RETRY_BASE_SECONDS * 2**attempt))
+    remaining = v1_deadlineRemaining()
+    if remaining is not None and delay >= remaining:
+        return None
+    return delay
+
+# CLIENT-SIDE RATE LIMITER (AZURE OPENAI TPM/RPM)
+# Token buckets per deployment kept in SQLite, so all threads and all uvicorn workers on this host share one budget.
+# Each call is admitted only when both the token bucket (estimated prompt + max_tokens, as Azure counts it)
+# and the request bucket have room; otherwise it waits for the refill. Off by default.
+LLM_RATE_LIMIT = os.getenv('LLM_RATE_LIMIT', '0') == '1'
+LLM_TPM_LIMIT = int(os.getenv('LLM_TPM_LIMIT', '250000'))
+LLM_RPM_LIMIT = int(os.getenv('LLM_RPM_LIMIT', '250'))
+LLM_RATE_LIMIT_DB = os.getenv('LLM_RATE_LIMIT_DB', os.path.join(tempfile.gettempdir(), 'dksh_rate_limiter.sqlite'))
+LLM_RATE_LIMIT_IMAGE_TOKENS = int(os.getenv('LLM_RATE_LIMIT_IMAGE_TOKENS', '1000'))
+LLM_RATE_LIMIT_COUNT_MAX_TOKENS = os.getenv('LLM_RATE_LIMIT_COUNT_MAX_TOKENS', '1') == '1'
+LLM_RATE_LIMITER_STATS = {'admitted': 0, 'waited': 0, 'wait_seconds_total': 0.0, 'wait_seconds_max': 0.0, 'tokens_admitted': 0, 'deadline_rejected': 0}
+_rateLimiterLocal = threading.local()
+_rateLimiterStatsLock = threading.Lock()
+
+def v1_rateLimitKey(url):
+    # ONLY AZURE OPENAI DEPLOYMENTS HAVE TPM/RPM QUOTAS, KEY = DEPLOYMENT PATH
+    if not LLM_RATE_LIMIT or '/openai/deployments/' not in url:
+        return None
+    parsed = urllib3.util.parse_url(url)
+    return f"{parsed.host}{parsed.path}"
+
+def v1_estimateBodyTokens(body):
+    if isinstance(body, str):
+        return v1_estimateTokens(len(body))
+    n_chars = 0
+    n_images = 0
+    for message in body.get('messages', []):
+        content = message.get('content', '')
+        if isinstance(content, str):
+            n_chars += len(content)
+            continue
+        for part in content:
+            if part.get('type') == 'image_url':
+                n_images += 1
+            else:
+                n_chars += len(part.get('text', ''))
+    n_chars += len(v1_jsonFragment(body.get('response_format', ''), ensure_ascii=False))
+    tokens = v1_estimateTokens(n_chars) + n_images * LLM_RATE_LIMIT_IMAGE_TOKENS
+    if LLM_RATE_LIMIT_COUNT_MAX_TOKENS:
+        tokens += int(body.get('max_tokens') or body.get('max_completion_tokens') or 0)
+    return tokens
+
+def v1_rateLimiterConnection():
+    conn = getattr(_rateLimiterLocal, 'conn', None)
+    if conn is None:
+        os.makedirs(os.path.dirname(LLM_RATE_LIMIT_DB) or '.', exist_ok=True)
+        conn = sqlite3.connect(LLM_RATE_LIMIT_DB, timeout=30, isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("CREATE TABLE IF NOT EXISTS buckets (key TEXT PRIMARY KEY, tokens REAL, requests REAL, updated REAL)")
+        _rateLimiterLocal.conn = conn
+    return conn
+
+def v1_rateLimiterTryAcquire(key, tokens):
+    # ONE ATOMIC REFILL + TAKE, RETURN 0 WHEN ADMITTED ELSE SECONDS UNTIL ENOUGH BUDGET
+    tokens = min(tokens, LLM_TPM_LIMIT)  # A CALL BIGGER THAN THE WHOLE BUCKET WAITS FOR A FULL BUCKET
+    conn = v1_rateLimiterConnection()
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        now = time.time()  # READ UNDER THE WRITE LOCK, ELSE A STALE TIMESTAMP WOULD REFILL TWICE
+        row = conn.execute("SELECT tokens, requests, updated FROM buckets WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            bucket_tokens, bucket_requests = float(LLM_TPM_LIMIT), float(LLM_RPM_LIMIT)
+        else:
+            elapsed = max(0.0, now - row[2])
+            bucket_tokens = min(float(LLM_TPM_LIMIT), row[0] + elapsed * LLM_TPM_LIMIT / 60)
+            bucket_requests = min(float(LLM_RPM_LIMIT), row[1] + elapsed * LLM_RPM_LIMIT / 60)
+        if bucket_tokens >= tokens and bucket_requests >= 1:
+            bucket_tokens -= tokens
+            bucket_requests -= 1
+            wait = 0.0
+        else:
+            wait = max((tokens - bucket_tokens) * 60 / LLM_TPM_LIMIT, (1 - bucket_requests) * 60 / LLM_RPM_LIMIT, 0.01)
+        conn.execute("INSERT OR REPLACE INTO buckets (key, tokens, requests, updated) VALUES (?, ?, ?, ?)", 
+                     (key, bucket_tokens, bucket_requests, now))
+        conn.execute("COMMIT")
+    except:
+        conn.execute("ROLLBACK")
+        raise
+    return wait
+
+def v1_rateLimiterRecord(tokens, waited_seconds, admitted=True):
+    with _rateLimiterStatsLock:
+        if not admitted:
+            LLM_RATE_LIMITER_STATS['deadline_rejected'] += 1
+            return
+        LLM_RATE_LIMITER_STATS['admitted'] += 1
+        LLM_RATE_LIMITER_STATS['tokens_admitted'] += tokens
+        if waited_seconds > 0:
+            LLM_RATE_LIMITER_STATS['waited'] += 1
+            LLM_RATE_LIMITER_STATS['wait_seconds_total'] += waited_seconds
+            LLM_RATE_LIMITER_STATS['wait_seconds_max'] = max(LLM_RATE_LIMITER_STATS['wait_seconds_max'], waited_seconds)
+
+def v1_rateLimiterWaitFits(wait):
+    remaining = v1_deadlineRemaining()
+    return remaining is None or wait < remaining
+
+def v1_rateLimiterAcquire(url, body):
+    # BLOCK UNTIL ADMITTED, RETURN False IF THE REQUEST DEADLINE WOULD PASS FIRST
+    key = v1_rateLimitKey(url)
+    if key is None:
+        return True
+    tokens = v1_estimateBodyTokens(body)
+    time_start = None
+    while True:
+        wait = v1_rateLimiterTryAcquire(key, tokens)
+        if wait == 0:
+            v1_rateLimiterRecord(tokens, 0 if time_start is None else time.monotonic() - time_start)
+            return True
+        if not v1_rateLimiterWaitFits(wait):
+            v1_rateLimiterRecord(tokens, 0, admitted=False)
+            return False
+        time_start = time_start or time.monotonic()
+        time.sleep(wait)
+
+async def v1_rateLimiterAcquireAsync(url, body):
+    key = v1_rateLimitKey(url)
+    if key is None:
+        return True
+    tokens = v1_estimateBodyTokens(body)
+    time_start = None
+    while True:
+        wait = await asyncio.to_thread(v1_rateLimiterTryAcquire, key, tokens)
+        if wait == 0:
+            v1_rateLimiterRecord(tokens, 0 if time_start is None else time.monotonic() - time_start)
+            return True
+        if not v1_rateLimiterWaitFits(wait):
+            v1_rateLimiterRecord(tokens, 0, admitted=False)
+            return False
+        time_start = time_start or time.monotonic()
+        await asyncio.sleep(wait)
+
+def v1_getRateLimiterStats():
+    with _rateLimiterStatsLock:
+        stats = dict(LLM_RATE_LIMITER_STATS)
+    stats['wait_seconds_avg'] = round(stats['wait_seconds_total'] / stats['waited'], 3) if stats['waited'] else 0.0
+    stats['enabled'], stats['tpm_limit'], stats['rpm_limit'] = LLM_RATE_LIMIT, LLM_TPM_LIMIT, LLM_RPM_LIMIT
+    stats['buckets'] = {}
+    if LLM_RATE_LIMIT and os.path.exists(LLM_RATE_LIMIT_DB):
+        now = time.time()
+        for key, bucket_tokens, bucket_requests, updated in v1_rateLimiterConnection().execute("SELECT key, tokens, requests, updated FROM buckets"):
+            elapsed = max(0.0, now - updated)
+            stats['buckets'][key] = {'tokens_available': round(min(LLM_TPM_LIMIT, bucket_tokens + elapsed * LLM_TPM_LIMIT / 60)),
+                                     'requests_available': round(min(LLM_RPM_LIMIT, bucket_requests + elapsed * LLM_RPM_LIMIT / 60), 2)}
+    return stats
+
+def v1_deadlineExceeded():
+    # LOOKS LIKE A 504 FROM UPSTREAM (SAME AS v1_circuitOpenResponse), SO THE STEPS' ERROR BRANCHES CAN READ status_code
+    response = requests.Response()
+    response.status_code = 504
+    response.reason = 'Deadline Exceeded'
+    response.headers['x-deadline-exceeded'] = '1'
+    response._content = json.dumps({'error': 'request deadline exceeded'}).encode('utf-8')
+    return 1, response, response
+
 def v1_customCallAPI(url, body, headers={}, params={}):
+    session = v1_getHttpSession(url)
+    data = v1_dumpBody(body)  # SERIALIZED ONCE FOR ALL ATTEMPTS, str BODY SENT AS IS
+    host_key = v1_httpHostKey(url)
+    attempt = 0
     while True:
+        remaining = v1_deadlineRemaining()
+        if remaining is not None and remaining <= 0:
+            return v1_deadlineExceeded()
+        if not v1_rateLimiterAcquire(url, body):
+            return v1_deadlineExceeded()
+        remaining = v1_deadlineRemaining()
+        if not v1_breakerAllow(host_key):
+            return v1_circuitOpenResponse(host_key)
         try:
-            response = requests.post(
+            response = session.post(
                 url, 
                 headers=headers, 
-                data=json.dumps(body),
+                data=data,
                 params=params,
+                timeout=remaining,
                 verify=False)
-            if response.status_code == 200:                
-                response = response.json()
-                try:
-                    rescontent = response['choices'][0]['message']['content']
-                    rescontent = json.loads(rescontent)
-                    return 0, response, rescontent
-                except:
-                    try:
-                        rescontent = response['choices'][0]['message']['content']
-                        return 0, response, rescontent
-                    except Exception as e1:
-                        return 1, response, {'error':str(e1)}     
-            elif response.status_code in [499, 500, 503]:
-                continue
-            else:
-                return 1, response, response
+        except (requests.ConnectionError, requests.Timeout) as e2:
+            if v1_deadlinePassed():
+                v1_breakerRecord(host_key, 'neutral')  # OUR DEADLINE RAN OUT, THE HOST IS NOT SICK
+                return v1_deadlineExceeded()
+            v1_breakerRecord(host_key, 'failure')
+            delay = v1_retryDelay(attempt)
+            if delay is None: return 1, {'error':str(e2)}, {'error':str(e2)}
+            time.sleep(delay)
+            attempt += 1
+            continue
         except Exception as e2:
+            v1_breakerRecord(host_key, 'neutral')
             return 1, {'error':str(e2)}, {'error':str(e2)}
-        
-def v1_saveUploadFilesTemporarly(inputListDocumentation):
-    # Save uploaded files temporarily
+        v1_breakerRecord(host_key, v1_breakerOutcome(response.status_code))
+        if response.status_code == 200:
+            try:
+                return v1_parseCallAPIResponse(response.json())
+            except Exception as e2:
+                return 1, {'error':str(e2)}, {'error':str(e2)}
+        elif response.status_code in LLM_RETRY_STATUS:
+            delay = v1_retryDelay(attempt, response.headers)
+            if delay is None: return 1, response, response
+            time.sleep(delay)
+            attempt += 1
+        else:
+            return 1, response, response
+
+# ASYNC HTTP TRANSPORT
+# One httpx.AsyncClient per host and event loop, HTTP/2 so concurrent calls to the same host are multiplexed
+# over a few connections, and no thread is held while a call is in flight.
+def v1_getHttpClientAsync(url):
+    clients = v1_getAsyncLoopState().setdefault('http_clients', {})
+    host_key = v1_httpHostKey(url)
+    if host_key not in clients:
+        limits = httpx.Limits(max_connections=HTTP_POOL_MAXSIZE, max_keepalive_connections=HTTP_POOL_MAXSIZE)
+        clients[host_key] = httpx.AsyncClient(http2=True, verify=False, limits=limits, timeout=None)
+    return clients[host_key]
+
+async def v1_closeHttpClientsAsync():
+    clients = v1_getAsyncLoopState().setdefault('http_clients', {})
+    while clients:
+        _, client = clients.popitem()
+        await client.aclose()
+
+def v1_getHttpClientStats():
+    # PER HOST (ALL EVENT LOOPS OF THIS WORKER): OPEN CONNECTIONS BY HTTP VERSION, IDLE CONNECTIONS, REQUESTS ON OPEN CONNECTIONS
+    dictStats = {}
+    for state in list(_asyncLoopState.values()):
+        for host_key, client in list(state.get('http_clients', {}).items()):
+            stats = dictStats.setdefault(host_key, {'open_connections': 0, 'http_version': {}, 'idle_connections': 0, 'requests': 0, 
+                                                    'max_connections': HTTP_POOL_MAXSIZE})
+            pool = getattr(getattr(client, '_transport', None), '_pool', None)
+            for connection in list(getattr(pool, 'connections', [])):
+                if connection.is_closed():
+                    continue
+                info = connection.info()  # "'https://host:443', HTTP/2, ACTIVE, Request Count: 12"
+                match = re.search(r'(HTTP/[\d.]+)', info)
+                http_version = match.group(1) if match else 'CONNECTING'
+                stats['open_connections'] += 1
+                stats['http_version'][http_version] = stats['http_version'].get(http_version, 0) + 1
+                stats['idle_connections'] += connection.is_idle()
+                match = re.search(r'Request Count: (\d+)', info)
+                stats['requests'] += int(match.group(1)) if match else 0
+    for stats in dictStats.values():
+        stats['requests_per_connection'] = round(stats['requests'] / stats['open_connections'], 2) if stats['open_connections'] else None
+    return dictStats
+
+async def v1_customCallAPIAsync(url, body, headers={}, params={}, call_type=None):
+    # `call_type` SET = WIRE TIME OF THE SUCCESSFUL ATTEMPT RECORDED FOR HEDGING (NO RATE-LIMIT WAIT OR RETRY BACKOFF)
+    client = v1_getHttpClientAsync(url)
+    data = v1_dumpBody(body)  # SERIALIZED ONCE FOR ALL ATTEMPTS, str BODY SENT AS IS
+    host_key = v1_httpHostKey(url)
+    attempt = 0
+    while True:
+        remaining = v1_deadlineRemaining()
+        if remaining is not None and remaining <= 0:
+            return v1_deadlineExceeded()
+        if not await v1_rateLimiterAcquireAsync(url, body):
+            return v1_deadlineExceeded()
+        remaining = v1_deadlineRemaining()
+        if not v1_breakerAllow(host_key):
+            return v1_circuitOpenResponse(host_key)
+        try:
+            wire_start = time.monotonic()
+            response = await client.post(
+                url, 
+                headers=headers, 
+                content=data,
+                params=params,
+                timeout=remaining)
+            wire_seconds = time.monotonic() - wire_start
+        except asyncio.CancelledError:
+            v1_breakerRecord(host_key, 'neutral')  # LOSING HEDGE / CANCELLED REQUEST
+            raise
+        except httpx.TransportError as e2:
+            if v1_deadlinePassed():
+                v1_breakerRecord(host_key, 'neutral')  # OUR DEADLINE RAN OUT, THE HOST IS NOT SICK
+                return v1_deadlineExceeded()
+            v1_breakerRecord(host_key, 'failure')
+            delay = v1_retryDelay(attempt)
+            if delay is None: return 1, {'error':str(e2)}, {'error':str(e2)}
+            await asyncio.sleep(delay)
+            attempt += 1
+            continue
+        except Exception as e2:
+            v1_breakerRecord(host_key, 'neutral')
+            return 1, {'error':str(e2)}, {'error':str(e2)}
+        v1_breakerRecord(host_key, v1_breakerOutcome(response.status_code))
+        if response.status_code == 200:
+            try:
+                result = v1_parseCallAPIResponse(response.json())
+            except Exception as e2:
+                return 1, {'error':str(e2)}, {'error':str(e2)}
+            if call_type is not None and result[0] == 0:
+                v1_recordCallLatency(call_type, wire_seconds)
+            return result
+        elif response.status_code in LLM_RETRY_STATUS:
+            delay = v1_retryDelay(attempt, response.headers)
+            if delay is None: return 1, response, response
+            await asyncio.sleep(delay)
+            attempt += 1
+        else:
+            return 1, response, response
+
+# CONTENT-ADDRESSED BLOB STORE
+# Uploaded documents are stored once per unique content under "<sha256>.pdf".
+# Bytes are hashed while being streamed to a private ".part" file, which is then published with an atomic rename,
+# so concurrent requests uploading the same PDF share a single blob and never observe a partially written file.
+BLOB_STORE_DIR = os.getenv('BLOB_STORE_DIR', os.path.join(tempfile.gettempdir(), 'dksh_blob_store'))
+BLOB_CHUNK_SIZE = 1024*1024
+
+def v1_blobStoreOpen():
+    os.makedirs(BLOB_STORE_DIR, exist_ok=True)
+    fd, part_path = tempfile.mkstemp(dir=BLOB_STORE_DIR, suffix='.part')
+    return {'file': os.fdopen(fd, 'wb'), 'part_path': part_path, 'hasher': hashlib.sha256(), 'size': 0}
+
+def v1_blobStoreWrite(blob, chunk):
+    if not chunk:
+        return
+    blob['hasher'].update(chunk)
+    blob['file'].write(chunk)
+    blob['size'] += len(chunk)
+
+def v1_blobStoreFinish(blob):
+    # CLOSE AND HASH, THE ".part" FILE STAYS PRIVATE UNTIL v1_blobStorePublish (OR v1_blobStoreAbort)
+    blob['file'].close()
+    blob['sha256'] = blob['hasher'].hexdigest()
+    return blob
+
+def v1_blobStorePublish(blob):
+    blob_path = os.path.join(BLOB_STORE_DIR, f"{blob['sha256']}.pdf")
+    if os.path.exists(blob_path):
+        # SAME CONTENT ALREADY PUBLISHED (BY THIS OR ANOTHER REQUEST), DROP OUR COPY
+        os.remove(blob['part_path'])
+    else:
+        # ATOMIC PUBLISH, IDENTICAL CONTENT MEANS A RACING WRITER IS HARMLESS
+        os.replace(blob['part_path'], blob_path)
+    return {'sha256': blob['sha256'], 'blob_path': blob_path, 'size': blob['size']}
+
+def v1_blobStoreCommit(blob):
+    return v1_blobStorePublish(v1_blobStoreFinish(blob))
+
+def v1_blobStoreAbort(blob):
+    blob['file'].close()
+    if os.path.exists(blob['part_path']):
+        os.remove(blob['part_path'])
+
+def v1_blobStorePutChunks(chunks):
+    blob = v1_blobStoreOpen()
+    try:
+        for chunk in chunks:
+            v1_blobStoreWrite(blob, chunk)
+        return v1_blobStoreCommit(blob)
+    except:
+        v1_blobStoreAbort(blob)
+        raise
+
+def v1_saveUploadFilesToBlobStore(inputListDocumentation):
     lsTempFile = []
     for file in inputListDocumentation:
-        suffix = os.path.splitext(file.filename)[-1]
-        with tempfile.NamedTemporaryFile(delete=False, suffix=suffix) as tmp:
-            shutil.copyfileobj(file.file, tmp)
-            tmpdict = {"filename": file.filename, "temp_path": tmp.name}
-            lsTempFile.append(tmpdict)
+        stored = v1_blobStorePutChunks(iter(lambda: file.file.read(BLOB_CHUNK_SIZE), b''))
+        lsTempFile.append({"filename": file.filename, 
+                           "temp_path": stored['blob_path'], 
+                           "sha256": stored['sha256']})
     return lsTempFile
 
-def v1_saveUploadFilesTemporarlyB64(inputListDocumentationB64):
-    if not inputListDocumentationB64:
-        return []
-    # Sort input list by Base64 string length (ascending)
-    sorted_b64_list = sorted(inputListDocumentationB64, key=len)
-    lsTempFile = []
-    for b64data in sorted_b64_list:
-        if not b64data:
-            continue  # skip empty strings
-        # Generate deterministic hash-based filename
-        hash_name = hashlib.sha256(b64data.encode("utf-8")).hexdigest()
-        filename = f"{hash_name}.pdf"
-        # Decode Base64 and write to temp directory
-        pdf_bytes = base64.b64decode(b64data)
-        temp_path = os.path.join(tempfile.gettempdir(), filename)
-        with open(temp_path, "wb") as tmp:
-            tmp.write(pdf_bytes)
-        lsTempFile.append({
-            "filename": filename,
-            "temp_path": temp_path
-        })
-    return lsTempFile
+# STREAMING BASE64 DECODE
+# Base64 text is decoded in 4-character groups as it arrives and written straight into the blob store,
+# so memory per document stays at one chunk no matter how large the PDF is.
+B64_NON_ALPHABET = re.compile(rb'[^A-Za-z0-9+/=]')
+
+def v1_b64DecoderOpen():
+    return {'blob': v1_blobStoreOpen(), 'pending': b''}
 
-def v1_parsePDF(stg_lsTempFile):
+def v1_b64DecoderWrite(decoder, data):
+    # SAME AS base64.b64decode (NON-ALPHABET CHARACTERS SUCH AS NEWLINES ARE IGNORED)
+    data = decoder['pending'] + B64_NON_ALPHABET.sub(b'', data)
+    cut = len(data) - len(data) % 4
+    v1_blobStoreWrite(decoder['blob'], base64.b64decode(data[:cut]))
+    decoder['pending'] = data[cut:]
+
+def v1_b64DecoderFinish(decoder):
+    # RETURN FINISHED (NOT YET PUBLISHED) BLOB, OR None FOR AN EMPTY FIELD
+    try:
+        if decoder['pending']:
+            v1_blobStoreWrite(decoder['blob'], base64.b64decode(decoder['pending']))  # raises on bad padding
+    except:
+        v1_blobStoreAbort(decoder['blob'])
+        raise
+    if decoder['blob']['size'] == 0:
+        v1_blobStoreAbort(decoder['blob'])
+        return None
+    return v1_blobStoreFinish(decoder['blob'])
+
+def v1_b64DecoderAbort(decoder):
+    v1_blobStoreAbort(decoder['blob'])
+
+def v1_storedBlobsToTempFiles(lsStored):
+    # Sort by decoded size (ascending), same order as sorting the Base64 strings by length
+    lsStored = sorted(lsStored, key=lambda x: x['size'])
+    return [{"filename": f"{stored['sha256']}.pdf", 
+             "temp_path": stored['blob_path'], 
+             "sha256": stored['sha256']} for stored in lsStored]
+
+B64_FORM_MAX_FIELD_BYTES = 1024*1024
+
+def v1_urlDecoderWrite(decoder, data, final=False):
+    # STREAMING application/x-www-form-urlencoded VALUE DECODE, A "%XX" ESCAPE SPLIT ACROSS CHUNKS WAITS FOR THE NEXT ONE
+    data = decoder['pending'] + data
+    cut = len(data)
+    if not final:
+        escape = data.rfind(b'%', max(0, cut - 2))
+        if escape != -1:
+            cut = escape
+    decoder['pending'] = data[cut:]
+    return urllib.parse.unquote_to_bytes(data[:cut].replace(b'+', b' '))
+
+def v1_publishFormBlobs(lsBlob):
+    # CALL ONLY ONCE THE REQUEST IS AUTHORIZED, RETURN stg_lsTempFile
+    return v1_storedBlobsToTempFiles([v1_blobStorePublish(blob) for blob in lsBlob])
+
+def v1_discardFormBlobs(lsBlob):
+    for blob in lsBlob:
+        v1_blobStoreAbort(blob)
+
+async def v1_parseFormStreamB64(request, b64FieldName='inputListDocumentationB64'):
+    # STREAM A multipart/form-data OR application/x-www-form-urlencoded BODY:
+    # `b64FieldName` VALUES ARE DECODED INTO PRIVATE BLOB STORE ".part" FILES, OTHER FIELDS KEPT AS TEXT
+    # RETURN ({field_name: [value, ...]}, lsBlob), lsBlob MUST BE PASSED TO v1_publishFormBlobs OR v1_discardFormBlobs
+    content_type, options = parse_options_header(request.headers.get('content-type', ''))
+    dictFields = {}
+    lsBlob = []
+    part = {}
+
+    def on_part_begin():
+        part.clear()
+        part.update({'headers': {}, 'header_field': b'', 'header_value': b'', 'name': None, 'decoder': None, 'value': bytearray()})
+    def on_header_field(data, start, end):
+        part['header_field'] += data[start:end]
+    def on_header_value(data, start, end):
+        part['header_value'] += data[start:end]
+    def on_header_end():
+        part['headers'][part['header_field'].lower()] = part['header_value']
+        part['header_field'], part['header_value'] = b'', b''
+    def on_headers_finished():
+        _, disposition = parse_options_header(part['headers'].get(b'content-disposition', b''))
+        part['name'] = disposition.get(b'name', b'').decode('utf-8')
+        if part['name'] == b64FieldName:
+            part['decoder'] = v1_b64DecoderOpen()
+    def on_part_data(data, start, end):
+        if part['decoder'] is not None:
+            v1_b64DecoderWrite(part['decoder'], data[start:end])
+        else:
+            part['value'] += data[start:end]
+            if len(part['value']) > B64_FORM_MAX_FIELD_BYTES:
+                raise HTTPException(status_code=413, detail=f"Form field too large: {part['name']}")
+    def on_part_end():
+        decoder, part['decoder'] = part['decoder'], None
+        if decoder is not None:
+            blob = v1_b64DecoderFinish(decoder)
+            if blob is not None:
+                lsBlob.append(blob)
+        else:
+            dictFields.setdefault(part['name'], []).append(part['value'].decode('utf-8'))
+
+    # URLENCODED FIELDS ("name=value&..."), THE NAME IS COMPLETE ONCE ITS FIRST VALUE BYTES ARRIVE
+    def on_field_start():
+        part.clear()
+        part.update({'name_raw': bytearray(), 'name': None, 'decoder': None, 'url': {'pending': b''}, 'value': bytearray()})
+    def on_field_name(data, start, end):
+        part['name_raw'] += data[start:end]
+        if len(part['name_raw']) > B64_FORM_MAX_FIELD_BYTES:
+            raise HTTPException(status_code=413, detail='Form field name too large')
+    def on_field_named():
+        if part['name'] is None:
+            part['name'] = urllib.parse.unquote_plus(part['name_raw'].decode('latin-1'), encoding='utf-8')
+            if part['name'] == b64FieldName:
+                part['decoder'] = v1_b64DecoderOpen()
+    def on_field_data(data, start, end):
+        on_field_named()
+        if part['decoder'] is not None:
+            v1_b64DecoderWrite(part['decoder'], v1_urlDecoderWrite(part['url'], data[start:end]))
+        else:
+            part['value'] += data[start:end]
+            if len(part['value']) > B64_FORM_MAX_FIELD_BYTES:
+                raise HTTPException(status_code=413, detail=f"Form field too large: {part['name']}")
+    def on_field_end():
+        on_field_named()
+        decoder, part['decoder'] = part['decoder'], None
+        if decoder is not None:
+            v1_b64DecoderWrite(decoder, v1_urlDecoderWrite(part['url'], b'', final=True))
+            blob = v1_b64DecoderFinish(decoder)
+            if blob is not None:
+                lsBlob.append(blob)
+        elif part['name']:
+            dictFields.setdefault(part['name'], []).append(urllib.parse.unquote_plus(part['value'].decode('latin-1'), encoding='utf-8'))
+
+    if content_type == b'multipart/form-data' and b'boundary' in options:
+        parser = MultipartParser(options[b'boundary'], {
+            'on_part_begin': on_part_begin, 'on_header_field': on_header_field, 'on_header_value': on_header_value,
+            'on_header_end': on_header_end, 'on_headers_finished': on_headers_finished, 'on_part_data': on_part_data,
+            'on_part_end': on_part_end})
+    elif content_type == b'application/x-www-form-urlencoded':
+        parser = QuerystringParser({
+            'on_field_start': on_field_start, 'on_field_name': on_field_name, 'on_field_data': on_field_data,
+            'on_field_end': on_field_end})
+    else:
+        raise HTTPException(status_code=415, detail='Expected multipart/form-data or application/x-www-form-urlencoded body')
+    try:
+        # DECODE, HASH AND DISK WRITES RUN IN A WORKER THREAD, ONE BLOB_CHUNK_SIZE BATCH AT A TIME, NOT ON THE EVENT LOOP
+        buffer = bytearray()
+        async for chunk in request.stream():
+            buffer += chunk
+            if len(buffer) >= BLOB_CHUNK_SIZE:
+                await anyio.to_thread.run_sync(parser.write, bytes(buffer))
+                buffer.clear()
+        if buffer:
+            await anyio.to_thread.run_sync(parser.write, bytes(buffer))
+        await anyio.to_thread.run_sync(parser.finalize)
+    except BaseException as e:
+        # INCLUDING A CANCELLED REQUEST, NO ".part" FILE OUTLIVES A FAILED PARSE
+        v1_discardFormBlobs(lsBlob)
+        if isinstance(e, HTTPException) or not isinstance(e, Exception):
+            raise
+        raise HTTPException(status_code=400, detail=f"Invalid form body: {type(e).__name__}: {e}")
+    finally:
+        if part.get('decoder') is not None:
+            v1_b64DecoderAbort(part['decoder'])
+    return dictFields, lsBlob
+
+def v1_formValue(dictFields, name, default=None, required=False):
+    if name not in dictFields:
+        if required:
+            raise HTTPException(status_code=422, detail=f"Missing form field: {name}")
+        return default
+    return dictFields[name][-1]
+
+def v1_formBool(dictFields, name, default=False):
+    value = v1_formValue(dictFields, name)
+    if value is None:
+        return default
+    return value.strip().lower() in ('1', 'true', 'on', 'yes', 't', 'y')
+
+def v1_hashListDocumentation(stg_lsTempFile):
+    # ORDER-INDEPENDENT DIGEST OVER DOCUMENT CONTENT, SAME FOR MULTIPART AND BASE64 INPUTS
+    lsdoc = [x['sha256'] for x in stg_lsTempFile]
+    lsdoc.sort()
+    return hashlib.sha256("".join(lsdoc).encode()).hexdigest()
+
+# OCR RESULT CACHE
+# Document Intelligence output is cached on disk by (PDF sha256, DI model id, output format),
+# so the same TDS parsed for another product or business line skips the OCR call entirely.
+OCR_CACHE_DIR = os.getenv('OCR_CACHE_DIR', 'ocrCache')
+OCR_CACHE_MAX_BYTES = int(os.getenv('OCR_CACHE_MAX_MB', '512'))*1024*1024
+OCR_MODEL_ID = "prebuilt-read"
+OCR_OUTPUT_FORMAT = "markdown-lines-v1"
+OCR_MODEL_ID_LAYOUT = "prebuilt-layout"
+OCR_OUTPUT_FORMAT_LAYOUT = "layout-compact-v1"
+
+def v1_ocrCacheKey(pdf_sha256, model_id, output_format):
+    return hashlib.sha256(f"{pdf_sha256}|{model_id}|{output_format}".encode()).hexdigest() + ".json"
+
+# TEXT-LAYER FAST PATH
+# Born-digital pages already carry a usable text layer, PyMuPDF reads it in milliseconds.
+# Only scanned / image-only / garbled pages are sent to Document Intelligence.
+OCR_TEXT_LAYER_FASTPATH = os.getenv('OCR_TEXT_LAYER_FASTPATH', '1') == '1'
+OCR_TEXT_LAYER_MIN_CHARS = int(os.getenv('OCR_TEXT_LAYER_MIN_CHARS', '100'))
+OCR_TEXT_LAYER_MAX_BAD_CHAR_RATIO = 0.05
+OCR_TEXT_LAYER_MAX_IMAGE_RATIO = float(os.getenv('OCR_TEXT_LAYER_MAX_IMAGE_RATIO', '0.5'))
+
+def v1_isTextLayerUsable(page, text):
+    chars = [ch for ch in text if not ch.isspace()]
+    if len(chars) < OCR_TEXT_LAYER_MIN_CHARS:
+        return False
+    # BROKEN FONT ENCODINGS SHOW UP AS REPLACEMENT / PRIVATE-USE / CONTROL CHARACTERS
+    bad_chars = sum(1 for ch in chars if ch == '\ufffd' or unicodedata.category(ch) in ('Co', 'Cn', 'Cc'))
+    if bad_chars / len(chars) > OCR_TEXT_LAYER_MAX_BAD_CHAR_RATIO:
+        return False
+    # LARGE PICTURES MAY HOLD TEXT (SCANNED TABLES, SPEC IMAGES) THAT THE TEXT LAYER DOES NOT HAVE
+    page_area = page.rect.get_area()
+    image_area = sum((fitz.Rect(info['bbox']) & page.rect).get_area() for info in page.get_image_info())
+    return page_area > 0 and image_area / page_area <= OCR_TEXT_LAYER_MAX_IMAGE_RATIO
+
+def v1_classifyPDFPages(file_path, compact=False):
+    # RETURN ({page_number: page_entry} FOR TEXT-LAYER PAGES, [page_number, ...] THAT NEED OCR)
+    dictTextPages = {}
+    lsOcrPages = []
+    with fitz.open(file_path) as doc:
+        for page_index in range(doc.page_count):
+            page = doc.load_page(page_index)
+            text = page.get_text("text", sort=True)
+            if v1_isTextLayerUsable(page, text):
+                lines = [line.strip() for line in text.splitlines() if line.strip()]
+                flat_chars = sum(len(x) + 1 for x in lines)
+                if compact:
+                    lines = v1_extractTextLayerPageCompact(page)
+                dictTextPages[page_index + 1] = {'lines': lines, 'flat_chars': flat_chars, 'source': 'text'}
+            else:
+                lsOcrPages.append(page_index + 1)
+    return dictTextPages, lsOcrPages
+
+def v1_extractTextLayerPageCompact(page):
+    # SAME SHAPE AS THE COMPACT DI LAYOUT OUTPUT: TEXT BLOCKS + TABLES AS TSV GRIDS, TOP-TO-BOTTOM
+    items = []
+    lsTableRects = []
+    for table in page.find_tables().tables:
+        rect = fitz.Rect(table.bbox)
+        lsTableRects.append(rect)
+        items.append((rect.y0, rect.x0, v1_tableRowsToTsv(table.extract())))
+    for x0, y0, x1, y1, text, block_no, block_type in page.get_text("blocks", sort=True):
+        if block_type != 0:
+            continue  # IMAGE BLOCK
+        if any(fitz.Point((x0 + x1)/2, (y0 + y1)/2) in rect for rect in lsTableRects):
+            continue  # CELL CONTENT, ALREADY IN THE TABLE GRID
+        lines = [" ".join(line.split()) for line in text.splitlines() if line.strip()]
+        items.append((y0, x0, lines))
+    items.sort(key=lambda item: (item[0], item[1]))
+    return [line for _, _, lines in items for line in lines]
+
+def v1_pageRangesString(lsPages):
+    # [1,2,3,5,7,8] -> "1-3,5,7-8"
+    ranges = []
+    for page_number in sorted(lsPages):
+        if ranges and page_number == ranges[-1][1] + 1:
+            ranges[-1][1] = page_number
+        else:
+            ranges.append([page_number, page_number])
+    return ",".join(f"{a}" if a == b else f"{a}-{b}" for a, b in ranges)
+
+def v1_ocrMode(layout=False):
+    # RETURN (model_id, output_format)
+    if layout:
+        return OCR_MODEL_ID_LAYOUT, OCR_OUTPUT_FORMAT_LAYOUT
+    return OCR_MODEL_ID, OCR_OUTPUT_FORMAT
+
+def v1_ocrCacheLookup(tempFile, model_id, output_format):
+    # RETURN (cache_key, entry, cached entry or None)
+    if OCR_TEXT_LAYER_FASTPATH:
+        output_format = f"{output_format}+textlayer"
+    pdf_sha256 = tempFile.get('sha256') or v1_hashFile(tempFile['temp_path'])
+    cache_key = v1_ocrCacheKey(pdf_sha256, model_id, output_format)
+    entry = {'pdf_sha256': pdf_sha256, 'model_id': model_id, 'output_format': output_format, 'markdown': None, 'stats': None}
+    cached = v1_diskCacheGet(OCR_CACHE_DIR, cache_key)
+    return cache_key, entry, json.loads(cached) if cached is not None else None
+
+def v1_ocrCacheStore(cache_key, entry, markdownText, stats):
+    entry = dict(entry, markdown=markdownText, stats=stats)
+    v1_diskCachePut(OCR_CACHE_DIR, cache_key, json.dumps(entry, ensure_ascii=False).encode('utf-8'), OCR_CACHE_MAX_BYTES)
+
+def v1_planOcrPages(tempFile, compact=False):
+    # TEXT LAYER FIRST, RETURN ({page_number: page_entry} ALREADY READ, [page_number] FOR DI or None = WHOLE DOCUMENT)
+    if OCR_TEXT_LAYER_FASTPATH:
+        return v1_classifyPDFPages(tempFile['temp_path'], compact=compact)
+    return {}, None
+
+def v1_ocrCircuitOpen(host_key, dictPages):
+    # DOCUMENT INTELLIGENCE BREAKER OPEN - DEGRADE TO THE TEXT-LAYER PAGES, FAIL FAST WHEN THERE ARE NONE
+    if not dictPages:
+        raise HTTPException(status_code=503, detail=f'circuit open: {host_key}')
+    return True
+
+def v1_parsePDFCached(tempFile, layout=False):
+    # RETURN (markdown, stats)
+    model_id, output_format = v1_ocrMode(layout)
+    # LOAD FROM CACHE IF EXISTS
+    cache_key, entry, cached = v1_ocrCacheLookup(tempFile, model_id, output_format)
+    if cached is not None:
+        return cached['markdown'], cached.get('stats')
+    # TEXT LAYER FIRST, DOCUMENT INTELLIGENCE ONLY FOR THE REMAINING PAGES
+    dictPages, lsOcrPages = v1_planOcrPages(tempFile, compact=layout)
+    ocr_skipped = False
+    if lsOcrPages is None or len(lsOcrPages) > 0:
+        host_key = v1_httpHostKey(DOCUMENT_INTELLIGENCE_ENDPOINT)
+        if v1_breakerAllow(host_key):
+            try:
+                dictPages.update(azureDocumentIntelligenceAnalyzePagesChunked(tempFile['temp_path'], 
+                                                                              os.getenv('AZURE_DOCUMENT_INTELLIGENCE_API_KEY'), 
+                                                                              model_id=model_id, 
+                                                                              lsPages=lsOcrPages,
+                                                                              compact=layout))
+            except BaseException as e:
+                v1_breakerRecord(host_key, v1_ocrBreakerOutcome(e))  # ALWAYS RECORDED, RELEASES A HALF-OPEN PROBE SLOT
+                raise
+            v1_breakerRecord(host_key, 'success')
+        else:
+            ocr_skipped = v1_ocrCircuitOpen(host_key, dictPages)
+    markdownText = v1_pageLinesToMarkdown(dictPages)
+    stats = v1_ocrStats(dictPages, model_id)
+    # SAVE TO CACHE (NOT WHEN OCR WAS SKIPPED, RETRY ONCE DOCUMENT INTELLIGENCE IS BACK)
+    if ocr_skipped:
+        stats['ocr_skipped'] = 'circuit_open'
+    else:
+        v1_ocrCacheStore(cache_key, entry, markdownText, stats)
+    return markdownText, stats
+
+async def v1_parsePDFCachedAsync(tempFile, layout=False):
+    # RETURN (markdown, stats)
+    model_id, output_format = v1_ocrMode(layout)
+    # LOAD FROM CACHE IF EXISTS
+    cache_key, entry, cached = await asyncio.to_thread(v1_ocrCacheLookup, tempFile, model_id, output_format)
+    if cached is not None:
+        return cached['markdown'], cached.get('stats')
+    # TEXT LAYER FIRST, DOCUMENT INTELLIGENCE ONLY FOR THE REMAINING PAGES
+    dictPages, lsOcrPages = await asyncio.to_thread(v1_planOcrPages, tempFile, layout)
+    ocr_skipped = False
+    if lsOcrPages is None or len(lsOcrPages) > 0:
+        host_key = v1_httpHostKey(DOCUMENT_INTELLIGENCE_ENDPOINT)
+        async with v1_getAsyncLoopState()['ocr_semaphore']:
+            if v1_breakerAllow(host_key):
+                try:
+                    dictPages.update(await azureDocumentIntelligenceAnalyzePagesChunkedAsync(tempFile['temp_path'], 
+                                                                                            os.getenv('AZURE_DOCUMENT_INTELLIGENCE_API_KEY'), 
+                                                                                            model_id=model_id, 
+                                                                                            lsPages=lsOcrPages,
+                                                                                            compact=layout))
+                except BaseException as e:
+                    v1_breakerRecord(host_key, v1_ocrBreakerOutcome(e))  # ALWAYS RECORDED, RELEASES A HALF-OPEN PROBE SLOT
+                    raise
+                v1_breakerRecord(host_key, 'success')
+            else:
+                ocr_skipped = v1_ocrCircuitOpen(host_key, dictPages)
+    markdownText = v1_pageLinesToMarkdown(dictPages)
+    stats = v1_ocrStats(dictPages, model_id)
+    # SAVE TO CACHE (NOT WHEN OCR WAS SKIPPED, RETRY ONCE DOCUMENT INTELLIGENCE IS BACK)
+    if ocr_skipped:
+        stats['ocr_skipped'] = 'circuit_open'
+    else:
+        await asyncio.to_thread(v1_ocrCacheStore, cache_key, entry, markdownText, stats)
+    return markdownText, stats
+
+_ocrExecutor = None
+_ocrExecutorLock = threading.Lock()
+
+def v1_getOcrExecutor():
+    # PROCESS-WIDE POOL, BOUNDS IN-FLIGHT DOCUMENT INTELLIGENCE JOBS ACROSS ALL REQUESTS
+    global _ocrExecutor
+    with _ocrExecutorLock:
+        if _ocrExecutor is None:
+            _ocrExecutor = concurrent.futures.ThreadPoolExecutor(max_workers=OCR_MAX_CONCURRENCY, thread_name_prefix='ocr')
+    return _ocrExecutor
+
+def v1_parsePDF(stg_lsTempFile, layout=False):
+    # OCR ALL FILES CONCURRENTLY, RESULTS KEPT IN INPUT ORDER
+    executor = v1_getOcrExecutor()
+    futures = [executor.submit(v1_parsePDFCached, tempFile, layout) for tempFile in stg_lsTempFile]
     stg_lsParsedText = []
-    for tempFile in stg_lsTempFile:
+    stg_lsParseError = []
+    stg_lsOcrStats = []
+    for tempFile, future in zip(stg_lsTempFile, futures):
         try:
-            markdownText = azureDocumentIntelligenceParsePDF(tempFile['temp_path'], os.getenv('AZURE_DOCUMENT_INTELLIGENCE_API_KEY'))
+            markdownText, stats = future.result()
             markdownText = f"TEXT_FROM_FILE_NAME:{tempFile['filename']} \n\n" + markdownText
             stg_lsParsedText.append(markdownText)
-        except:
-            pass
-    return stg_lsParsedText
+            stg_lsOcrStats.append(dict(stats or {}, filename=tempFile['filename']))
+        except Exception as e:
+            stg_lsParseError.append({"filename": tempFile['filename'], "error": f"{type(e).__name__}: {e}"})
+    return stg_lsParsedText, stg_lsParseError, stg_lsOcrStats
 
-def v1_readPDFToBase64(stg_lsTempFile):
-    stg_lsBase64 = []
+async def v1_parsePDFAsync(stg_lsTempFile, layout=False):
+    # SAME OUTPUT AS v1_parsePDF, OCR RUNS ON THE ASYNC DI CLIENT SO THE EVENT LOOP STAYS FREE
+    results = await asyncio.gather(*[v1_parsePDFCachedAsync(tempFile, layout) for tempFile in stg_lsTempFile], return_exceptions=True)
+    stg_lsParsedText = []
+    stg_lsParseError = []
+    stg_lsOcrStats = []
+    for tempFile, result in zip(stg_lsTempFile, results):
+        if isinstance(result, Exception):
+            stg_lsParseError.append({"filename": tempFile['filename'], "error": f"{type(result).__name__}: {result}"})
+        else:
+            markdownText, stats = result
+            stg_lsParsedText.append(f"TEXT_FROM_FILE_NAME:{tempFile['filename']} \n\n" + markdownText)
+            stg_lsOcrStats.append(dict(stats or {}, filename=tempFile['filename']))
+    return stg_lsParsedText, stg_lsParseError, stg_lsOcrStats
+
+# PAGE RASTERIZATION ENGINE
+# Pages are rendered on a process pool (PyMuPDF holds the GIL while rendering) and encoded straight from the pixmap.
+# Render size is capped to what the vision model keeps: fit in 2048x2048, then shortest side 768 px.
+RASTER_DPI = int(os.getenv('RASTER_DPI', '150'))
+RASTER_FORMAT = os.getenv('RASTER_FORMAT', 'jpeg').lower()  # jpeg / webp / png
+RASTER_QUALITY = int(os.getenv('RASTER_QUALITY', '85'))
+RASTER_MAX_LONG_SIDE = int(os.getenv('RASTER_MAX_LONG_SIDE', '2048'))
+RASTER_MAX_SHORT_SIDE = int(os.getenv('RASTER_MAX_SHORT_SIDE', '768'))
+RASTER_MAX_WORKERS = int(os.getenv('RASTER_MAX_WORKERS', str(min(4, os.cpu_count() or 1))))
+RASTER_PAGES_PER_TASK = int(os.getenv('RASTER_PAGES_PER_TASK', '4'))
+
+IMAGE_MIME_BY_B64_PREFIX = {'/9j/': 'image/jpeg', 'iVBORw0KGgo': 'image/png', 'UklGR': 'image/webp'}
+
+def v1_toImageDataUrl(base64_img):
+    for prefix, mime in IMAGE_MIME_BY_B64_PREFIX.items():
+        if base64_img.startswith(prefix):
+            return f"data:{mime};base64,{base64_img}"
+    return f"data:image/png;base64,{base64_img}"
+
+def v1_rasterScale(rect, dpi=RASTER_DPI, max_long=RASTER_MAX_LONG_SIDE, max_short=RASTER_MAX_SHORT_SIDE):
+    # ZOOM FACTOR (PIXELS PER POINT) - REQUESTED DPI, SHRUNK TO FIT THE PIXEL CAPS
+    long_side, short_side = max(rect.width, rect.height), min(rect.width, rect.height)
+    scale = dpi / 72
+    if long_side > 0 and max_long > 0: scale = min(scale, max_long / long_side)
+    if short_side > 0 and max_short > 0: scale = min(scale, max_short / short_side)
+    return scale
+
+def v1_encodePixmap(pix, fmt=RASTER_FORMAT, quality=RASTER_QUALITY):
+    if fmt in ('jpeg', 'jpg'):
+        return pix.tobytes("jpeg", jpg_quality=quality)
+    if fmt == 'webp':
+        # PYMUPDF HAS NO WEBP ENCODER
+        img = Image.frombytes("RGB", [pix.width, pix.height], pix.samples)
+        buffered = io.BytesIO()
+        img.save(buffered, format="WEBP", quality=quality, method=4)
+        return buffered.getvalue()
+    return pix.tobytes("png")
+
+def v1_rasterizePDFPages(file_path, lsPageNumbers, dpi=RASTER_DPI, fmt=RASTER_FORMAT, quality=RASTER_QUALITY,
+                         max_long=RASTER_MAX_LONG_SIDE, max_short=RASTER_MAX_SHORT_SIDE):
+    # WORKER TASK - RENDER SOME PAGES OF ONE FILE, RETURN [(page_number, base64 or None), ...]
+    lsResult = []
+    with fitz.open(file_path) as doc:
+        for page_number in lsPageNumbers:
+            try:
+                page = doc.load_page(page_number)
+                scale = v1_rasterScale(page.rect, dpi, max_long, max_short)
+                pix = page.get_pixmap(matrix=fitz.Matrix(scale, scale), alpha=False)
+                lsResult.append((page_number, base64.b64encode(v1_encodePixmap(pix, fmt, quality)).decode("utf-8")))
+            except:
+                lsResult.append((page_number, None))
+    return lsResult
+
+_rasterExecutor = None
+_rasterExecutorLock = threading.Lock()
+
+def v1_getRasterExecutor():
+    # PROCESS-WIDE POOL, SPAWNED WORKERS (FORKING A THREADED SERVER IS NOT SAFE)
+    global _rasterExecutor
+    with _rasterExecutorLock:
+        if _rasterExecutor is None:
+            _rasterExecutor = concurrent.futures.ProcessPoolExecutor(max_workers=RASTER_MAX_WORKERS, 
+                                                                     mp_context=multiprocessing.get_context('spawn'))
+    return _rasterExecutor
+
+def v1_resetRasterExecutor(executor):
+    # DROP A BROKEN POOL (WORKER CRASHED), NEXT CALL STARTS A NEW ONE
+    global _rasterExecutor
+    with _rasterExecutorLock:
+        if _rasterExecutor is executor:
+            _rasterExecutor = None
+    executor.shutdown(wait=False, cancel_futures=True)
+
+def v1_shutdownRasterExecutor():
+    global _rasterExecutor, _pageImageCacheExecutor
+    with _rasterExecutorLock:
+        executor, _rasterExecutor = _rasterExecutor, None
+    if executor is not None:
+        executor.shutdown(wait=True, cancel_futures=True)
+    # PENDING CACHE WRITES OF THE LAST RENDERS ARE FINISHED
+    with _rasterExecutorLock:
+        executor, _pageImageCacheExecutor = _pageImageCacheExecutor, None
+    if executor is not None:
+        executor.shutdown(wait=True)
+
+# PAGE IMAGE CACHE
+# Encoded page images on disk (LRU, same store as the OCR cache), keyed by document hash, page and render settings.
+PAGE_IMAGE_CACHE_DIR = os.getenv('PAGE_IMAGE_CACHE_DIR', 'pageImageCache')
+PAGE_IMAGE_CACHE_MAX_BYTES = int(os.getenv('PAGE_IMAGE_CACHE_MAX_MB', '1024'))*1024*1024
+PAGE_IMAGE_CACHE = os.getenv('PAGE_IMAGE_CACHE', '1') == '1'
+
+def v1_pageImageCacheKey(sha256, page_number):
+    key = f"{sha256}|{page_number}|{RASTER_DPI}|{RASTER_FORMAT}|{RASTER_QUALITY}|{RASTER_MAX_LONG_SIDE}|{RASTER_MAX_SHORT_SIDE}"
+    return hashlib.sha256(key.encode('utf-8')).hexdigest() + '.' + RASTER_FORMAT
+
+def v1_pageImageCacheGet(sha256, page_number):
+    data = v1_diskCacheGet(PAGE_IMAGE_CACHE_DIR, v1_pageImageCacheKey(sha256, page_number))
+    return None if data is None else base64.b64encode(data).decode("utf-8")
+
+_pageImageCacheExecutor = None
+
+def v1_getPageImageCacheExecutor():
+    # ONE THREAD, CACHE WRITES ARE BACKGROUND WORK AND THE EVICTION SCAN SHOULD NOT RUN IN PARALLEL WITH ITSELF
+    global _pageImageCacheExecutor
+    with _rasterExecutorLock:
+        if _pageImageCacheExecutor is None:
+            _pageImageCacheExecutor = concurrent.futures.ThreadPoolExecutor(max_workers=1, thread_name_prefix='page-image-cache')
+    return _pageImageCacheExecutor
+
+def v1_pageImageCacheStoreLater(sha256, future):
+    # DONE-CALLBACK OF A RENDER TASK, RUNS ON THE PROCESS POOL'S MANAGEMENT THREAD, SO ONLY HAND THE RESULT OVER
+    try:
+        v1_getPageImageCacheExecutor().submit(v1_pageImageCacheStore, sha256, future.result())
+    except Exception:
+        pass  # FAILED RENDER OR EXECUTOR SHUT DOWN, CACHE IS BEST EFFORT
+
+def v1_pageImageCacheStore(sha256, lsResult):
+    # ONE EVICTION PASS PER RENDER TASK
+    try:
+        for page_number, img_base64 in lsResult:
+            if img_base64 is not None:
+                v1_diskCachePut(PAGE_IMAGE_CACHE_DIR, v1_pageImageCacheKey(sha256, page_number), 
+                                base64.b64decode(img_base64), PAGE_IMAGE_CACHE_MAX_BYTES, evict=False)
+        v1_diskCacheEvict(PAGE_IMAGE_CACHE_DIR, PAGE_IMAGE_CACHE_MAX_BYTES)
+    except Exception:
+        pass  # CACHE IS BEST EFFORT
+
+# LAZY PAGE IMAGES
+# mainDict['stg_pageImages'] is a handle, pages are only rendered when a stage asks for them (or prefetches them).
+# Page index = position across all files in upload order, same order the old "stg_lsBase64" list had.
+def v1_openPageImages(stg_lsTempFile):
+    lsPage = []
+    dictSha256 = {}
     for tempFile in stg_lsTempFile:
         try:
-            doc = fitz.open(tempFile['temp_path'])
-            for page_number in range(len(doc)):
-                try:
-                    page = doc.load_page(page_number)
-                    pix = page.get_pixmap(dpi=150)
-                    img = Image.frombytes("RGB", [pix.width, pix.height], pix.samples)
-                    buffered = io.BytesIO()
-                    img.save(buffered, format="PNG")
-                    img_base64 = base64.b64encode(buffered.getvalue()).decode("utf-8")
-                    stg_lsBase64.append(img_base64)
-                except:
-                    pass
+            n_pages = v1_getPDFPageCount(tempFile['temp_path'])
+            dictSha256[tempFile['temp_path']] = tempFile.get('sha256') or v1_hashFile(tempFile['temp_path'])
         except:
-            pass
-    return stg_lsBase64
+            continue
+        lsPage.extend((tempFile['temp_path'], page_number) for page_number in range(n_pages))
+    return {'lsPage': lsPage, 'sha256': dictSha256, 'futures': {}, 'lock': threading.Lock()}
+
+def v1_pageImagesHandle(mainDict):
+    with _rasterExecutorLock:
+        if not isinstance(mainDict.get('stg_pageImages'), dict):
+            mainDict['stg_pageImages'] = v1_openPageImages(mainDict['stg_lsTempFile'])
+    return mainDict['stg_pageImages']
+
+def v1_prefetchPageImages(mainDict, pages=None):
+    # SUBMIT RENDERING FOR `pages` (DEFAULT ALL) WITHOUT WAITING, PAGES ALREADY SUBMITTED ARE SKIPPED
+    handle = v1_pageImagesHandle(mainDict)
+    lsIndex = range(len(handle['lsPage'])) if pages is None else [i for i in pages if 0 <= i < len(handle['lsPage'])]
+    with handle['lock']:
+        # GROUP MISSING PAGES BY FILE, ONE TASK PER RASTER_PAGES_PER_TASK PAGES
+        dictByFile = {}
+        for i in lsIndex:
+            if i in handle['futures']:
+                continue
+            file_path, page_number = handle['lsPage'][i]
+            img_base64 = v1_pageImageCacheGet(handle['sha256'][file_path], page_number) if PAGE_IMAGE_CACHE else None
+            if img_base64 is not None:
+                # CACHE HIT - ALREADY DONE, NO RENDERING
+                handle['futures'][i] = concurrent.futures.Future()
+                handle['futures'][i].set_result([(page_number, img_base64)])
+            else:
+                dictByFile.setdefault(file_path, []).append(i)
+        executor = v1_getRasterExecutor() if dictByFile else None
+        for file_path, lsFileIndex in dictByFile.items():
+            for j in range(0, len(lsFileIndex), RASTER_PAGES_PER_TASK):
+                lsTaskIndex = lsFileIndex[j:j + RASTER_PAGES_PER_TASK]
+                lsPageNumbers = [handle['lsPage'][i][1] for i in lsTaskIndex]
+                try:
+                    future = executor.submit(v1_rasterizePDFPages, file_path, lsPageNumbers)
+                except concurrent.futures.process.BrokenProcessPool:
+                    v1_resetRasterExecutor(executor)
+                    executor = v1_getRasterExecutor()
+                    future = executor.submit(v1_rasterizePDFPages, file_path, lsPageNumbers)
+                if PAGE_IMAGE_CACHE:
+                    future.add_done_callback(functools.partial(v1_pageImageCacheStoreLater, handle['sha256'][file_path]))
+                for i in lsTaskIndex:
+                    handle['futures'][i] = future
+    return handle
+
+def v1_pageImageResult(handle, i):
+    file_path, page_number = handle['lsPage'][i]
+    try:
+        lsResult = handle['futures'][i].result()
+    except concurrent.futures.process.BrokenProcessPool:
+        # WORKER DIED - RENDER THIS PAGE HERE
+        lsResult = v1_rasterizePDFPages(file_path, [page_number])
+    return dict(lsResult).get(page_number)
+
+def v1_getPageImages(mainDict, pages=None):
+    # BASE64 IMAGES FOR `pages` (DEFAULT ALL) IN PAGE ORDER, FAILED PAGES LEFT OUT
+    handle = v1_prefetchPageImages(mainDict, pages)
+    lsIndex = range(len(handle['lsPage'])) if pages is None else sorted(i for i in set(pages) if 0 <= i < len(handle['lsPage']))
+    lsBase64 = [v1_pageImageResult(handle, i) for i in lsIndex]
+    return [img_base64 for img_base64 in lsBase64 if img_base64 is not None]
+
+async def v1_getPageImagesAsync(mainDict, pages=None):
+    return await asyncio.to_thread(v1_getPageImages, mainDict, pages)
+
+# INFORMATIVE-PAGE SELECTION FOR VISION CALLS
+# The OCR text already covers plain text pages, so images are only attached for pages with figures, tables
+# (vector drawings), little extractable text, or the first occurrence of a logo. Near-identical pages are
+# dropped with a difference hash (dHash) on a small grayscale render.
+VISION_PAGE_SELECTION = os.getenv('VISION_PAGE_SELECTION', '1') == '1'
+VISION_MAX_PAGES = int(os.getenv('VISION_MAX_PAGES', '8'))
+VISION_MIN_IMAGE_AREA_RATIO = float(os.getenv('VISION_MIN_IMAGE_AREA_RATIO', '0.05'))
+VISION_MIN_DRAWINGS = int(os.getenv('VISION_MIN_DRAWINGS', '20'))
+VISION_DHASH_SIZE = 16
+VISION_DHASH_MAX_DISTANCE = int(os.getenv('VISION_DHASH_MAX_DISTANCE', '12'))
+
+def v1_pageDHash(page, hash_size=VISION_DHASH_SIZE):
+    # (hash_size+1) x hash_size GRAYSCALE RENDER, ONE BIT PER HORIZONTAL NEIGHBOUR COMPARISON
+    rect = page.rect
+    matrix = fitz.Matrix((hash_size + 1) / rect.width, hash_size / rect.height)
+    pix = page.get_pixmap(matrix=matrix, colorspace=fitz.csGRAY, alpha=False)
+    samples, width, stride = pix.samples, pix.width, pix.stride
+    bits = 0
+    for y in range(min(hash_size, pix.height)):
+        row = samples[y*stride:y*stride + width]
+        for x in range(min(hash_size, width - 1)):
+            bits = (bits << 1) | (row[x] > row[x + 1])
+    return bits
+
+def v1_scorePDFPage(page, dictXrefPages, n_pages):
+    # RETURN (score, [reason, ...]) - SCORE 0 = TEXT ONLY, NO IMAGE NEEDED
+    page_area = abs(page.rect) or 1
+    lsReason = []
+    score = 0.0
+    # FIGURES / LOGOS
+    image_area = 0.0
+    for info in page.get_image_info(xrefs=True):
+        bbox_area = abs(fitz.Rect(info['bbox']) & page.rect)
+        xref = info.get('xref', 0)
+        if n_pages > 1 and xref and len(dictXrefPages.get(xref, ())) > 1:
+            # REPEATED ON SEVERAL PAGES = LETTERHEAD / LOGO, ONLY ITS FIRST PAGE COUNTS
+            if min(dictXrefPages[xref]) == page.number and 'logo' not in lsReason:
+                lsReason.append('logo')
+                score += 1
+            continue
+        image_area += bbox_area
+    if image_area / page_area >= VISION_MIN_IMAGE_AREA_RATIO:
+        lsReason.append('figure')
+        score += 2 + 4 * min(1.0, image_area / page_area)
+    # TABLES / CHARTS
+    n_drawings = len(page.get_cdrawings())
+    if n_drawings >= VISION_MIN_DRAWINGS:
+        lsReason.append('drawings')
+        score += 1 + min(2.0, n_drawings / (10 * VISION_MIN_DRAWINGS))
+    # LOW TEXT COVERAGE (SCANNED OR MOSTLY GRAPHIC)
+    if len(page.get_text("text").strip()) < OCR_TEXT_LAYER_MIN_CHARS:
+        lsReason.append('low_text')
+        score += 3
+    return score, lsReason
+
+def v1_selectInformativePages(file_path):
+    # [{'page', 'score', 'reasons', 'dhash'}, ...] FOR PAGES WITH SCORE > 0, IN PAGE ORDER
+    lsSelected = []
+    with fitz.open(file_path) as doc:
+        dictXrefPages = {}
+        for page in doc:
+            for info in page.get_image_info(xrefs=True):
+                if info.get('xref'):
+                    dictXrefPages.setdefault(info['xref'], set()).add(page.number)
+        for page in doc:
+            score, lsReason = v1_scorePDFPage(page, dictXrefPages, len(doc))
+            if page.number == 0 and score == 0:
+                # FIRST PAGE USUALLY CARRIES PRODUCT NAME AND SUPPLIER BRANDING
+                score, lsReason = 0.5, ['first_page']
+            if score > 0:
+                lsSelected.append({'page': page.number, 'score': round(score, 3), 'reasons': lsReason, 'dhash': v1_pageDHash(page)})
+    return lsSelected
+
+def v1_selectVisionPages(mainDict):
+    # GLOBAL PAGE INDICES TO ATTACH AS IMAGES, ALSO KEPT IN mainDict['stg_visionPages'] FOR THE HISTORY FILE
+    handle = v1_pageImagesHandle(mainDict)
+    with handle['lock']:
+        if handle.get('vision_pages') is not None:
+            return handle['vision_pages']
+    if not VISION_PAGE_SELECTION:
+        lsIndex = list(range(len(handle['lsPage'])))
+        mainDict['stg_visionPages'] = {'selection': False, 'pages_total': len(lsIndex), 'pages_selected': len(lsIndex)}
+    else:
+        dictIndex = {page_ref: i for i, page_ref in enumerate(handle['lsPage'])}
+        lsCandidate = []
+        for file_path in dict.fromkeys(file_path for file_path, _ in handle['lsPage']):
+            try:
+                for selected in v1_selectInformativePages(file_path):
+                    lsCandidate.append(dict(selected, index=dictIndex[(file_path, selected['page'])]))
+            except:
+                # UNREADABLE STRUCTURE - FALL BACK TO ALL PAGES OF THIS FILE
+                lsCandidate.extend({'index': i, 'score': 1, 'reasons': ['fallback'], 'dhash': None} 
+                                   for (fp, _), i in dictIndex.items() if fp == file_path)
+        # HIGHEST SCORE FIRST, DROP NEAR-DUPLICATES OF A PAGE ALREADY KEPT, THEN CAP
+        lsKept = []
+        n_duplicates = 0
+        for candidate in sorted(lsCandidate, key=lambda x: (-x['score'], x['index'])):
+            if candidate['dhash'] is not None and any(kept['dhash'] is not None and 
+                                                      bin(candidate['dhash'] ^ kept['dhash']).count('1') <= VISION_DHASH_MAX_DISTANCE 
+                                                      for kept in lsKept):
+                n_duplicates += 1
+                continue
+            lsKept.append(candidate)
+        lsKept = sorted(lsKept[:VISION_MAX_PAGES], key=lambda x: x['index'])
+        lsIndex = [kept['index'] for kept in lsKept]
+        mainDict['stg_visionPages'] = {'selection': True, 
+                                       'pages_total': len(handle['lsPage']), 
+                                       'pages_selected': len(lsIndex),
+                                       'pages_near_duplicate': n_duplicates,
+                                       'pages': [{'index': kept['index'], 'score': kept['score'], 'reasons': kept['reasons']} for kept in lsKept]}
+    with handle['lock']:
+        handle['vision_pages'] = lsIndex
+    return lsIndex
+
+def v1_prefetchVisionPageImages(mainDict):
+    return v1_prefetchPageImages(mainDict, v1_selectVisionPages(mainDict))
+
+def v1_getVisionPageImages(mainDict):
+    return v1_getPageImages(mainDict, v1_selectVisionPages(mainDict))
+
+def v1_readPDFToBase64(stg_lsTempFile):
+    return v1_getPageImages({'stg_lsTempFile': stg_lsTempFile})
 
 def v1_addFieldsMainDict(mainDict):
     mainDict['gpt_manufacturer_or_supplier_answer'] = None
@@ -2510,32 +3941,1065 @@ def v1_addFieldsMainDict(mainDict):
     mainDict['gpt_health_benefits_reason'] = None
     return mainDict
 
-def v1_getProductNameAndSupplierFromTextAndImage(mainDict):
+# TAXONOMY REGISTRY
+# Selection lists per kind (functions, applications, ...) and business line, loaded from the ZMAP workbooks
+# (SFDC export) into a pickled snapshot with a version id. Builders ask v1_taxonomyList() and keep their
+# hard-coded list as fallback for what the snapshot does not have. A reload swaps the whole registry at once
+# (and drops the compiled prompt templates), other workers pick up a new snapshot file on their next lookup.
+TAXONOMY = os.getenv('TAXONOMY', '1') == '1'
+TAXONOMY_SNAPSHOT = os.getenv('TAXONOMY_SNAPSHOT', 'taxonomy/taxonomy.pkl')
+TAXONOMY_CHECK_SECONDS = float(os.getenv('TAXONOMY_CHECK_SECONDS', '5'))
+TAXONOMY_WORKBOOKS = {
+    # KIND -> WORKBOOK WITH COLUMNS Business_Line_Name_Formula__c, Name
+    # ONLY FUNCTIONS AND APPLICATIONS HAVE AN SFDC EXPORT TODAY, THE OTHER KINDS ARE PICKED UP ONCE THEIR WORKBOOK EXISTS
+    # (INDUSTRY CLUSTERS NOT TAKEN FROM Industry_Cluster__c: THE PROMPT LIST LEAVES OUT SOME SFDC CLUSTERS ON PURPOSE)
+    'industry_clusters': 'ZMAP_IndustryClusters.xlsx',
+    'compositions': 'ZMAP_Compositions.xlsx',
+    'functions': 'ZMAP_Functions.xlsx',
+    'applications': 'ZMAP_Applications.xlsx',
+    'certifications': 'ZMAP_Certifications.xlsx',
+    'claims': 'ZMAP_Claims.xlsx'}
+TAXONOMY_CLUSTER_COLUMN = 'Industry_Cluster_Name'  # OPTIONAL WORKBOOK COLUMN, NAME -> INDUSTRY CLUSTER FOR HIERARCHICAL PRUNING
+_taxonomy = {'version': None, 'created': None, 'source': {}, 'lists': {}, 'clusters': {}, 'mtime': None, 'checked': 0.0}
+_taxonomyLock = threading.Lock()
+
+def v1_taxonomyBusinessLine(name):
+    # 'Food & Beverage Ingredients (FBI)' -> 'FBI'
+    match = re.search(r'\(([A-Za-z]+)\)\s*$', str(name))
+    return match.group(1).upper() if match else str(name).strip()
+
+def v1_readTaxonomyWorkbook(path):
+    wb = openpyxl.load_workbook(path, read_only=True, data_only=True)
+    try:
+        rows = wb.worksheets[0].iter_rows(values_only=True)
+        header = list(next(rows))
+        i_bl, i_name = header.index('Business_Line_Name_Formula__c'), header.index('Name')
+        dictList = {}
+        for row in rows:
+            if row[i_bl] is None or row[i_name] is None:
+                continue
+            lsName = dictList.setdefault(v1_taxonomyBusinessLine(row[i_bl]), [])
+            if str(row[i_name]).strip() not in lsName:
+                lsName.append(str(row[i_name]).strip())
+        return dictList
+    finally:
+        wb.close()
+
+def v1_readTaxonomyWorkbookClusters(path):
+    # {business_line: {name: [industry clusters]}}, EMPTY WHEN THE WORKBOOK HAS NO TAXONOMY_CLUSTER_COLUMN
+    wb = openpyxl.load_workbook(path, read_only=True, data_only=True)
+    try:
+        rows = wb.worksheets[0].iter_rows(values_only=True)
+        header = list(next(rows))
+        if TAXONOMY_CLUSTER_COLUMN not in header:
+            return {}
+        i_bl, i_name, i_cluster = header.index('Business_Line_Name_Formula__c'), header.index('Name'), header.index(TAXONOMY_CLUSTER_COLUMN)
+        dictCluster = {}
+        for row in rows:
+            if row[i_bl] is None or row[i_name] is None or row[i_cluster] is None:
+                continue
+            lsCluster = dictCluster.setdefault(v1_taxonomyBusinessLine(row[i_bl]), {}).setdefault(str(row[i_name]).strip(), [])
+            if str(row[i_cluster]).strip() not in lsCluster:
+                lsCluster.append(str(row[i_cluster]).strip())
+        return {business_line: {name: sorted(lsCluster) for name, lsCluster in dictName.items()} for business_line, dictName in dictCluster.items()}
+    finally:
+        wb.close()
+
+def v1_writeTaxonomySnapshot(dictLists, source, path=TAXONOMY_SNAPSHOT, dictClusters=None):
+    # dictLists = {kind: {business_line: [names]}}, dictClusters = {kind: {business_line: {name: [industry clusters]}}}
+    # WRITTEN ATOMICALLY (READERS SEE OLD OR NEW FILE, NEVER HALF)
+    dictClusters = dictClusters or {}
+    snapshot = {
+        'version': hashlib.sha256(json.dumps([dictLists, dictClusters], sort_keys=True, ensure_ascii=False).encode('utf-8')).hexdigest()[:12],
+        'created': datetime.datetime.now().isoformat(timespec='seconds'),
+        'source': source,
+        'lists': dictLists,
+        'clusters': dictClusters}
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path) or '.', suffix='.tmp')
+    with os.fdopen(fd, 'wb') as f:
+        pickle.dump(snapshot, f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(tmp_path, path)
+    return snapshot
+
+def v1_mergeTaxonomy(dictBase, dictOverlay):
+    # {kind: {business_line: value}}, OVERLAY WINS PER BUSINESS LINE (BUSINESS LINES ONLY IN THE BASE ARE KEPT)
+    return {kind: {**dictBase.get(kind, {}), **dictOverlay.get(kind, {})} for kind in {**dictBase, **dictOverlay}}
+
+def v1_buildTaxonomySnapshot(dictWorkbook=TAXONOMY_WORKBOOKS, path=TAXONOMY_SNAPSHOT, sync_path=None):
+    # WORKBOOK LISTS (AND CLUSTERS WHEN THE WORKBOOK HAS THE CLUSTER COLUMN), OVERLAID WITH THE SALESFORCE SYNC RECORDS WHEN A SYNC HAS RUN
+    dictLists = {kind: v1_readTaxonomyWorkbook(file) for kind, file in dictWorkbook.items() if os.path.exists(file)}
+    source = {kind: file for kind, file in dictWorkbook.items() if kind in dictLists}
+    dictClusters = {}
+    for kind in dictLists:
+        dictCluster = v1_readTaxonomyWorkbookClusters(dictWorkbook[kind])
+        if dictCluster:
+            dictClusters[kind] = dictCluster
+    state = v1_loadSFDCSyncState(sync_path or SFDC_SYNC_SNAPSHOT)
+    if not state['records']:
+        return v1_writeTaxonomySnapshot(dictLists, source, path, dictClusters=dictClusters)
+    dictSFDCLists, dictSFDCClusters = v1_taxonomyFromSFDCRecords(state['records'], v1_mergeTaxonomy(dictLists, _taxonomy['lists']))
+    source.update({kind: 'SFDC' for kind in dictSFDCLists})
+    return v1_writeTaxonomySnapshot(v1_mergeTaxonomy(dictLists, dictSFDCLists), source, path, 
+                                    dictClusters=v1_mergeTaxonomy(dictClusters, dictSFDCClusters))
+
+def v1_loadTaxonomySnapshot(path=TAXONOMY_SNAPSHOT):
+    global _taxonomy
+    mtime = os.stat(path).st_mtime_ns
+    with open(path, 'rb') as f:
+        snapshot = pickle.load(f)
+    with _taxonomyLock:
+        _taxonomy = {'clusters': {}, **snapshot, 'mtime': mtime, 'checked': time.monotonic()}
+    v1_resetPromptTemplates()  # TEMPLATES HOLD THE OLD LISTS
+    return _taxonomy
+
+def v1_getTaxonomy():
+    taxonomy = _taxonomy
+    if time.monotonic() - taxonomy['checked'] < TAXONOMY_CHECK_SECONDS:
+        return taxonomy
+    try:
+        mtime = os.stat(TAXONOMY_SNAPSHOT).st_mtime_ns
+    except OSError:
+        mtime = None
+    if mtime is None or mtime == taxonomy['mtime']:
+        taxonomy['checked'] = time.monotonic()
+        return taxonomy
+    try:
+        return v1_loadTaxonomySnapshot()
+    except Exception:
+        taxonomy['checked'] = time.monotonic()  # KEEP SERVING THE CURRENT REGISTRY
+        return taxonomy
+
+def v1_taxonomyList(kind, business_line, default):
+    if not TAXONOMY:
+        return default
+    return v1_getTaxonomy()['lists'].get(kind, {}).get(business_line) or default
+
+def v1_reloadTaxonomy(rebuild=False):
+    if rebuild or not os.path.exists(TAXONOMY_SNAPSHOT):
+        v1_buildTaxonomySnapshot()
+    v1_loadTaxonomySnapshot()
+    return v1_getTaxonomyStats()
+
+def v1_getTaxonomyStats():
+    taxonomy = _taxonomy
+    return {'enabled': TAXONOMY,
+            'version': taxonomy['version'],
+            'created': taxonomy['created'],
+            'snapshot': TAXONOMY_SNAPSHOT,
+            'source': taxonomy['source'],
+            'hard_coded': [kind for kind in TAXONOMY_WORKBOOKS if kind not in taxonomy['lists']],
+            'count': {kind: {business_line: len(lsName) for business_line, lsName in dictBL.items()} 
+                      for kind, dictBL in taxonomy['lists'].items()},
+            'with_clusters': {kind: {business_line: len(dictName) for business_line, dictName in dictBL.items()} 
+                              for kind, dictBL in taxonomy['clusters'].items()},
+            # HIERARCHICAL PRUNING FALLS BACK TO THE FULL LIST FOR THESE (NO CLUSTER COLUMN IN THE WORKBOOK, NO SFDC SYNC YET)
+            'no_cluster_mapping': [f"{kind}|{business_line}" for kind in ('functions', 'applications') 
+                                   for business_line in taxonomy['lists'].get(kind, {}) if not taxonomy['clusters'].get(kind, {}).get(business_line)]}
+
+# SALESFORCE TAXONOMY SYNC
+# Delta sync of the taxonomy objects instead of a full export: only the needed columns, only rows with
+# SystemModstamp >= last watermark, via queryAll so deleted rows come back with IsDeleted = true.
+# Records are kept in a local snapshot, the taxonomy registry snapshot is written straight from it.
+# Rows hard-deleted past the recycle bin never come back from queryAll, so a full pull runs every SFDC_SYNC_FULL_DAYS.
+SFDC_SYNC_SNAPSHOT = os.getenv('SFDC_SYNC_SNAPSHOT', 'taxonomy/sfdc_sync.pkl')
+SFDC_SYNC_FULL_DAYS = float(os.getenv('SFDC_SYNC_FULL_DAYS', '7'))
+SFDC_SYNC_OBJECTS = {
+    # OBJECT -> (TAXONOMY KIND, COLUMNS)
+    'Industry_Cluster__c': (None, ['Id', 'Name', 'Business_Line_Name_Formula__c', 'IsDeleted', 'SystemModstamp']),
+    'function__c': ('functions', ['Id', 'Name', 'Industry_Cluster__c', 'IsDeleted', 'SystemModstamp']),
+    'application__c': ('applications', ['Id', 'Name', 'Industry_Cluster__c', 'IsDeleted', 'SystemModstamp'])}
+
+def v1_sfdcConnect(refresh=False):
+    # GET TOKEN IF NO TOKEN YET (SAME FLOW AS ZMAP_QuerySFDCList.ipynb)
+    if refresh or 'SALESFORCE_ACCESS_TOKEN' not in os.environ or 'SALESFORCE_INSTANCE_URL' not in os.environ:
+        headers = {'Authorization': os.getenv('SFDC_AUTH'), 'Cookie': os.getenv('SFDC_COOKIE')}
+        response = requests.post(os.getenv('SFDC_URL'), headers=headers, data={}, timeout=60)
+        response.raise_for_status()
+        os.environ['SALESFORCE_ACCESS_TOKEN'] = response.json()['access_token']
+        os.environ['SALESFORCE_INSTANCE_URL'] = response.json()['instance_url']
+    return simple_salesforce.Salesforce(instance_url=os.environ['SALESFORCE_INSTANCE_URL'], session_id=os.environ['SALESFORCE_ACCESS_TOKEN'])
+
+def v1_sfdcWatermark(system_modstamp):
+    # '2026-01-16T09:50:00.000+0000' -> SOQL DATETIME LITERAL IN UTC, SECONDS (>= RE-READS THE BOUNDARY ROWS, UPSERT IS IDEMPOTENT)
+    value = datetime.datetime.strptime(system_modstamp, '%Y-%m-%dT%H:%M:%S.%f%z')
+    return value.astimezone(datetime.timezone.utc).strftime('%Y-%m-%dT%H:%M:%SZ')
+
+def v1_sfdcQueryDelta(sfConn, object_name, lsColumn, since=None):
+    soql = f"SELECT {', '.join(lsColumn)} FROM {object_name}"
+    if since:
+        soql += f" WHERE SystemModstamp >= {since}"
+    result = sfConn.query_all(soql, include_deleted=True)
+    return [{key: value for key, value in record.items() if key != 'attributes'} for record in result['records']]
+
+def v1_loadSFDCSyncState(path=SFDC_SYNC_SNAPSHOT):
+    try:
+        with open(path, 'rb') as f:
+            return pickle.load(f)
+    except (OSError, EOFError, pickle.UnpicklingError):
+        return {'watermark': {}, 'records': {}, 'last_full': None}
+
+def v1_saveSFDCSyncState(state, path=SFDC_SYNC_SNAPSHOT):
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path) or '.', suffix='.tmp')
+    with os.fdopen(fd, 'wb') as f:
+        pickle.dump(state, f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(tmp_path, path)
+
+def v1_taxonomyFromSFDCRecords(dictRecords, dictCurrentLists):
+    # {kind: {business_line: [names]}} + {kind: {business_line: {name: [clusters]}}}
+    # NAMES ALREADY IN THE REGISTRY KEEP THEIR POSITION (PROMPTS STAY STABLE), NEW NAMES APPENDED IN NAME ORDER
+    dictCluster = dictRecords.get('Industry_Cluster__c', {})
+    dictLists, dictClusters = {}, {}
+    for object_name, (kind, _) in SFDC_SYNC_OBJECTS.items():
+        if kind is None:
+            continue
+        dictName = {}
+        for record in dictRecords.get(object_name, {}).values():
+            cluster = dictCluster.get(record.get('Industry_Cluster__c'))
+            if cluster is None or not record.get('Name'):
+                continue
+            business_line = v1_taxonomyBusinessLine(cluster['Business_Line_Name_Formula__c'])
+            lsCluster = dictName.setdefault(business_line, {}).setdefault(record['Name'].strip(), [])
+            if cluster['Name'] not in lsCluster:
+                lsCluster.append(cluster['Name'])
+        for business_line, dictNameCluster in dictName.items():
+            lsCurrent = [name for name in dictCurrentLists.get(kind, {}).get(business_line, []) if name in dictNameCluster]
+            setCurrent = set(lsCurrent)
+            lsNew = sorted(name for name in dictNameCluster if name not in setCurrent)
+            dictLists.setdefault(kind, {})[business_line] = lsCurrent + lsNew
+            dictClusters.setdefault(kind, {})[business_line] = {name: sorted(lsCluster) for name, lsCluster in dictNameCluster.items()}
+    return dictLists, dictClusters
+
+def v1_syncTaxonomyFromSFDC(sfConn=None, full=False, path=SFDC_SYNC_SNAPSHOT):
+    time_start = time.monotonic()
+    state = v1_loadSFDCSyncState(path)
+    now = datetime.datetime.now(datetime.timezone.utc)
+    if state['last_full'] is None or (now - state['last_full']).total_seconds() > SFDC_SYNC_FULL_DAYS * 86400:
+        full = True
+    if full:
+        state = {'watermark': {}, 'records': {}, 'last_full': now}
+    connect, refreshed = sfConn is None, False
+    sfConn = sfConn or v1_sfdcConnect()
+    dictStats = {}
+    for object_name, (_, lsColumn) in SFDC_SYNC_OBJECTS.items():
+        try:
+            lsRecord = v1_sfdcQueryDelta(sfConn, object_name, lsColumn, state['watermark'].get(object_name))
+        except simple_salesforce.exceptions.SalesforceExpiredSession:
+            # 401 INVALID_SESSION_ID: CACHED TOKEN EXPIRED, GET A NEW ONE ONCE (ONLY FOR OUR OWN CONNECTION)
+            if not connect or refreshed:
+                raise
+            sfConn, refreshed = v1_sfdcConnect(refresh=True), True
+            lsRecord = v1_sfdcQueryDelta(sfConn, object_name, lsColumn, state['watermark'].get(object_name))
+        dictRecord = state['records'].setdefault(object_name, {})
+        n_deleted = 0
+        for record in lsRecord:
+            if record.get('IsDeleted'):
+                n_deleted += dictRecord.pop(record['Id'], None) is not None
+            else:
+                dictRecord[record['Id']] = record
+        if lsRecord:
+            state['watermark'][object_name] = max(v1_sfdcWatermark(record['SystemModstamp']) for record in lsRecord)
+        dictStats[object_name] = {'fetched': len(lsRecord), 'deleted': n_deleted, 'total': len(dictRecord)}
+    v1_saveSFDCSyncState(state, path)
+    # WRITE THE REGISTRY, KINDS (e.g. CLAIMS) AND BUSINESS LINES NOT IN SFDC KEEP THEIR CURRENT LISTS
+    taxonomy = v1_getTaxonomy()
+    dictLists, dictClusters = v1_taxonomyFromSFDCRecords(state['records'], taxonomy['lists'])
+    source = {**taxonomy['source'], **{kind: 'SFDC' for kind in dictLists}}
+    v1_writeTaxonomySnapshot(v1_mergeTaxonomy(taxonomy['lists'], dictLists), source, 
+                             dictClusters=v1_mergeTaxonomy(taxonomy['clusters'], dictClusters))
+    v1_loadTaxonomySnapshot()
+    return {'full': full,
+            'seconds': round(time.monotonic() - time_start, 2),
+            'objects': dictStats,
+            'watermark': state['watermark'],
+            'taxonomy': v1_getTaxonomyStats()}
+
+# OPTION SHORTLISTING
+# Long selection lists (functions, applications) are ranked locally with BM25 - option label + synonyms are the
+# documents, product text + web search is the query - and only the top OPTION_SHORTLIST_TOP_K plus
+# OPTION_SHORTLIST_MARGIN options go to the model ("Other(s)" options always kept, list order unchanged).
+# Lists shorter than OPTION_SHORTLIST_MIN_OPTIONS (default 2 x (K + margin)) are sent as they are: cutting a list
+# of 39-42 options to 35 saves little and lost recall (0.88-0.93 on FBI applications / PCI functions), with the
+# defaults only SCI (116) and PHI (89) functions are shortlisted. Recall against histAPICalls/: v1_shortlistRecallReport().
+OPTION_SHORTLIST = os.getenv('OPTION_SHORTLIST', '0') == '1'
+OPTION_SHORTLIST_TOP_K = int(os.getenv('OPTION_SHORTLIST_TOP_K', '25'))
+OPTION_SHORTLIST_MARGIN = int(os.getenv('OPTION_SHORTLIST_MARGIN', '10'))
+OPTION_SHORTLIST_MIN_OPTIONS = int(os.getenv('OPTION_SHORTLIST_MIN_OPTIONS', str(2 * (OPTION_SHORTLIST_TOP_K + OPTION_SHORTLIST_MARGIN))))
+OPTION_SHORTLIST_SYNONYMS = os.getenv('OPTION_SHORTLIST_SYNONYMS', 'ZMAP_Synonyms.json')  # OPTIONAL {option: [synonyms]}
+BM25_K1 = 1.2
+BM25_B = 0.75
+BM25_K3 = 8
+BM25_STOPWORDS = {'and', 'the', 'of', 'for', 'in', 'on', 'with', 'to', 'or', 'as', 'by', 'an', 'is', 'are', 'be', 'it', 'at', 'from', 'this', 'that'}
+_shortlistIndex = {}
+_shortlistSynonyms = None
+
+def v1_bm25Tokens(text):
+    text = unicodedata.normalize('NFKD', str(text)).lower()
+    lsToken = [t for t in re.findall(r'[a-z0-9]+', text) if len(t) > 1 and t not in BM25_STOPWORDS]
+    # LIGHT PLURAL FOLDING (ADDITIVES -> ADDITIVE, COATINGS -> COATING)
+    return [t[:-1] if len(t) > 3 and t.endswith('s') and not t.endswith('ss') else t for t in lsToken]
+
+def v1_shortlistSynonyms():
+    global _shortlistSynonyms
+    if _shortlistSynonyms is None:
+        try:
+            with open(OPTION_SHORTLIST_SYNONYMS, 'r', encoding='utf-8') as f:
+                _shortlistSynonyms = json.load(f)
+        except (OSError, ValueError):
+            _shortlistSynonyms = {}
+    return _shortlistSynonyms
+
+def v1_bm25Index(lsOption):
+    key = tuple(lsOption)
+    index = _shortlistIndex.get(key)
+    if index is not None:
+        return index
+    dictSynonym = v1_shortlistSynonyms()
+    lsDoc = [v1_bm25Tokens(' '.join([option] + list(dictSynonym.get(option, [])))) for option in lsOption]
+    vocab = {t: i for i, t in enumerate(sorted({t for doc in lsDoc for t in doc}))}
+    tf = np.zeros((len(vocab), len(lsOption)), dtype=np.float32)
+    for j, doc in enumerate(lsDoc):
+        for t in doc:
+            tf[vocab[t], j] += 1
+    dl = tf.sum(axis=0)
+    avgdl = float(dl.mean()) or 1.0
+    df = (tf > 0).sum(axis=1)
+    idf = np.log(1 + (len(lsOption) - df + 0.5) / (df + 0.5))
+    # TERM x OPTION WEIGHTS, SCORING A QUERY IS THEN ONE VECTOR-MATRIX PRODUCT
+    weight = idf[:, None] * tf * (BM25_K1 + 1) / (tf + BM25_K1 * (1 - BM25_B + BM25_B * dl / avgdl))
+    index = {'vocab': vocab, 'weight': weight.astype(np.float32),
+             'always': np.array([bool({'other', 'others'} & set(v1_bm25Tokens(option) + [option.strip().lower()])) for option in lsOption])}
+    if len(_shortlistIndex) > 64:
+        _shortlistIndex.clear()
+    _shortlistIndex[key] = index
+    return index
+
+def v1_bm25Scores(lsOption, query_text):
+    index = v1_bm25Index(lsOption)
+    qtf = np.zeros(len(index['vocab']), dtype=np.float32)
+    for t in v1_bm25Tokens(query_text):
+        i = index['vocab'].get(t)
+        if i is not None:
+            qtf[i] += 1
+    return (qtf * (BM25_K3 + 1) / (qtf + BM25_K3)) @ index['weight']
+
+def v1_shortlistOptions(lsOption, query_text, top_k=OPTION_SHORTLIST_TOP_K, margin=OPTION_SHORTLIST_MARGIN):
+    scores = v1_bm25Scores(lsOption, query_text)
+    keep = np.zeros(len(lsOption), dtype=bool)
+    keep[np.argsort(-scores, kind='stable')[:top_k + margin]] = True
+    keep |= v1_bm25Index(lsOption)['always']
+    return [option for option, k in zip(lsOption, keep) if k]
+
+def v1_selectionOptions(builder, business_line):
+    # FULL OPTION LIST AS SENT TODAY (TAXONOMY REGISTRY OR HARD-CODED), READ FROM THE BUILT SCHEMA
+    body = v1_buildBody(builder, '', '', '', [], business_line, '')
+    return [name for name in body['response_format']['json_schema']['schema']['properties'] if name != 'reason']
+
+def v1_shortlistApplies(lsOption, top_k=OPTION_SHORTLIST_TOP_K, margin=OPTION_SHORTLIST_MARGIN, min_options=OPTION_SHORTLIST_MIN_OPTIONS):
+    return len(lsOption) >= min_options and len(lsOption) > top_k + margin
+
+def v1_shortlistCandidates(mainDict, builder, kind, lsOption=None):
+    # lsOption = OPTIONS ALREADY NARROWED DOWN (e.g. BY CLUSTER), RETURNED AS IS WHEN NOT SHORTLISTED
+    if not OPTION_SHORTLIST:
+        return lsOption
+    lsOption = lsOption if lsOption is not None else v1_selectionOptions(builder, mainDict['inputBusinessLine'])
+    if not v1_shortlistApplies(lsOption):
+        return lsOption
+    query_text = f"{mainDict['inputProductName']}\n{mainDict['gpt_text_of_this_product_only_answer']}\n{mainDict['gpt_combined_web_search']}"
+    candidates = v1_shortlistOptions(lsOption, query_text)
+    mainDict.setdefault('stg_shortlist', {})[kind] = {'options': len(lsOption), 'sent': len(candidates)}
+    return candidates
+
+def v1_shortlistRecallReport(folder='histAPICalls/', top_k=OPTION_SHORTLIST_TOP_K, margin=OPTION_SHORTLIST_MARGIN, min_options=OPTION_SHORTLIST_MIN_OPTIONS):
+    # RECALL = SHARE OF PAST MODEL ANSWERS THAT THE SHORTLIST WOULD HAVE KEPT
+    # HISTORY HIDES THE PRODUCT-ONLY TEXT, THE FULL PARSED TEXT IS USED AS QUERY INSTEAD
+    # LISTS BELOW `min_options` ARE SENT WHOLE (RECALL 1), PASS min_options=0 TO MEASURE EVERY LIST
+    lsKind = [('functions', PIM_buildBodySelectFunction, 'gpt_select_functions_answer'),
+              ('applications', PIM_buildBodySelectApplication, 'gpt_select_applications_answer')]
+    dictReport = {}
+    for file in sorted(os.listdir(folder)):
+        if not file.endswith('.json'):
+            continue
+        with open(os.path.join(folder, file), 'r', encoding='utf-8') as f:
+            record = json.load(f)
+        query_text = f"{record.get('inputProductName', '')}\n{record.get('stg_parsedText', '')}\n{record.get('gpt_combined_web_search') or ''}"
+        for kind, builder, answer_key in lsKind:
+            answer = record.get(answer_key)
+            if not isinstance(answer, list) or not answer:
+                continue
+            try:
+                lsOption = v1_selectionOptions(builder, record['inputBusinessLine'])
+            except Exception:
+                continue
+            if v1_shortlistApplies(lsOption, top_k, margin, min_options):
+                candidates = set(v1_shortlistOptions(lsOption, query_text, top_k, margin))
+            else:
+                candidates = set(lsOption)
+            hits = len(set(answer) & candidates)
+            row = dictReport.setdefault(f"{kind}|{record['inputBusinessLine']}", 
+                                        {'records': 0, 'answers': 0, 'hits': 0, 'records_all_kept': 0, 'options': 0, 'sent': 0})
+            row['records'] += 1
+            row['answers'] += len(answer)
+            row['hits'] += hits
+            row['records_all_kept'] += hits == len(set(answer))
+            row['options'] += len(lsOption)
+            row['sent'] += len(candidates)
+    for row in dictReport.values():
+        row['recall'] = round(row['hits'] / row['answers'], 4)
+        row['avg_options'] = round(row.pop('options') / row['records'], 1)
+        row['avg_sent'] = round(row.pop('sent') / row['records'], 1)
+    return {'top_k': top_k, 'margin': margin, 'min_options': min_options, 'report': dictReport}
+
+# HIERARCHICAL PRUNING BY INDUSTRY CLUSTER
+# With inputHierarchicalPruning the industry cluster is resolved first and functions/applications only get the
+# options mapped (taxonomy registry 'clusters', from the SFDC sync or the workbook cluster column) to the selected clusters, plus unmapped and
+# "Other(s)" options. Full list when the mapping is missing, no cluster / too many clusters were selected,
+# the cluster call rates its own answer below HIERARCHICAL_MIN_CONFIDENCE (extra "confidence" field, only asked
+# with pruning on) or too few options would be left. Outcome per kind in "stg_hierarchicalPruning".
+HIERARCHICAL_MAX_CLUSTERS = int(os.getenv('HIERARCHICAL_MAX_CLUSTERS', '2'))
+HIERARCHICAL_MIN_OPTIONS = int(os.getenv('HIERARCHICAL_MIN_OPTIONS', '5'))
+HIERARCHICAL_CONFIDENCE_LEVELS = ['low', 'medium', 'high']
+HIERARCHICAL_MIN_CONFIDENCE = os.getenv('HIERARCHICAL_MIN_CONFIDENCE', 'high')  # low / medium / high
+
+def v1_clusterKeys(name):
+    # 'Polymers (PO)' ~ 'POLYMERS' ~ 'PO', 'Beverage & Dairy (BD)' ~ 'Beverage and Dairy'
+    name = str(name).strip().lower()
+    match = re.search(r'\(([^)]*)\)\s*$', name)
+    keys = {re.sub(r'[^a-z0-9]+', ' ', re.sub(r'\s*\([^)]*\)\s*$', '', name).replace('&', ' and ')).strip()}
+    if match:
+        keys.add(match.group(1).strip())
+    return keys - {''}
+
+def v1_pruneByCluster(mainDict, builder, kind):
+    if not mainDict.get('inputHierarchicalPruning', False):
+        return None
+    dictOutcome = mainDict.setdefault('stg_hierarchicalPruning', {})
+    dictNameCluster = v1_getTaxonomy()['clusters'].get(kind, {}).get(mainDict['inputBusinessLine'])
+    lsCluster = mainDict.get('gpt_select_industry_cluster_answer') or []
+    confidence = mainDict.get('gpt_select_industry_cluster_confidence')
+    if not dictNameCluster:
+        dictOutcome[kind] = {'fallback': 'no_cluster_mapping'}
+        return None
+    if not lsCluster or len(lsCluster) > HIERARCHICAL_MAX_CLUSTERS:
+        dictOutcome[kind] = {'fallback': 'cluster_count', 'clusters': lsCluster}
+        return None
+    if confidence not in HIERARCHICAL_CONFIDENCE_LEVELS or HIERARCHICAL_CONFIDENCE_LEVELS.index(confidence) < HIERARCHICAL_CONFIDENCE_LEVELS.index(HIERARCHICAL_MIN_CONFIDENCE):
+        dictOutcome[kind] = {'fallback': 'low_confidence', 'clusters': lsCluster, 'confidence': confidence}
+        return None
+    setKey = set().union(*[v1_clusterKeys(cluster) for cluster in lsCluster])
+    setMapped = {cluster for lsName in dictNameCluster.values() for cluster in lsName if v1_clusterKeys(cluster) & setKey}
+    if not setMapped:
+        dictOutcome[kind] = {'fallback': 'cluster_not_mapped', 'clusters': lsCluster}
+        return None
+    lsOption = v1_selectionOptions(builder, mainDict['inputBusinessLine'])
+    candidates = [name for name in lsOption 
+                  if not dictNameCluster.get(name) or set(dictNameCluster[name]) & setMapped or {'other', 'others'} & set(v1_bm25Tokens(name))]
+    if len(candidates) < HIERARCHICAL_MIN_OPTIONS:
+        dictOutcome[kind] = {'fallback': 'too_few_options', 'clusters': lsCluster}
+        return None
+    dictOutcome[kind] = {'clusters': sorted(setMapped), 'confidence': confidence, 'options': len(lsOption), 'sent': len(candidates)}
+    return candidates
+
+def v1_selectionCandidates(mainDict, builder, kind):
+    # CLUSTER PRUNING FIRST, THEN BM25 SHORTLIST WITHIN WHAT IS LEFT, None = FULL LIST
+    return v1_shortlistCandidates(mainDict, builder, kind, v1_pruneByCluster(mainDict, builder, kind))
+
+async def v1_awaitClusterAnswer(clusterTask, mainDict):
+    try:
+        mainDict['gpt_select_industry_cluster_answer'] = (await clusterTask)[0]
+    except Exception:
+        pass  # CLUSTER CALL FAILED, FULL LISTS
+
+async def v1_runStepsAfterClusterAsync(clusterTask, steps, mainDict, hedge=False):
+    # FUNCTIONS/APPLICATIONS BUILD THEIR BODY ON FIRST STEP, SO THE CLUSTER ANSWER IS IN mainDict BY THEN
+    await v1_awaitClusterAnswer(clusterTask, mainDict)
+    return await v1_runStepsAsync(steps, hedge=hedge)
+
+async def v1_runStepsConsolidatedAfterClusterAsync(clusterTask, lsSteps, mainDict, hedge=False):
+    # CONSOLIDATED MODE: FUNCTIONS/APPLICATIONS AS ONE COMBINED CALL, BUILT AFTER THE CLUSTER ANSWER
+    await v1_awaitClusterAnswer(clusterTask, mainDict)
+    return await v1_runStepsConsolidatedAsync(lsSteps, n_calls=1, hedge=hedge)
+
+# PROMPT TEMPLATE REGISTRY
+# Each PIM_buildBody* builder is compiled once per business line: it is called with slot markers instead of the
+# per-request text, the messages are split at the markers and the rest of the body (model, schema ...) is kept
+# as one shared object, serialized once. A request then only joins its text into the slots.
+# A template is only used if it renders exactly what the builder returns (checked at compile time),
+# otherwise the builder is called as before. PROMPT_VERSION = hash of all compiled templates.
+PROMPT_TEMPLATES = os.getenv('PROMPT_TEMPLATES', '1') == '1'
+PROMPT_TEMPLATE_BUSINESS_LINES = ['FBI', 'PCI', 'PHI', 'SCI']
+PROMPT_TEMPLATE_SLOT = re.compile('\x00(\\w+)\x00')
+PROMPT_TEMPLATE_SLOT_JSON = re.compile(r'\\u0000(\w+)\\u0000')
+PROMPT_TEMPLATE_OPTION_PARAMS = ('candidates', 'confidence')  # BUILDER PARAMS THAT CHANGE THE SCHEMA, TEMPLATE = DEFAULT VALUE
+PROMPT_TEMPLATE_BUILDERS = [
+    PIM_buildBodyGetProductNameAndSupplierFromTextAndImage,
+    PIM_buildBodyGetManufacturerOrSupplier,
+    PIM_buildBodyGetProductInfo,
+    PIM_buildBodySelectIndustryCluster,
+    PIM_buildBodySelectComposition,
+    PIM_buildBodySelectFunction,
+    PIM_buildBodySelectApplication,
+    PIM_buildBodyFindCASNumber,
+    PIM_buildBodyFindPhysicalForm,
+    PIM_buildBodyGetProductDescription,
+    PIM_buildBodyGetRecommendedDosage,
+    PIM_buildBodySelectCertifications,
+    PIM_buildBodySelectClaims,
+    PIM_buildBodySelectHealthBenefits]
+PROMPT_TEMPLATE_STATS = {'compiled': 0, 'not_templatable': 0, 'rendered': 0, 'builder_calls': 0}
+_promptTemplates = {}
+_promptTemplatesLock = threading.Lock()
+_jsonFragments = {}
+
+def v1_jsonFragment(obj, ensure_ascii=True):
+    # SERIALIZED ONCE FOR OBJECTS REGISTERED BY THE TEMPLATE REGISTRY, DUMPED AS USUAL OTHERWISE
+    fragment = _jsonFragments.get((id(obj), ensure_ascii))
+    if fragment is not None and fragment[0] is obj:
+        return fragment[1]
+    return json.dumps(obj, ensure_ascii=ensure_ascii)
+
+def v1_freezeJson(obj):
+    for ensure_ascii in (True, False):
+        _jsonFragments[(id(obj), ensure_ascii)] = (obj, json.dumps(obj, ensure_ascii=ensure_ascii))
+    return obj
+
+def v1_dumpBody(body):
+    # REQUEST BODY -> JSON TEXT, PRE-SERIALIZED response_format SPLICED IN, str BODY PASSED THROUGH
+    if isinstance(body, str):
+        return body
+    response_format = body.get('response_format')
+    if (id(response_format), True) not in _jsonFragments:
+        return json.dumps(body)
+    rest = json.dumps({key: value for key, value in body.items() if key != 'response_format'})
+    return (rest[:-1] + ', ' if rest != '{}' else '{') + '"response_format": ' + v1_jsonFragment(response_format) + '}'
+
+def v1_renderBodyTemplate(template, dictValue, ls_base64):
+    messages = []
+    for role, lsPart in template['messages']:
+        content = list(lsPart)
+        content[1::2] = [dictValue[name] for name in lsPart[1::2]]
+        messages.append({"role": role, "content": ''.join(content)})
+    for base64_img in ls_base64:
+        messages.append({"role": "user", 
+                         "content": [{"type": "image_url", "image_url": {"url": v1_toImageDataUrl(base64_img)}}]})
+    body = dict(template['static'])
+    for key, lsPart in template['slotted'].items():
+        # SMALL PARTS OUTSIDE THE MESSAGES THAT ALSO NAME THE PRODUCT (e.g. SCHEMA DESCRIPTIONS), KEPT AS JSON TEXT
+        text = list(lsPart)
+        text[1::2] = [json.dumps(dictValue[name])[1:-1] for name in lsPart[1::2]]
+        body[key] = json.loads(''.join(text))
+    body['messages'] = messages
+    return body
+
+@functools.cache
+def v1_builderParams(builder):
+    parameters = inspect.signature(builder).parameters
+    return list(parameters), {name: p.default for name, p in parameters.items() if p.default is not p.empty}
+
+def v1_compileBodyTemplate(builder, business_line=None):
+    lsParam, _ = v1_builderParams(builder)
+    lsSlot = [name for name in lsParam if name not in ('ls_base64', 'business_line') + PROMPT_TEMPLATE_OPTION_PARAMS]
+    fixed = {'business_line': business_line} if 'business_line' in lsParam else {}
+    body = builder(ls_base64=[], **fixed, **{name: f"\x00{name}\x00" for name in lsSlot})
+    if not all(isinstance(m.get('content'), str) and set(m) == {'role', 'content'} for m in body.get('messages', [])):
+        return None
+    template = {
+        'params': lsParam,
+        'fixed': fixed,
+        'messages': [(m['role'], tuple(PROMPT_TEMPLATE_SLOT.split(m['content']))) for m in body['messages']],
+        'static': {},
+        'slotted': {}}
+    for key, value in body.items():
+        if key == 'messages':
+            continue
+        lsPart = tuple(PROMPT_TEMPLATE_SLOT_JSON.split(json.dumps(value)))
+        if len(lsPart) > 1:
+            template['slotted'][key] = lsPart
+        else:
+            template['static'][key] = value
+    # SELF-CHECK, WITH TEXT + ONE IMAGE AND WITH EMPTY TEXT (BUILDERS MAY BRANCH ON EMPTY INPUT)
+    for dictValue, ls_base64 in (({name: f"{name} sample µ" for name in lsSlot}, ['/9j/sample']), 
+                                 ({name: '' for name in lsSlot}, [])):
+        if v1_renderBodyTemplate(template, dictValue, ls_base64) != builder(ls_base64=ls_base64, **fixed, **dictValue):
+            return None
+    response_format = template['static'].get('response_format')
+    if response_format:
+        v1_freezeJson(response_format)
+        if 'schema' in response_format.get('json_schema', {}):
+            v1_freezeJson(response_format['json_schema']['schema'])  # ALSO INLINED BY v1_promptLayout
+    template['version'] = hashlib.sha256(json.dumps([template['messages'], template['static'], template['slotted']], ensure_ascii=False).encode('utf-8')).hexdigest()[:12]
+    return template
+
+def v1_getBodyTemplate(builder, business_line=None):
+    if TAXONOMY:
+        v1_getTaxonomy()  # A NEW TAXONOMY SNAPSHOT DROPS THE COMPILED TEMPLATES
+    key = (builder.__name__, business_line)
+    template = _promptTemplates.get(key, False)
+    if template is not False:
+        return template
+    with _promptTemplatesLock:
+        if key not in _promptTemplates:
+            try:
+                template = v1_compileBodyTemplate(builder, business_line)
+            except Exception:
+                template = None  # e.g. UNKNOWN BUSINESS LINE, LET THE BUILDER RAISE AT CALL TIME
+            PROMPT_TEMPLATE_STATS['compiled' if template else 'not_templatable'] += 1
+            _promptTemplates[key] = template
+        return _promptTemplates[key]
+
+def v1_buildBody(builder, *args):
+    # SAME ARGUMENTS AS THE BUILDER, BODY RENDERED FROM THE COMPILED TEMPLATE WHEN THERE IS ONE
+    if not PROMPT_TEMPLATES:
+        return builder(*args)
+    lsParam, dictDefault = v1_builderParams(builder)
+    dictArg = {**dictDefault, **dict(zip(lsParam, args))}
+    # OPTION PARAMS ARE NOT TEMPLATED, A REQUEST THAT SETS ONE IS BUILT BY THE BUILDER ITSELF
+    if any(dictArg.get(name) not in (None, False) for name in PROMPT_TEMPLATE_OPTION_PARAMS):
+        template = None
+    else:
+        template = v1_getBodyTemplate(builder, dictArg.get('business_line'))
+    if template is None:
+        PROMPT_TEMPLATE_STATS['builder_calls'] += 1
+        return builder(*args)
+    PROMPT_TEMPLATE_STATS['rendered'] += 1
+    return v1_renderBodyTemplate(template, dictArg, dictArg['ls_base64'])
+
+def v1_compilePromptTemplates(lsBusinessLine=PROMPT_TEMPLATE_BUSINESS_LINES):
+    # WARM-UP AT STARTUP, RETURN PROMPT VERSION
+    for builder in PROMPT_TEMPLATE_BUILDERS:
+        if 'business_line' in v1_builderParams(builder)[0]:
+            for business_line in lsBusinessLine:
+                v1_getBodyTemplate(builder, business_line)
+        else:
+            v1_getBodyTemplate(builder)
+    return v1_promptVersion()
+
+def v1_promptVersion():
+    lsVersion = sorted(f"{name}|{business_line}|{template['version']}" 
+                       for (name, business_line), template in list(_promptTemplates.items()) if template)
+    return hashlib.sha256("\n".join(lsVersion).encode('utf-8')).hexdigest()[:12]
+
+def v1_resetPromptTemplates():
+    with _promptTemplatesLock:
+        _promptTemplates.clear()
+        _jsonFragments.clear()
+
+def v1_getPromptTemplateStats():
+    return {'enabled': PROMPT_TEMPLATES,
+            'prompt_version': v1_promptVersion(),
+            **PROMPT_TEMPLATE_STATS,
+            'prompt_layout': {'layout': PROMPT_LAYOUT, **PROMPT_LAYOUT_STATS},
+            'templates': {f"{name}|{business_line}": template['version'] if template else None 
+                          for (name, business_line), template in sorted(_promptTemplates.items(), key=lambda x: str(x[0]))}}
+
+# PROMPT LAYOUT FOR PROVIDER PREFIX CACHING
+# Azure OpenAI caches the longest common prompt prefix (>= 1024 tokens) across requests. The builders put a
+# call-specific system prompt and json_schema first, so the stage-5 fan-out never shares a prefix. In "prefix_cache"
+# layout the request starts with one fixed system message + the data messages (document text, web search, images),
+# byte-identical across the fan-out, and ends with the call's instructions and its schema (json_object mode).
+# Only the stage-5 Steps (one shared document prefix, many calls) are laid out. A json_object reply is checked
+# against the call's own schema (unknown keys dropped), a reply that does not validate is asked again in strict mode.
+PROMPT_LAYOUT = os.getenv('PROMPT_LAYOUT', 'default')  # default / prefix_cache
+PROMPT_LAYOUT_STEPS = ('v1_selectIndustryClusterSteps', 'v1_selectCompositionsSteps', 'v1_selectFunctionsSteps',
+                       'v1_selectApplicationsSteps', 'v1_findCASNumberSteps', 'v1_findPhysicalFormSteps',
+                       'v1_genProductDescriptionSteps', 'v1_getRecommendedDosageSteps', 'v1_selectCertificationsSteps',
+                       'v1_selectClaimsSteps', 'v1_selectHealthBenefitsSteps', 'v1_consolidatedSteps')
+PROMPT_LAYOUT_STATS = {'json_object_calls': 0, 'strict_retries': 0}
+PROMPT_CACHE_WARMUP_SECONDS = float(os.getenv('PROMPT_CACHE_WARMUP_SECONDS', '1'))
+PROMPT_SHARED_SYSTEM = ("You are an expert assistant for technical product dossiers (TDS, SDS, specifications). "
+                        "The following messages contain the document content and web search results for one product, "
+                        "the task instruction and required JSON output format come last.")
+_callUsage = contextvars.ContextVar('call_usage', default=None)
+
+def v1_promptLayout(body):
+    if PROMPT_LAYOUT != 'prefix_cache' or not isinstance(body, dict) or 'messages' not in body:
+        return body
+    lsInstruction = [m for m in body['messages'] if m.get('role') == 'system']
+    lsData = [m for m in body['messages'] if m.get('role') != 'system']
+    body = dict(body)
+    messages = [{"role": "system", "content": PROMPT_SHARED_SYSTEM}] + lsData + lsInstruction
+    response_format = body.get('response_format') or {}
+    if response_format.get('type') == 'json_schema':
+        # A json_schema response_format is part of the cached prefix, so it moves into the trailing message
+        schema = response_format['json_schema'].get('schema', {})
+        messages.append({"role": "system", 
+                         "content": "Respond with a single JSON object that validates against this JSON schema, no other text:\n" + v1_jsonFragment(schema, ensure_ascii=False)})
+        body['response_format'] = {"type": "json_object"}
+    body['messages'] = messages
+    return body
+
+def v1_conformToSchema(value, schema):
+    # RETURN `value` RESTRICTED TO THE SCHEMA (KEYS NOT IN "properties" DROPPED), RAISE ValueError WHEN IT DOES NOT VALIDATE
+    types = schema.get('type')
+    types = types if isinstance(types, list) else [types] if types else []
+    if 'enum' in schema and value not in schema['enum']:
+        raise ValueError(f"Value not in enum: {value!r}")
+    if value is None and 'null' in types:
+        return None
+    if 'object' in types and isinstance(value, dict):
+        properties = schema.get('properties') or {}
+        missing = [key for key in schema.get('required', []) if key not in value]
+        if missing:
+            raise ValueError(f"Missing keys: {missing}")
+        if schema.get('additionalProperties', True) is False:
+            value = {key: item for key, item in value.items() if key in properties}
+        return {key: v1_conformToSchema(item, properties[key]) if key in properties else item for key, item in value.items()}
+    if 'array' in types and isinstance(value, list):
+        return [v1_conformToSchema(item, schema.get('items') or {}) for item in value]
+    if 'string' in types and isinstance(value, str):
+        return value
+    if 'boolean' in types and isinstance(value, bool):
+        return value
+    if 'integer' in types and isinstance(value, int) and not isinstance(value, bool):
+        return value
+    if 'number' in types and isinstance(value, (int, float)) and not isinstance(value, bool):
+        return value
+    if not types:
+        return value
+    raise ValueError(f"Expected {types}, got {type(value).__name__}")
+
+def v1_layoutResult(result, body):
+    # CHECK A json_object REPLY AGAINST THE ORIGINAL json_schema, None WHEN IT MUST BE ASKED AGAIN IN STRICT MODE
+    api_error, response, rescontent = result
+    if api_error != 0:
+        return result
+    try:
+        return 0, response, v1_conformToSchema(rescontent, body['response_format']['json_schema'].get('schema', {}))
+    except ValueError:
+        return None
+
+def v1_sendWithLayout(call_type, body, send):
+    # `send(body)` -> (api_error, response, rescontent), ONE TRANSPORT CALL
+    laidOut = v1_promptLayout(body) if call_type in PROMPT_LAYOUT_STEPS else body
+    result = send(laidOut)
+    if laidOut is body or laidOut.get('response_format') == body.get('response_format'):
+        return result
+    PROMPT_LAYOUT_STATS['json_object_calls'] += 1
+    checked = v1_layoutResult(result, body)
+    if checked is not None:
+        return checked
+    PROMPT_LAYOUT_STATS['strict_retries'] += 1
+    v1_recordUsage(call_type, result)  # DISCARDED REPLY IS STILL PAID
+    return send(body)
+
+async def v1_sendWithLayoutAsync(call_type, body, send):
+    # SAME AS v1_sendWithLayout, `send(body)` RETURNS A COROUTINE
+    laidOut = v1_promptLayout(body) if call_type in PROMPT_LAYOUT_STEPS else body
+    result = await send(laidOut)
+    if laidOut is body or laidOut.get('response_format') == body.get('response_format'):
+        return result
+    PROMPT_LAYOUT_STATS['json_object_calls'] += 1
+    checked = v1_layoutResult(result, body)
+    if checked is not None:
+        return checked
+    PROMPT_LAYOUT_STATS['strict_retries'] += 1
+    v1_recordUsage(call_type, result)  # DISCARDED REPLY IS STILL PAID
+    return await send(body)
+
+def v1_startUsageLog():
+    # PER API REQUEST, SHARED BY ALL TASKS/THREADS STARTED FROM THIS CONTEXT
+    lsUsage = []
+    _callUsage.set(lsUsage)
+    return lsUsage
+
+def v1_recordUsage(call_type, result):
+    lsUsage = _callUsage.get()
+    api_error, response, _ = result
+    if lsUsage is None or api_error != 0 or not isinstance(response, dict):
+        return
+    usage = response.get('usage') or {}
+    lsUsage.append({'call': call_type,
+                    'prompt_tokens': usage.get('prompt_tokens', 0),
+                    'cached_tokens': (usage.get('prompt_tokens_details') or {}).get('cached_tokens', 0),
+                    'completion_tokens': usage.get('completion_tokens', 0)})
+
+def v1_usageSummary(lsUsage):
+    prompt_tokens = sum(u['prompt_tokens'] for u in lsUsage)
+    cached_tokens = sum(u['cached_tokens'] for u in lsUsage)
+    return {'prompt_layout': PROMPT_LAYOUT,
+            'calls': len(lsUsage),
+            'prompt_tokens': prompt_tokens,
+            'cached_tokens': cached_tokens,
+            'completion_tokens': sum(u['completion_tokens'] for u in lsUsage),
+            'cached_ratio': round(cached_tokens / prompt_tokens, 4) if prompt_tokens else 0.0}
+
+# LLM CALL STEPS
+# Each v1_<name>Steps(mainDict) generator builds the request and yields (url, body, headers, params),
+# receives (api_error, response, rescontent) back and returns the parsed result, so the same prompt/parse
+# code runs on the blocking transport (v1_runSteps) or the async one (await v1_runStepsAsync).
+def v1_runSteps(steps):
+    call_type = steps.__name__
+    try:
+        request = next(steps)
+        while True:
+            url, body, headers, params = request
+            result = v1_sendWithLayout(call_type, body, lambda body: v1_customCallAPI(url, body, headers=headers, params=params))
+            v1_recordUsage(call_type, result)
+            request = steps.send(result)
+    except StopIteration as e:
+        return e.value
+
+async def v1_runStepsAsync(steps, hedge=False, request=None):
+    # CALL TYPE = NAME OF THE STEPS FUNCTION, USED FOR LATENCY TRACKING AND HEDGING
+    # `request` = FIRST REQUEST WHEN ALREADY TAKEN FROM THE GENERATOR (CONSOLIDATED MODE)
+    call_type = steps.__name__
+    try:
+        if request is None:
+            request = next(steps)
+        while True:
+            url, body, headers, params = request
+            if hedge:
+                send = lambda body: v1_customCallAPIHedgedAsync(call_type, url, body, headers=headers, params=params)
+            else:
+                send = lambda body: v1_customCallAPIAsync(url, body, headers=headers, params=params, call_type=call_type)
+            result = await v1_sendWithLayoutAsync(call_type, body, send)
+            v1_recordUsage(call_type, result)
+            request = steps.send(result)
+    except StopIteration as e:
+        return e.value
+
+# CONSOLIDATED STEPS
+# Several Steps generators whose requests share url and data messages (stage 5: same product text + web search)
+# are answered by one structured-output call, one schema section per field (key = Steps name without v1_/Steps).
+# Each generator then receives its own section as if it had been called alone. Fields missing from the combined
+# answer, or a failed combined call, fall back to the normal per-field call.
+STAGE5_CONSOLIDATED_CALLS = int(os.getenv('STAGE5_CONSOLIDATED_CALLS', '2'))
+CONSOLIDATED_MAX_TOKENS = int(os.getenv('CONSOLIDATED_MAX_TOKENS', '32768'))  # OUTPUT LIMIT OF gpt-4.1-mini
+CONSOLIDATED_SYSTEM_PROMPT = """
+    # INSTRUCTION #
+    You will complete several independent TASKS on the same product document (given in the following messages).
+    Each TASK below has its own instruction, rules and output format. Answer every TASK on its own, as if it were the only one asked,
+    and put the answer of each TASK under its TASK key in the output object.
+    """
+
+def v1_stepsFieldKey(steps):
+    return steps.__name__[len('v1_'):-len('Steps')]
+
+def v1_schemaPropertyCount(schema):
+    return 1 + sum(v1_schemaPropertyCount(sub) for sub in (schema.get('properties') or {}).values())
+
+def v1_splitConsolidatedGroups(lsItem, n_calls):
+    # BALANCE BY SCHEMA SIZE (LARGEST FIRST INTO THE LIGHTEST GROUP), KEEP ORIGINAL ORDER INSIDE EACH GROUP
+    lsGroup = [[] for _ in range(max(1, min(n_calls, len(lsItem))))]
+    lsWeight = [0] * len(lsGroup)
+    for item in sorted(lsItem, key=lambda x: -x['weight']):
+        i = lsWeight.index(min(lsWeight))
+        lsGroup[i].append(item)
+        lsWeight[i] += item['weight']
+    return [sorted(group, key=lambda x: x['position']) for group in lsGroup if group]
+
+def v1_buildConsolidatedBody(lsItem):
+    first = lsItem[0]['body']
+    lsData = [m for m in first['messages'] if m.get('role') != 'system']
+    instruction = CONSOLIDATED_SYSTEM_PROMPT
+    properties = {}
+    for item in lsItem:
+        system_prompt = "\n".join(m['content'] for m in item['body']['messages'] if m.get('role') == 'system')
+        instruction += f"\n    ########## TASK: {item['key']} ##########\n{system_prompt}\n"
+        properties[item['key']] = item['body']['response_format']['json_schema']['schema']
+    body = {key: value for key, value in first.items() if key not in ('messages', 'response_format')}
+    # OUTPUT BUDGET OF ALL FIELDS TOGETHER, A TRUNCATED ANSWER DOES NOT PARSE AND EVERY FIELD FALLS BACK TO ITS OWN CALL
+    body['max_tokens'] = min(CONSOLIDATED_MAX_TOKENS, sum(item['body'].get('max_tokens') or 0 for item in lsItem)) or first.get('max_tokens')
+    body['messages'] = [{"role": "system", "content": instruction}] + lsData
+    body['response_format'] = {
+        "type": "json_schema",
+        "json_schema": {
+            "name": "consolidated_fields",
+            "strict": True,
+            "schema": {
+                "type": "object",
+                "properties": properties,
+                "required": list(properties),
+                "additionalProperties": False}}}
+    return body
+
+async def v1_runConsolidatedGroupAsync(lsItem, hedge=False):
+    url, headers, params = lsItem[0]['url'], lsItem[0]['headers'], lsItem[0]['params']
+    call_type = 'v1_consolidatedSteps'
+    if hedge:
+        send = lambda body: v1_customCallAPIHedgedAsync(call_type, url, body, headers=headers, params=params)
+    else:
+        send = lambda body: v1_customCallAPIAsync(url, body, headers=headers, params=params, call_type=call_type)
+    result = await v1_sendWithLayoutAsync(call_type, v1_buildConsolidatedBody(lsItem), send)
+    v1_recordUsage('v1_consolidatedSteps', result)
+    api_error, response, rescontent = result
+    lsCoro = []
+    for item in lsItem:
+        section = rescontent.get(item['key']) if api_error == 0 and isinstance(rescontent, dict) else None
+        if isinstance(section, dict):
+            lsCoro.append(v1_sendStepsAsync(item['steps'], (0, response, section), hedge=hedge))
+        else:
+            # FALL BACK TO THE FIELD'S OWN CALL
+            lsCoro.append(v1_runStepsAsync(item['steps'], hedge=hedge, request=item['request']))
+    return await asyncio.gather(*lsCoro, return_exceptions=True)
+
+async def v1_sendStepsAsync(steps, result, hedge=False):
+    # HAND THE CONSOLIDATED SECTION TO THE GENERATOR, ANY FOLLOW-UP REQUEST IS CALLED THE NORMAL WAY
+    try:
+        request = steps.send(result)
+    except StopIteration as e:
+        return e.value
+    return await v1_runStepsAsync(steps, hedge=hedge, request=request)
+
+async def v1_runStepsConsolidatedAsync(lsSteps, n_calls=STAGE5_CONSOLIDATED_CALLS, hedge=False):
+    # SAME CONTRACT AS asyncio.gather(*[v1_runStepsAsync(s) for s in lsSteps], return_exceptions=True)
+    lsResult = [None] * len(lsSteps)
+    dictGroup = {}
+    for position, steps in enumerate(lsSteps):
+        try:
+            request = next(steps)
+        except StopIteration as e:
+            lsResult[position] = e.value  # NO CALL NEEDED (e.g. NOT APPLICABLE FOR THIS BUSINESS LINE)
+            continue
+        except Exception as e:
+            lsResult[position] = e
+            continue
+        url, body, headers, params = request
+        item = {'position': position, 'steps': steps, 'request': request, 'key': v1_stepsFieldKey(steps),
+                'url': url, 'body': body, 'headers': headers, 'params': params}
+        if isinstance(body, dict) and (body.get('response_format') or {}).get('type') == 'json_schema':
+            item['weight'] = v1_schemaPropertyCount(body['response_format']['json_schema']['schema'])
+            group_key = json.dumps([url, params, [m for m in body['messages'] if m.get('role') != 'system']], ensure_ascii=False)
+            dictGroup.setdefault(group_key, []).append(item)
+        else:
+            dictGroup.setdefault(None, []).append(item)
+    lsJob = []
+    for group_key, lsItem in dictGroup.items():
+        if group_key is None or len(lsItem) == 1:
+            lsJob += [([item], False, v1_runStepsAsync(item['steps'], hedge=hedge, request=item['request'])) for item in lsItem]
+        else:
+            lsJob += [(group, True, v1_runConsolidatedGroupAsync(group, hedge=hedge)) for group in v1_splitConsolidatedGroups(lsItem, n_calls)]
+    lsJobResult = await asyncio.gather(*[coro for _, _, coro in lsJob], return_exceptions=True)
+    for (lsItem, is_group, _), jobResult in zip(lsJob, lsJobResult):
+        if not is_group:
+            lsResult[lsItem[0]['position']] = jobResult
+        elif isinstance(jobResult, BaseException):
+            for item in lsItem:
+                lsResult[item['position']] = jobResult
+        else:
+            for item, result in zip(lsItem, jobResult):
+                lsResult[item['position']] = result
+    return lsResult
+
+# HEDGED REQUESTS
+# When a call is still running after the HEDGE_PERCENTILE latency of its call type, a duplicate is sent and the
+# first success wins, the other one is cancelled. Duplicates cost quota, so they are paid from a budget that
+# grows by HEDGE_BUDGET_RATIO per call (at most HEDGE_BUDGET_BURST saved up).
+HEDGE_PERCENTILE = float(os.getenv('HEDGE_PERCENTILE', '0.9'))
+HEDGE_MIN_SAMPLES = int(os.getenv('HEDGE_MIN_SAMPLES', '20'))
+HEDGE_MIN_DELAY_SECONDS = float(os.getenv('HEDGE_MIN_DELAY_SECONDS', '1'))
+HEDGE_WINDOW = int(os.getenv('HEDGE_WINDOW', '200'))
+HEDGE_BUDGET_RATIO = float(os.getenv('HEDGE_BUDGET_RATIO', '0.1'))
+HEDGE_BUDGET_BURST = float(os.getenv('HEDGE_BUDGET_BURST', '3'))
+HEDGE_STATS = {'calls': 0, 'hedges_sent': 0, 'hedge_wins': 0, 'budget_denied': 0, 'no_threshold': 0}
+_callLatencies = {}
+_hedgeBudget = {'tokens': HEDGE_BUDGET_BURST}
+_hedgeLock = threading.Lock()
+
+def v1_recordCallLatency(call_type, seconds):
+    with _hedgeLock:
+        _callLatencies.setdefault(call_type, collections.deque(maxlen=HEDGE_WINDOW)).append(seconds)
+
+def v1_hedgeThreshold(call_type):
+    # SECONDS AFTER WHICH TO HEDGE, None UNTIL ENOUGH SAMPLES
+    with _hedgeLock:
+        samples = sorted(_callLatencies.get(call_type, ()))
+    if len(samples) < HEDGE_MIN_SAMPLES:
+        return None
+    return max(HEDGE_MIN_DELAY_SECONDS, samples[min(len(samples) - 1, int(HEDGE_PERCENTILE * len(samples)))])
+
+def v1_hedgeBudgetTake():
+    with _hedgeLock:
+        if _hedgeBudget['tokens'] >= 1:
+            _hedgeBudget['tokens'] -= 1
+            HEDGE_STATS['hedges_sent'] += 1
+            return True
+        HEDGE_STATS['budget_denied'] += 1
+        return False
+
+def v1_hedgeCount(counter):
+    with _hedgeLock:
+        HEDGE_STATS[counter] += 1
+        if counter == 'calls':
+            _hedgeBudget['tokens'] = min(HEDGE_BUDGET_BURST, _hedgeBudget['tokens'] + HEDGE_BUDGET_RATIO)
+
+def v1_hedgeTaskResult(task):
+    # AN ATTEMPT THAT RAISED COUNTS AS A FAILED CALL, SO IT CANNOT HIDE THE OTHER ATTEMPT'S ANSWER
+    try:
+        return task.result()
+    except Exception as e2:
+        return 1, {'error':str(e2)}, {'error':str(e2)}
+
+async def v1_customCallAPIHedgedAsync(call_type, url, body, headers={}, params={}):
+    v1_hedgeCount('calls')
+    threshold = v1_hedgeThreshold(call_type)
+    if threshold is None:
+        v1_hedgeCount('no_threshold')
+        return await v1_customCallAPIAsync(url, body, headers=headers, params=params, call_type=call_type)
+    # ONLY THE WINNER RECORDS ITS LATENCY, THE LOSER IS CANCELLED BEFORE IT COMPLETES
+    primary = asyncio.ensure_future(v1_customCallAPIAsync(url, body, headers=headers, params=params, call_type=call_type))
+    done, _ = await asyncio.wait({primary}, timeout=threshold)
+    if done or not v1_hedgeBudgetTake():
+        return await primary
+    hedged = asyncio.ensure_future(v1_customCallAPIAsync(url, body, headers=headers, params=params, call_type=call_type))
+    pending = {primary, hedged}
+    try:
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            # BOTH MAY FINISH IN THE SAME ROUND: ANY SUCCESS WINS, A FAILURE IS RETURNED ONLY WHEN NOTHING IS LEFT
+            lsResult = [(task, v1_hedgeTaskResult(task)) for task in done]
+            for task, result in lsResult:
+                if result[0] == 0:
+                    if task is hedged:
+                        v1_hedgeCount('hedge_wins')
+                    return result
+            if not pending:
+                return lsResult[0][1]
+    finally:
+        for task in pending:
+            task.cancel()
+
+def v1_getHedgeStats():
+    with _hedgeLock:
+        stats = dict(HEDGE_STATS)
+        stats['budget_tokens'] = round(_hedgeBudget['tokens'], 2)
+        lsCallType = list(_callLatencies)
+    stats['threshold_seconds'] = {call_type: v1_hedgeThreshold(call_type) for call_type in lsCallType}
+    return stats
+
+def v1_getProductNameAndSupplierFromTextAndImageSteps(mainDict):
     parsed_text = mainDict['stg_parsedText']
-    ls_base64 = mainDict['stg_lsBase64']
+    ls_base64 = v1_getVisionPageImages(mainDict)
     # CALL API
-    body = PIM_buildBodyGetProductNameAndSupplierFromTextAndImage(parsed_text, ls_base64)
+    body = v1_buildBody(PIM_buildBodyGetProductNameAndSupplierFromTextAndImage, parsed_text, ls_base64)
     url = "https://azure-ai-services-main01.cognitiveservices.azure.com/openai/deployments/azure-ai-services-gpt-4.1-mini-dksh-raw-tds-parser/chat/completions?api-version=2025-01-01-preview"
     headers = {"Content-Type": "application/json", "api-key": os.getenv('AZURE_OPENAI_KEY')}
-    api_error, response, rescontent = v1_customCallAPI(url, body, headers=headers)
+    api_error, response, rescontent = yield url, body, headers, {}
     # SAVE RESULT
     if api_error == 0: return rescontent['products_and_suppliers']
     else: raise HTTPException(status_code=response.status_code, detail='Critical Error: v1_getProductNameAndSupplierFromTextAndImage')
 
-def v1_getManufacturerOrSupplier(mainDict):
+def v1_getProductNameAndSupplierFromTextAndImage(mainDict):
+    return v1_runSteps(v1_getProductNameAndSupplierFromTextAndImageSteps(mainDict))
+
+def v1_getManufacturerOrSupplierSteps(mainDict):
     stg_parsedText = mainDict['stg_parsedText']
     inputProductName = mainDict['inputProductName']
     stg_lsBase64 = []
     # CALL API
-    body = PIM_buildBodyGetManufacturerOrSupplier(stg_parsedText, inputProductName, stg_lsBase64)  
+    body = v1_buildBody(PIM_buildBodyGetManufacturerOrSupplier, stg_parsedText, inputProductName, stg_lsBase64)  
     url = "https://azure-ai-services-main01.cognitiveservices.azure.com/openai/deployments/azure-ai-services-gpt-4.1-mini-dksh-raw-tds-parser/chat/completions?api-version=2025-01-01-preview"
     headers = {"Content-Type": "application/json", "api-key": os.getenv('AZURE_OPENAI_KEY')}
-    api_error, response, rescontent = v1_customCallAPI(url, body, headers=headers)
+    api_error, response, rescontent = yield url, body, headers, {}
     # SAVE RESULT
     if api_error == 0: return rescontent['manufacturer_or_supplier'], rescontent['reason']
     else: raise HTTPException(status_code=response.status_code, detail='Critical Error: v1_getManufacturerOrSupplier')
 
-def v1_searchComposition(mainDict):
+def v1_getManufacturerOrSupplier(mainDict):
+    return v1_runSteps(v1_getManufacturerOrSupplierSteps(mainDict))
+
+def v1_searchCompositionSteps(mainDict):
     if mainDict['inputWebSearch']==True:
         # BUILD BODY + CALL API
         inputProductName = mainDict['inputProductName']
@@ -2553,13 +5017,17 @@ def v1_searchComposition(mainDict):
                 "max_tokens": 4096*2}
         url = "https://ancient-almeda-personal-personal-22e19704.koyeb.app/openai"
         params = {"apikey": os.getenv('OPENAI_API_KEY')}
-        api_error, response, rescontent = v1_customCallAPI(url, body, headers={}, params=params)
+        api_error, response, rescontent = yield url, body, {}, params
         # SAVE RESULT
         if api_error == 0: return rescontent
+        elif v1_isCircuitOpen(response): return ''  # SEARCH PROXY DOWN - DEGRADE TO NO WEB SEARCH
         else: raise HTTPException(status_code=response.status_code, detail='Critical Error: v1_searchComposition')
     else: return ''
 
-def v1_searchFunction(mainDict):
+def v1_searchComposition(mainDict):
+    return v1_runSteps(v1_searchCompositionSteps(mainDict))
+
+def v1_searchFunctionSteps(mainDict):
     if mainDict['inputWebSearch']==True:
         # BUILD BODY + CALL API
         inputProductName = mainDict['inputProductName']
@@ -2577,13 +5045,17 @@ def v1_searchFunction(mainDict):
                 "max_tokens": 4096*2}
         url = "https://ancient-almeda-personal-personal-22e19704.koyeb.app/openai"
         params = {"apikey": os.getenv('OPENAI_API_KEY')}
-        api_error, response, rescontent = v1_customCallAPI(url, body, headers={}, params=params)
+        api_error, response, rescontent = yield url, body, {}, params
         # SAVE RESULT
         if api_error == 0: return rescontent
+        elif v1_isCircuitOpen(response): return ''  # SEARCH PROXY DOWN - DEGRADE TO NO WEB SEARCH
         else: raise HTTPException(status_code=response.status_code, detail='Critical Error: v1_searchFunction')
     else: return ''
 
-def v1_searchApplication(mainDict):
+def v1_searchFunction(mainDict):
+    return v1_runSteps(v1_searchFunctionSteps(mainDict))
+
+def v1_searchApplicationSteps(mainDict):
     if mainDict['inputWebSearch']==True:
         # BUILD BODY + CALL API
         inputProductName = mainDict['inputProductName']
@@ -2601,12 +5073,16 @@ def v1_searchApplication(mainDict):
                 "max_tokens": 4096*2}
         url = "https://ancient-almeda-personal-personal-22e19704.koyeb.app/openai"
         params = {"apikey": os.getenv('OPENAI_API_KEY')}
-        api_error, response, rescontent = v1_customCallAPI(url, body, headers={}, params=params)
+        api_error, response, rescontent = yield url, body, {}, params
         # SAVE RESULT
         if api_error == 0: return rescontent
+        elif v1_isCircuitOpen(response): return ''  # SEARCH PROXY DOWN - DEGRADE TO NO WEB SEARCH
         else: raise HTTPException(status_code=response.status_code, detail='Critical Error: v1_searchApplication')
     else: return ''
 
+def v1_searchApplication(mainDict):
+    return v1_runSteps(v1_searchApplicationSteps(mainDict))
+
 def v1_combineWebSearch(mainDict):
     if mainDict['inputWebSearch']==True:
         searched_text = ''
@@ -2620,186 +5096,227 @@ def v1_combineWebSearch(mainDict):
     else:
         return ''
     
-def v1_getTextOfThisProductOnly(mainDict):
+def v1_getTextOfThisProductOnlySteps(mainDict):
     # CALL API
-    body = PIM_buildBodyGetProductInfo(mainDict['stg_parsedText'], 
-                                       mainDict['inputProductName'], 
-                                       mainDict['gpt_manufacturer_or_supplier_answer'], 
-                                       mainDict['stg_lsBase64'], 
-                                       mainDict['gpt_combined_web_search'])
+    body = v1_buildBody(PIM_buildBodyGetProductInfo, mainDict['stg_parsedText'], 
+                                                     mainDict['inputProductName'], 
+                                                     mainDict['gpt_manufacturer_or_supplier_answer'], 
+                                                     v1_getVisionPageImages(mainDict), 
+                                                     mainDict['gpt_combined_web_search'])
     url = "https://azure-ai-services-main01.cognitiveservices.azure.com/openai/deployments/azure-ai-services-gpt-4.1-mini-dksh-raw-tds-parser/chat/completions?api-version=2025-01-01-preview"
     headers = {"Content-Type": "application/json", "api-key": os.getenv('AZURE_OPENAI_KEY')}
-    api_error, response, rescontent = v1_customCallAPI(url, body, headers=headers)
+    api_error, response, rescontent = yield url, body, headers, {}
     # SAVE RESULT
     if api_error == 0: return str(rescontent)
     else: raise HTTPException(status_code=response.status_code, detail='Critical Error: v1_getTextOfThisProductOnly')
 
-def v1_selectIndustryCluster(mainDict):
+def v1_getTextOfThisProductOnly(mainDict):
+    return v1_runSteps(v1_getTextOfThisProductOnlySteps(mainDict))
+
+def v1_selectIndustryClusterSteps(mainDict):
     # CALL API
     lsBase64 = []
-    body = PIM_buildBodySelectIndustryCluster(mainDict['gpt_text_of_this_product_only_answer'], 
-                                              mainDict['inputProductName'],
-                                              mainDict['gpt_manufacturer_or_supplier_answer'],
-                                              lsBase64,
-                                              mainDict['inputBusinessLine'],
-                                              mainDict['gpt_combined_web_search'])
+    body = v1_buildBody(PIM_buildBodySelectIndustryCluster, mainDict['gpt_text_of_this_product_only_answer'], 
+                                                            mainDict['inputProductName'],
+                                                            mainDict['gpt_manufacturer_or_supplier_answer'],
+                                                            lsBase64,
+                                                            mainDict['inputBusinessLine'],
+                                                            mainDict['gpt_combined_web_search'],
+                                                            mainDict.get('inputHierarchicalPruning', False))
     url = "https://azure-ai-services-main01.cognitiveservices.azure.com/openai/deployments/azure-ai-services-gpt-4.1-mini-dksh-raw-tds-parser/chat/completions?api-version=2025-01-01-preview"
     headers = {"Content-Type": "application/json", "api-key": os.getenv('AZURE_OPENAI_KEY')}
-    api_error, response, rescontent = v1_customCallAPI(url, body, headers=headers)
+    api_error, response, rescontent = yield url, body, headers, {}
     # SAVE RESULT
-    if api_error == 0: return [k for k, v in rescontent.items() if v is True], rescontent['reason']
+    if api_error == 0:
+        if 'confidence' in rescontent:
+            mainDict['gpt_select_industry_cluster_confidence'] = rescontent['confidence']  # READ BY v1_pruneByCluster
+        return [k for k, v in rescontent.items() if v is True], rescontent['reason']
     else: raise HTTPException(status_code=response.status_code, detail='Critical Error: v1_selectIndustryCluster')
 
-def v1_selectCompositions(mainDict):
+def v1_selectIndustryCluster(mainDict):
+    return v1_runSteps(v1_selectIndustryClusterSteps(mainDict))
+
+def v1_selectCompositionsSteps(mainDict):
     # CALL API
     lsBase64 = []
-    body = PIM_buildBodySelectComposition(mainDict['gpt_text_of_this_product_only_answer'], 
-                                          mainDict['inputProductName'],
-                                          mainDict['gpt_manufacturer_or_supplier_answer'],
-                                          lsBase64,
-                                          mainDict['inputBusinessLine'],
-                                          mainDict['gpt_combined_web_search'])
+    body = v1_buildBody(PIM_buildBodySelectComposition, mainDict['gpt_text_of_this_product_only_answer'], 
+                                                        mainDict['inputProductName'],
+                                                        mainDict['gpt_manufacturer_or_supplier_answer'],
+                                                        lsBase64,
+                                                        mainDict['inputBusinessLine'],
+                                                        mainDict['gpt_combined_web_search'])
     url = "https://azure-ai-services-main01.cognitiveservices.azure.com/openai/deployments/azure-ai-services-gpt-4.1-mini-dksh-raw-tds-parser/chat/completions?api-version=2025-01-01-preview"
     headers = {"Content-Type": "application/json", "api-key": os.getenv('AZURE_OPENAI_KEY')}
-    api_error, response, rescontent = v1_customCallAPI(url, body, headers=headers)
+    api_error, response, rescontent = yield url, body, headers, {}
     # SAVE RESULT
     if api_error == 0:
         if mainDict['inputBusinessLine'] == 'PCI': return [k for k, v in rescontent.items() if v is True], rescontent['reason']
         else: return rescontent['compositions'], rescontent['reason']
     else: raise HTTPException(status_code=response.status_code, detail='Critical Error: v1_selectCompositions')
 
-def v1_selectFunctions(mainDict):
+def v1_selectCompositions(mainDict):
+    return v1_runSteps(v1_selectCompositionsSteps(mainDict))
+
+def v1_selectFunctionsSteps(mainDict):
     # CALL API
     lsBase64 = []
-    body = PIM_buildBodySelectFunction(mainDict['gpt_text_of_this_product_only_answer'], 
-                                       mainDict['inputProductName'], 
-                                       mainDict['gpt_manufacturer_or_supplier_answer'], 
-                                       lsBase64, 
-                                       mainDict['inputBusinessLine'], 
-                                       mainDict['gpt_combined_web_search'])
+    candidates = v1_selectionCandidates(mainDict, PIM_buildBodySelectFunction, 'functions')
+    body = v1_buildBody(PIM_buildBodySelectFunction, mainDict['gpt_text_of_this_product_only_answer'], 
+                                                     mainDict['inputProductName'], 
+                                                     mainDict['gpt_manufacturer_or_supplier_answer'], 
+                                                     lsBase64, 
+                                                     mainDict['inputBusinessLine'], 
+                                                     mainDict['gpt_combined_web_search'],
+                                                     candidates)
     url = "https://azure-ai-services-main01.cognitiveservices.azure.com/openai/deployments/azure-ai-services-gpt-4.1-mini-dksh-raw-tds-parser/chat/completions?api-version=2025-01-01-preview"
     headers = {"Content-Type": "application/json", "api-key": os.getenv('AZURE_OPENAI_KEY')}
-    api_error, response, rescontent = v1_customCallAPI(url, body, headers=headers)
+    api_error, response, rescontent = yield url, body, headers, {}
     # SAVE RESULT
     if api_error == 0: return [k for k, v in rescontent.items() if v is True], rescontent['reason']
     else: raise HTTPException(status_code=response.status_code, detail='Critical Error: v1_selectFunctions')
 
-def v1_selectApplications(mainDict):
+def v1_selectFunctions(mainDict):
+    return v1_runSteps(v1_selectFunctionsSteps(mainDict))
+
+def v1_selectApplicationsSteps(mainDict):
     # CALL API
     lsBase64 = []
-    body = PIM_buildBodySelectApplication(mainDict['gpt_text_of_this_product_only_answer'], 
-                                          mainDict['inputProductName'], 
-                                          mainDict['gpt_manufacturer_or_supplier_answer'], 
-                                          lsBase64, 
-                                          mainDict['inputBusinessLine'], 
-                                          mainDict['gpt_combined_web_search'])
+    candidates = v1_selectionCandidates(mainDict, PIM_buildBodySelectApplication, 'applications')
+    body = v1_buildBody(PIM_buildBodySelectApplication, mainDict['gpt_text_of_this_product_only_answer'], 
+                                                        mainDict['inputProductName'], 
+                                                        mainDict['gpt_manufacturer_or_supplier_answer'], 
+                                                        lsBase64, 
+                                                        mainDict['inputBusinessLine'], 
+                                                        mainDict['gpt_combined_web_search'],
+                                                        candidates)
     url = "https://azure-ai-services-main01.cognitiveservices.azure.com/openai/deployments/azure-ai-services-gpt-4.1-mini-dksh-raw-tds-parser/chat/completions?api-version=2025-01-01-preview"
     headers = {"Content-Type": "application/json", "api-key": os.getenv('AZURE_OPENAI_KEY')}
-    api_error, response, rescontent = v1_customCallAPI(url, body, headers=headers)
+    api_error, response, rescontent = yield url, body, headers, {}
     # SAVE RESULT
     if api_error == 0: return [k for k, v in rescontent.items() if v is True], rescontent['reason']
     else: raise HTTPException(status_code=response.status_code, detail='Critical Error: v1_selectApplications')
 
-def v1_findCASNumber(mainDict):
+def v1_selectApplications(mainDict):
+    return v1_runSteps(v1_selectApplicationsSteps(mainDict))
+
+def v1_findCASNumberSteps(mainDict):
     # CALL API
     lsBase64 = []
-    body = PIM_buildBodyFindCASNumber(mainDict['gpt_text_of_this_product_only_answer'], 
-                                      mainDict['inputProductName'], 
-                                      mainDict['gpt_manufacturer_or_supplier_answer'], 
-                                      lsBase64, 
-                                      mainDict['gpt_combined_web_search'])
+    body = v1_buildBody(PIM_buildBodyFindCASNumber, mainDict['gpt_text_of_this_product_only_answer'], 
+                                                    mainDict['inputProductName'], 
+                                                    mainDict['gpt_manufacturer_or_supplier_answer'], 
+                                                    lsBase64, 
+                                                    mainDict['gpt_combined_web_search'])
     url = "https://azure-ai-services-main01.cognitiveservices.azure.com/openai/deployments/azure-ai-services-gpt-4.1-mini-dksh-raw-tds-parser/chat/completions?api-version=2025-01-01-preview"
     headers = {"Content-Type": "application/json", "api-key": os.getenv('AZURE_OPENAI_KEY')}
-    api_error, response, rescontent = v1_customCallAPI(url, body, headers=headers)
+    api_error, response, rescontent = yield url, body, headers, {}
     # SAVE RESULT
     if api_error == 0: return rescontent['cas_number'], rescontent['reason']
     else: raise HTTPException(status_code=response.status_code, detail='Critical Error: v1_findCASNumber')
 
-def v1_findPhysicalForm(mainDict):
+def v1_findCASNumber(mainDict):
+    return v1_runSteps(v1_findCASNumberSteps(mainDict))
+
+def v1_findPhysicalFormSteps(mainDict):
     # CALL API
     lsBase64 = []
-    body = PIM_buildBodyFindPhysicalForm(mainDict['gpt_text_of_this_product_only_answer'], 
-                                         mainDict['inputProductName'], 
-                                         mainDict['gpt_manufacturer_or_supplier_answer'], 
-                                         lsBase64, 
-                                         mainDict['inputBusinessLine'], 
-                                         mainDict['gpt_combined_web_search'])
+    body = v1_buildBody(PIM_buildBodyFindPhysicalForm, mainDict['gpt_text_of_this_product_only_answer'], 
+                                                       mainDict['inputProductName'], 
+                                                       mainDict['gpt_manufacturer_or_supplier_answer'], 
+                                                       lsBase64, 
+                                                       mainDict['inputBusinessLine'], 
+                                                       mainDict['gpt_combined_web_search'])
     url = "https://azure-ai-services-main01.cognitiveservices.azure.com/openai/deployments/azure-ai-services-gpt-4.1-mini-dksh-raw-tds-parser/chat/completions?api-version=2025-01-01-preview"
     headers = {"Content-Type": "application/json", "api-key": os.getenv('AZURE_OPENAI_KEY')}
-    api_error, response, rescontent = v1_customCallAPI(url, body, headers=headers)
+    api_error, response, rescontent = yield url, body, headers, {}
     # SAVE RESULT
     if api_error == 0: return rescontent['physical_form'], rescontent['reason']
     else: raise HTTPException(status_code=response.status_code, detail='Critical Error: v1_findPhysicalForm')
 
-def v1_genProductDescription(mainDict):
+def v1_findPhysicalForm(mainDict):
+    return v1_runSteps(v1_findPhysicalFormSteps(mainDict))
+
+def v1_genProductDescriptionSteps(mainDict):
     # CALL API
     lsBase64 = []
-    body = PIM_buildBodyGetProductDescription(mainDict['gpt_text_of_this_product_only_answer'], 
-                                              mainDict['inputProductName'], 
-                                              mainDict['gpt_manufacturer_or_supplier_answer'], 
-                                              lsBase64, 
-                                              mainDict['gpt_combined_web_search'])
+    body = v1_buildBody(PIM_buildBodyGetProductDescription, mainDict['gpt_text_of_this_product_only_answer'], 
+                                                            mainDict['inputProductName'], 
+                                                            mainDict['gpt_manufacturer_or_supplier_answer'], 
+                                                            lsBase64, 
+                                                            mainDict['gpt_combined_web_search'])
     url = "https://azure-ai-services-main01.cognitiveservices.azure.com/openai/deployments/azure-ai-services-gpt-4.1-mini-dksh-raw-tds-parser/chat/completions?api-version=2025-01-01-preview"
     headers = {"Content-Type": "application/json", "api-key": os.getenv('AZURE_OPENAI_KEY')}
-    api_error, response, rescontent = v1_customCallAPI(url, body, headers=headers)
+    api_error, response, rescontent = yield url, body, headers, {}
     # SAVE RESULT
     if api_error == 0: return rescontent['product_description']
     else: raise HTTPException(status_code=response.status_code, detail='Critical Error: v1_genProductDescription')
 
-def v1_getRecommendedDosage(mainDict):
+def v1_genProductDescription(mainDict):
+    return v1_runSteps(v1_genProductDescriptionSteps(mainDict))
+
+def v1_getRecommendedDosageSteps(mainDict):
     if mainDict['inputBusinessLine'] == 'PHI': 
         return '','For PHI, Recommended dosage to be manually input'
     else:
         # CALL API
         lsBase64 = []
-        body = PIM_buildBodyGetRecommendedDosage(mainDict['gpt_text_of_this_product_only_answer'], 
-                                                mainDict['inputProductName'], 
-                                                mainDict['gpt_manufacturer_or_supplier_answer'], 
-                                                lsBase64, 
-                                                mainDict['gpt_combined_web_search'])
+        body = v1_buildBody(PIM_buildBodyGetRecommendedDosage, mainDict['gpt_text_of_this_product_only_answer'], 
+                                                              mainDict['inputProductName'], 
+                                                              mainDict['gpt_manufacturer_or_supplier_answer'], 
+                                                              lsBase64, 
+                                                              mainDict['gpt_combined_web_search'])
         url = "https://azure-ai-services-main01.cognitiveservices.azure.com/openai/deployments/azure-ai-services-gpt-4.1-mini-dksh-raw-tds-parser/chat/completions?api-version=2025-01-01-preview"
         headers = {"Content-Type": "application/json", "api-key": os.getenv('AZURE_OPENAI_KEY')}
-        api_error, response, rescontent = v1_customCallAPI(url, body, headers=headers)
+        api_error, response, rescontent = yield url, body, headers, {}
         # SAVE RESULT
         if api_error == 0: return rescontent['recommended_dosage'], rescontent['reason']
         else: raise HTTPException(status_code=response.status_code, detail='Critical Error: v1_getRecommendedDosage')
 
-def v1_selectCertifications(mainDict):
+def v1_getRecommendedDosage(mainDict):
+    return v1_runSteps(v1_getRecommendedDosageSteps(mainDict))
+
+def v1_selectCertificationsSteps(mainDict):
     if mainDict['inputBusinessLine'] == 'PHI': 
         return '','For PHI, Certifications to be manually input'
     else:
         # CALL API
         lsBase64 = []
-        body = PIM_buildBodySelectCertifications(mainDict['gpt_text_of_this_product_only_answer'], 
-                                                mainDict['inputProductName'], 
-                                                mainDict['gpt_manufacturer_or_supplier_answer'], 
-                                                lsBase64, 
-                                                mainDict['inputBusinessLine'], 
-                                                mainDict['gpt_combined_web_search'])
+        body = v1_buildBody(PIM_buildBodySelectCertifications, mainDict['gpt_text_of_this_product_only_answer'], 
+                                                              mainDict['inputProductName'], 
+                                                              mainDict['gpt_manufacturer_or_supplier_answer'], 
+                                                              lsBase64, 
+                                                              mainDict['inputBusinessLine'], 
+                                                              mainDict['gpt_combined_web_search'])
         url = "https://azure-ai-services-main01.cognitiveservices.azure.com/openai/deployments/azure-ai-services-gpt-4.1-mini-dksh-raw-tds-parser/chat/completions?api-version=2025-01-01-preview"
         headers = {"Content-Type": "application/json", "api-key": os.getenv('AZURE_OPENAI_KEY')}
-        api_error, response, rescontent = v1_customCallAPI(url, body, headers=headers)
+        api_error, response, rescontent = yield url, body, headers, {}
         # SAVE RESULT
         if api_error == 0: return [k for k, v in rescontent.items() if v is True], rescontent['reason']
         else: raise HTTPException(status_code=response.status_code, detail='Critical Error: v1_selectCertifications')
 
-def v1_selectClaims(mainDict):
+def v1_selectCertifications(mainDict):
+    return v1_runSteps(v1_selectCertificationsSteps(mainDict))
+
+def v1_selectClaimsSteps(mainDict):
     # CALL API
     lsBase64 = []
-    body = PIM_buildBodySelectClaims(mainDict['gpt_text_of_this_product_only_answer'], 
-                                     mainDict['inputProductName'], 
-                                     mainDict['gpt_manufacturer_or_supplier_answer'], 
-                                     lsBase64, 
-                                     mainDict['inputBusinessLine'], 
-                                     mainDict['gpt_combined_web_search'])
+    body = v1_buildBody(PIM_buildBodySelectClaims, mainDict['gpt_text_of_this_product_only_answer'], 
+                                                   mainDict['inputProductName'], 
+                                                   mainDict['gpt_manufacturer_or_supplier_answer'], 
+                                                   lsBase64, 
+                                                   mainDict['inputBusinessLine'], 
+                                                   mainDict['gpt_combined_web_search'])
     url = "https://azure-ai-services-main01.cognitiveservices.azure.com/openai/deployments/azure-ai-services-gpt-4.1-mini-dksh-raw-tds-parser/chat/completions?api-version=2025-01-01-preview"
     headers = {"Content-Type": "application/json", "api-key": os.getenv('AZURE_OPENAI_KEY')}
-    api_error, response, rescontent = v1_customCallAPI(url, body, headers=headers)
+    api_error, response, rescontent = yield url, body, headers, {}
     # SAVE RESULT
     if api_error == 0: return [k for k, v in rescontent.items() if v is True], rescontent['reason']
     else: raise HTTPException(status_code=response.status_code, detail='Critical Error: v1_selectClaims')
 
-def v1_selectHealthBenefits(mainDict):
+def v1_selectClaims(mainDict):
+    return v1_runSteps(v1_selectClaimsSteps(mainDict))
+
+def v1_selectHealthBenefitsSteps(mainDict):
     if mainDict['inputBusinessLine']=='FBI':
         selection_list = ["Dietary Fiber",
                           "Food Culture",
@@ -2810,14 +5327,14 @@ def v1_selectHealthBenefits(mainDict):
         if any(item in lsFunctionsStr for item in selection_list):
             # CALL API
             lsBase64 = []
-            body = PIM_buildBodySelectHealthBenefits(mainDict['gpt_text_of_this_product_only_answer'], 
-                                                     mainDict['inputProductName'], 
-                                                     mainDict['gpt_manufacturer_or_supplier_answer'], 
-                                                     lsBase64, 
-                                                     mainDict['gpt_combined_web_search'])
+            body = v1_buildBody(PIM_buildBodySelectHealthBenefits, mainDict['gpt_text_of_this_product_only_answer'], 
+                                                                   mainDict['inputProductName'], 
+                                                                   mainDict['gpt_manufacturer_or_supplier_answer'], 
+                                                                   lsBase64, 
+                                                                   mainDict['gpt_combined_web_search'])
             url = "https://azure-ai-services-main01.cognitiveservices.azure.com/openai/deployments/azure-ai-services-gpt-4.1-mini-dksh-raw-tds-parser/chat/completions?api-version=2025-01-01-preview"
             headers = {"Content-Type": "application/json", "api-key": os.getenv('AZURE_OPENAI_KEY')}
-            api_error, response, rescontent = v1_customCallAPI(url, body, headers=headers)
+            api_error, response, rescontent = yield url, body, headers, {}
             # SAVE RESULT
             if api_error == 0: return [k for k, v in rescontent.items() if v is True], rescontent['reason']
             else: raise HTTPException(status_code=response.status_code, detail='Critical Error: v1_selectHealthBenefits')
@@ -2825,6 +5342,9 @@ def v1_selectHealthBenefits(mainDict):
             return [], "No applicable health benefits because product functions not in the required list (Dietary Fiber, Food Culture, Fortification/Nutraceutical, Probiotic/Postbiotic, Protein)"
     return [], "Only applicable for FBI business line"
 
+def v1_selectHealthBenefits(mainDict):
+    return v1_runSteps(v1_selectHealthBenefitsSteps(mainDict))
+
 ###############################################################################################################################################################################
 ###############################################################################################################################################################################
 ###############################################################################################################################################################################
@@ -2849,4 +5369,98 @@ def load_hist_by_hash(hash_combined, folder='histAPICalls'):
             if entry.is_file() and entry.name.endswith(suffix):
                 with open(entry.path, "r", encoding="utf-8") as f:
                     return json.load(f)
-    return None
\ No newline at end of file
+    return None
+
+def v1_hashFile(file_path, chunk_size=1024*1024):
+    hasher = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            hasher.update(chunk)
+    return hasher.hexdigest()
+
+# DISK LRU CACHE
+# One file per entry inside `folder`, file mtime is the last access time.
+# When the folder grows over `max_bytes` the least recently used entries are removed.
+DISK_CACHE_STATS = {}
+_diskCacheLock = threading.Lock()
+
+def _diskCacheCount(folder, counter, n=1):
+    with _diskCacheLock:
+        stats = DISK_CACHE_STATS.setdefault(folder, {'hits': 0, 'misses': 0, 'writes': 0, 'evictions': 0})
+        stats[counter] += n
+
+def v1_diskCacheGet(folder, key):
+    path = os.path.join(folder, key)
+    try:
+        with open(path, "rb") as f:
+            data = f.read()
+    except FileNotFoundError:
+        _diskCacheCount(folder, 'misses')
+        return None
+    try:
+        os.utime(path, None)  # TOUCH = MARK AS RECENTLY USED
+    except OSError:
+        pass
+    _diskCacheCount(folder, 'hits')
+    return data
+
+def v1_diskCachePut(folder, key, data, max_bytes, evict=True):
+    os.makedirs(folder, exist_ok=True)
+    fd, part_path = tempfile.mkstemp(dir=folder, suffix='.part')
+    with os.fdopen(fd, "wb") as f:
+        f.write(data)
+    os.replace(part_path, os.path.join(folder, key))
+    _diskCacheCount(folder, 'writes')
+    if evict:
+        v1_diskCacheEvict(folder, max_bytes)
+
+def v1_diskCacheEvict(folder, max_bytes):
+    with _diskCacheLock:
+        entries = []
+        total_bytes = 0
+        with os.scandir(folder) as it:
+            for entry in it:
+                if not entry.is_file() or entry.name.endswith('.part'):
+                    continue
+                try:
+                    st = entry.stat()
+                except FileNotFoundError:
+                    continue  # removed by another worker
+                entries.append((st.st_mtime, st.st_size, entry.path))
+                total_bytes += st.st_size
+        if total_bytes <= max_bytes:
+            return
+        # OLDEST ACCESS FIRST
+        entries.sort()
+        evicted = 0
+        for mtime, size, path in entries:
+            if total_bytes <= max_bytes:
+                break
+            try:
+                os.remove(path)
+                evicted += 1
+            except FileNotFoundError:
+                pass
+            total_bytes -= size
+    _diskCacheCount(folder, 'evictions', evicted)
+
+def v1_diskCacheStats(dictFolderMaxBytes):
+    # COUNTERS OF THIS WORKER + CURRENT SIZE ON DISK
+    dictStats = {}
+    for folder, max_bytes in dictFolderMaxBytes.items():
+        with _diskCacheLock:
+            stats = dict(DISK_CACHE_STATS.get(folder, {'hits': 0, 'misses': 0, 'writes': 0, 'evictions': 0}))
+        lookups = stats['hits'] + stats['misses']
+        stats['hit_ratio'] = round(stats['hits'] / lookups, 4) if lookups else None
+        stats['files'], stats['bytes'] = 0, 0
+        try:
+            with os.scandir(folder) as it:
+                for entry in it:
+                    if entry.is_file() and not entry.name.endswith('.part'):
+                        stats['files'] += 1
+                        stats['bytes'] += entry.stat().st_size
+        except FileNotFoundError:
+            pass
+        stats['max_bytes'] = max_bytes
+        dictStats[folder] = stats
+    return dictStats